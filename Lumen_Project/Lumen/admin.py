@@ -3,9 +3,13 @@ from django.core.exceptions import ValidationError
 from django.db.models import Count, QuerySet
 from django.forms.models import BaseInlineFormSet
 from django.http import HttpRequest
+from django.utils import timezone
 from typing import Any
 
-from .models import Quiz, Question, Answer
+from .models import Category, Job, Quiz, Question, Answer
+from .search import get_search_backend
+from .services import adjust_question_count, release_question_orders, set_quizzes_published
+from .snapshot import invalidate_catalogue, invalidate_quiz, invalidate_quizzes
 
 
 class AnswerFormSet(BaseInlineFormSet):
@@ -50,14 +54,24 @@ class QuestionInline(admin.TabularInline):
     show_change_link = True # dodaje link do edycji pytania
 
 
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    """Kategorie z licznikami utrzymywanymi przy zapisie quizów."""
+    list_display = ('name', 'quiz_count', 'published_count')
+    search_fields = ('name',)
+    readonly_fields = ('quiz_count', 'published_count')
+
+
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     """Zaawansowana konfiguracja panelu admina dla modelu Quiz."""
     # Akcje hurtowe
     actions = ['publish_quizzes', 'unpublish_quizzes']
     # Ulepszony widok listy
-    list_display = ('title', 'category', 'is_published', 'question_count', 'created_by', 'created_at')
+    list_display = ('title', 'category', 'is_published', 'question_count', 'attempt_count', 'created_by', 'created_at')
+    # Filtr kategorii czyta małą tabelę Category zamiast DISTINCT po wszystkich quizach
     list_filter = ('is_published', 'category', 'created_by')
+    # Wyszukiwarka korzysta z indeksu pełnotekstowego (get_search_results), nie z icontains po tych polach
     search_fields = ('title', 'description')
 
     # organizacja formularza edycji
@@ -65,43 +79,65 @@ class QuizAdmin(admin.ModelAdmin):
         (None, {'fields': ('title', 'description', 'category')}),
         ('Publikacja', {'fields': ('is_published',)}),
         ('Autor', {'fields': ('created_by', 'created_at')}),
+        ('Statystyki', {'fields': ('question_count', 'attempt_count')}),
     )
-    readonly_fields = ('created_at', 'created_by')
+    readonly_fields = ('created_at', 'created_by', 'question_count', 'attempt_count')
     # Dołączenie panelu Pytań
     inlines = [QuestionInline]
 
     def save_formset(self, request:HttpRequest, form: Any, formset: Any, change:bool) -> None:
+        if formset.model is not Question:
+            super().save_formset(request, form, formset, change)
+            return
         instances = formset.save(commit=False)
-        for index, instance in enumerate(instances):
-            # Ustawiamy pole 'order' na podstawie pozycji w formularzu
-            if isinstance(instance, Question): # Upewniamy się, że to pytanie
-                instance.order = index + 1
-                instance.save()
+        for obj in formset.deleted_objects:
+            obj.delete()
+        existing = [instance for instance in instances if instance.pk]
+        # Pytania bez kolejności dopisujemy na koniec, za wszystkimi zajętymi pozycjami
+        taken = set(
+            Question.objects.filter(quiz=form.instance)
+            .exclude(pk__in=[instance.pk for instance in existing])
+            .values_list('order', flat=True)
+        )
+        taken.update(instance.order for instance in instances if instance.order)
+        next_order = max(taken, default=0)
+        for instance in instances:
+            if not instance.order:
+                next_order += 1
+                instance.order = next_order
+        # Zmienione pytania zwalniają swoje pozycje, zanim zajmą je inne pytania z formularza
+        release_question_orders(existing)
+        for instance in instances:
+            instance.save()
         formset.save_m2m()
-        super().save_formset(request, form, formset, change)
+
+    def get_search_results(self, request: HttpRequest, queryset: QuerySet[Quiz], search_term: str) -> tuple[QuerySet[Quiz], bool]:
+        """Szuka w tytule, kategorii, opisie i pytaniach przez indeks pełnotekstowy."""
+        if not search_term.strip():
+            return queryset, False
+        return get_search_backend().filter(queryset, search_term), False
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Quiz]:
         """Optymalizuje zapytania do bazy danych, aby przyspieszyć ładowanie listy."""
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(q_count=Count('questions'))
-        return queryset
-
-    @admin.display(description='Liczba pytań', ordering='q_count')
-    def question_count(self, obj: Quiz) -> int:
-        """Wyświetla liczbę pytań w quizie na liście."""
-        return obj.q_count
+        # Liczniki pytań i podejść są zapisane w quizie - bez COUNT po całej tabeli pytań
+        return super().get_queryset(request).select_related('created_by', 'category')
 
     @admin.action(description='Opublikuj zaznaczone quizy')
     def publish_quizzes(self, request: HttpRequest, queryset: QuerySet[Quiz]) -> None:
         """Akcja do publikowania wielu quizów na raz."""
-        queryset.update(is_published=True)
-        self.message_user(request, f"Opublikowano {queryset.count()} quizów.")
+        changed = set_quizzes_published(queryset, True)
+        # update() nie wysyła sygnałów - unieważniamy cache ręcznie
+        invalidate_quizzes(changed)
+        invalidate_catalogue()
+        self.message_user(request, f"Opublikowano {len(changed)} quizów.")
 
     @admin.action(description='Cofnij publikację zaznaczonych quizów')
     def unpublish_quizzes(self, request: HttpRequest, queryset: QuerySet[Quiz]) -> None:
         """Akcja do cofania publikacji wielu quizów na raz."""
-        queryset.update(is_published=False)
-        self.message_user(request, f"Cofnięto publikację dla {queryset.count()} quizów.")
+        changed = set_quizzes_published(queryset, False)
+        invalidate_quizzes(changed)
+        invalidate_catalogue()
+        self.message_user(request, f"Cofnięto publikację dla {len(changed)} quizów.")
 
     def save_model(self, request: Any, obj: Quiz, form: Any, change: bool) -> None:
         """Automatycznie ustawia autora quizu przy pierwszym zapisie."""
@@ -118,3 +154,40 @@ class QuestionAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     inlines = [AnswerInline]
     ordering = ('quiz', 'order')
+
+    def get_search_results(self, request: HttpRequest, queryset: QuerySet[Question], search_term: str) -> tuple[QuerySet[Question], bool]:
+        """Pytania z quizów, których dokument wyszukiwania (z treściami pytań) pasuje do frazy."""
+        if not search_term.strip():
+            return queryset, False
+        quizzes = get_search_backend().filter(Quiz.objects.all(), search_term)
+        return queryset.filter(quiz__in=quizzes.values('pk')), False
+
+    def save_related(self, request: HttpRequest, form: Any, formsets: Any, change: bool) -> None:
+        super().save_related(request, form, formsets, change)
+        # Usunięcie odpowiedzi w inline nie wysyła sygnału unieważniającego - robimy to tutaj
+        invalidate_quiz(form.instance.quiz_id)
+
+    def delete_queryset(self, request: HttpRequest, queryset: QuerySet[Question]) -> None:
+        """Hurtowe usuwanie pytań: liczniki quizów korygujemy jednym UPDATE na quiz."""
+        removed = list(
+            queryset.order_by().values('quiz_id').annotate(total=Count('pk')).values_list('quiz_id', 'total')
+        )
+        super().delete_queryset(request, queryset)
+        for quiz_id, total in removed:
+            adjust_question_count(quiz_id, -total)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Podgląd kolejki zadań w tle - głównie po to, by znaleźć i ponowić nieudane zadania."""
+    actions = ['retry_jobs']
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at', 'last_error')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at')
+
+    @admin.action(description='Ponów zaznaczone zadania')
+    def retry_jobs(self, request: HttpRequest, queryset: QuerySet[Job]) -> None:
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now(), locked_by='', locked_at=None, finished_at=None,
+        )
+        self.message_user(request, f"Ponowiono {count} zadań.")
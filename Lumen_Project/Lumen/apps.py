@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class LumenConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Lumen'
+
+    def ready(self):
+        # Rejestrujemy sygnały unieważniające cache quizów
+        import Lumen.signals
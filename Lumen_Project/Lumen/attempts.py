@@ -0,0 +1,134 @@
+"""
+Stan trwającego podejścia do quizu: dziennik odpowiedzi, pozycja i wynik.
+
+Stan trzymamy w cache (alias `LUMEN_ATTEMPT_CACHE`), a nie w sesji - przy sesjach w bazie
+każda odpowiedź przepisywałaby cały wiersz sesji. Do bazy trafia dopiero zakończone
+podejście: wynik i wszystkie odpowiedzi naraz (services.record_quiz_result).
+
+Wynik nie jest przechowywany osobno, tylko wyliczany z dziennika, w którym każde pytanie
+występuje co najwyżej raz - ponowne wysłanie odpowiedzi na to samo pytanie niczego nie dolicza.
+W produkcji cache musi być współdzielony przez procesy (Redis, memcached, FileBasedCache).
+Funkcje z prefiksem `a` to odpowiedniki dla widoków async (ASGI).
+"""
+import time
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .services import POINTS_PER_CORRECT_ANSWER
+from .snapshot import CompiledAnswer, CompiledQuestion, CompiledQuiz
+
+# Porzucone podejście wygasa samo
+ATTEMPT_TIMEOUT = getattr(settings, 'LUMEN_ATTEMPT_TIMEOUT', 2 * 60 * 60)
+
+
+class LoggedAnswer(NamedTuple):
+    question_id: int
+    answer_id: int
+    is_correct: bool
+
+
+@dataclass
+class Attempt:
+    user_id: int
+    quiz_id: int
+    started_at: float = field(default_factory=time.time)
+    # Kolejność pytania, od którego należy wznowić podejście (None - wszystkie mają odpowiedź)
+    position: Optional[int] = None
+    answers: dict[int, LoggedAnswer] = field(default_factory=dict)
+
+    @property
+    def correct_count(self) -> int:
+        return sum(answer.is_correct for answer in self.answers.values())
+
+    @property
+    def score(self) -> int:
+        return self.correct_count * POINTS_PER_CORRECT_ANSWER
+
+    def answer_for(self, question: CompiledQuestion) -> Optional[LoggedAnswer]:
+        return self.answers.get(question.id)
+
+    def record(self, quiz: CompiledQuiz, question: CompiledQuestion, answer: CompiledAnswer) -> bool:
+        """Zapisuje odpowiedź; zwraca False, jeśli pytanie ma już odpowiedź w tym podejściu."""
+        if question.id in self.answers:
+            return False
+        self.answers[question.id] = LoggedAnswer(question.id, answer.id, answer.is_correct)
+        # Następne pytanie bez odpowiedzi, a gdy takiego nie ma - pierwsze pominięte
+        unanswered = [q for q in quiz.questions if q.id not in self.answers]
+        following = next((q for q in unanswered if q.order > question.order), unanswered[0] if unanswered else None)
+        self.position = following.order if following else None
+        return True
+
+    def resume_order(self, quiz: CompiledQuiz) -> Optional[int]:
+        """
+        Pytanie, od którego gracz wznawia podejście: zapisana pozycja, a gdy quiz zmieniono
+        w trakcie - pierwsze pytanie bez odpowiedzi; przy komplecie odpowiedzi - ostatnie pytanie.
+        """
+        if self.position is not None and quiz.get_question(self.position) is not None:
+            return self.position
+        unanswered = next((q.order for q in quiz.questions if q.id not in self.answers), None)
+        if unanswered is not None:
+            return unanswered
+        return quiz.questions[-1].order if quiz.questions else None
+
+
+def _cache():
+    return caches[getattr(settings, 'LUMEN_ATTEMPT_CACHE', 'default')]
+
+
+def _attempt_key(user_id: int, quiz_id: int) -> str:
+    return f'lumen:attempt:{user_id}:{quiz_id}'
+
+
+def get_attempt(user_id: int, quiz_id: int) -> Optional[Attempt]:
+    return _cache().get(_attempt_key(user_id, quiz_id))
+
+
+def get_or_start_attempt(user_id: int, quiz_id: int) -> Attempt:
+    attempt = get_attempt(user_id, quiz_id)
+    if attempt is None:
+        attempt = Attempt(user_id=user_id, quiz_id=quiz_id)
+        save_attempt(attempt)
+    return attempt
+
+
+def save_attempt(attempt: Attempt) -> None:
+    _cache().set(_attempt_key(attempt.user_id, attempt.quiz_id), attempt, ATTEMPT_TIMEOUT)
+
+
+def claim_attempt(user_id: int, quiz_id: int) -> Optional[Attempt]:
+    """
+    Zdejmuje podejście z cache do zapisania. Wygrywa tylko to żądanie, któremu udało się
+    usunąć klucz - dwukrotne kliknięcie "Zakończ" nie zapisze wyniku dwa razy.
+    """
+    key = _attempt_key(user_id, quiz_id)
+    attempt = _cache().get(key)
+    if attempt is None or not _cache().delete(key):
+        return None
+    return attempt
+
+
+async def aget_attempt(user_id: int, quiz_id: int) -> Optional[Attempt]:
+    return await _cache().aget(_attempt_key(user_id, quiz_id))
+
+
+async def aget_or_start_attempt(user_id: int, quiz_id: int) -> Attempt:
+    attempt = await aget_attempt(user_id, quiz_id)
+    if attempt is None:
+        attempt = Attempt(user_id=user_id, quiz_id=quiz_id)
+        await asave_attempt(attempt)
+    return attempt
+
+
+async def asave_attempt(attempt: Attempt) -> None:
+    await _cache().aset(_attempt_key(attempt.user_id, attempt.quiz_id), attempt, ATTEMPT_TIMEOUT)
+
+
+async def aclaim_attempt(user_id: int, quiz_id: int) -> Optional[Attempt]:
+    key = _attempt_key(user_id, quiz_id)
+    attempt = await _cache().aget(key)
+    if attempt is None or not await _cache().adelete(key):
+        return None
+    return attempt
@@ -0,0 +1,301 @@
+"""
+Strumieniowy import banków pytań z plików JSONL/CSV.
+
+Plik czytamy rekord po rekordzie (generatory), zapisujemy paczkami w osobnych transakcjach
+i w tej samej transakcji przesuwamy punkt kontrolny. Pamięć zależy od rozmiaru paczki,
+a nie od rozmiaru pliku.
+
+JSONL - jeden quiz w linii:
+    {"title": "...", "description": "...", "category": "...", "is_published": false,
+     "questions": [{"text": "...", "time_limit": 30, "answers": [{"text": "...", "is_correct": true}, ...]}]}
+
+CSV - jedna odpowiedź w wierszu, kolejne wiersze tego samego quizu/pytania obok siebie:
+    quiz_key,title,description,category,question_order,question,answer,is_correct
+"""
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+
+from django.db import connections, transaction
+
+from .models import Quiz, Question, Answer, ImportCheckpoint
+from .search import schedule_search_refresh
+from .services import adjust_category_counts, category_deltas, resolve_categories
+from .snapshot import invalidate_catalogue
+from .validators import single_correct_answer_error
+
+CSV_COLUMNS = ('quiz_key', 'title', 'description', 'category', 'question_order', 'question', 'answer', 'is_correct')
+TRUE_VALUES = ('1', 'true', 't', 'tak', 'yes')
+FALSE_VALUES = ('0', 'false', 'f', 'nie', 'no', '')
+
+
+class InvalidRecord(ValueError):
+    """Rekord nie spełnia reguł walidacji quizu."""
+
+
+@dataclass
+class QuizRecord:
+    offset: int  # bajt, od którego zaczyna się rekord
+    end: int  # bajt tuż za rekordem
+    data: Optional[dict] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ImportStats:
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    MAX_REPORTED_ERRORS = 20
+
+    def add_error(self, record: QuizRecord) -> None:
+        self.skipped += 1
+        if len(self.errors) < self.MAX_REPORTED_ERRORS:
+            self.errors.append(f"bajt {record.offset}: {record.error}")
+
+    def merge(self, other: 'ImportStats') -> None:
+        self.imported += other.imported
+        self.skipped += other.skipped
+        self.errors.extend(other.errors[:self.MAX_REPORTED_ERRORS - len(self.errors)])
+
+
+def parse_bool(value: Any, name: str) -> bool:
+    """
+    Wartość logiczna z JSON: true/false albo tekst z TRUE_VALUES/FALSE_VALUES (banki eksportowane
+    z arkuszy). bool("false") byłoby prawdą, więc inne wartości odrzucamy zamiast zgadywać.
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+    raise InvalidRecord(f"Pole {name} musi być wartością logiczną (true/false), otrzymano: {value!r}.")
+
+
+def validate_quiz(data: Any) -> dict:
+    """Normalizuje rekord quizu i sprawdza te same reguły co QuizDetailSerializer."""
+    if not isinstance(data, dict):
+        raise InvalidRecord("Rekord musi być obiektem JSON.")
+    title = str(data.get('title') or '').strip()
+    if not title or len(title) > 200:
+        raise InvalidRecord("Tytuł jest wymagany i może mieć najwyżej 200 znaków.")
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        raise InvalidRecord("Quiz musi zawierać przynajmniej jedno pytanie.")
+
+    normalized_questions, orders = [], set()
+    for index, question in enumerate(questions, start=1):
+        if not isinstance(question, dict) or not str(question.get('text') or '').strip():
+            raise InvalidRecord(f"Pytanie {index} nie ma treści.")
+        answers = question.get('answers')
+        if not isinstance(answers, list) or not all(isinstance(a, dict) for a in answers):
+            raise InvalidRecord(f"Pytanie {index} nie ma listy odpowiedzi.")
+        answers = [{**a, 'is_correct': parse_bool(a.get('is_correct', False), f"is_correct w pytaniu {index}")}
+                   for a in answers]
+        error = single_correct_answer_error(answers)
+        if error:
+            raise InvalidRecord(error)
+        if any(not str(a.get('text') or '').strip() or len(str(a['text'])) > 300 for a in answers):
+            raise InvalidRecord(f"Odpowiedzi pytania {index} muszą mieć od 1 do 300 znaków.")
+        try:
+            time_limit = int(question.get('time_limit', 30))
+            order = int(question.get('order', index))
+        except (TypeError, ValueError):
+            raise InvalidRecord(f"Pytanie {index} ma nieprawidłowy limit czasu lub kolejność.")
+        if order in orders:
+            raise InvalidRecord(f"Kolejność {order} powtarza się w kilku pytaniach.")
+        orders.add(order)
+        normalized_questions.append({
+            'text': str(question['text']).strip(),
+            'time_limit': time_limit,
+            'order': order,
+            'answers': [{'text': str(a['text']).strip(), 'is_correct': a['is_correct']} for a in answers],
+        })
+
+    return {
+        'title': title,
+        'description': str(data.get('description') or ''),
+        'category': str(data.get('category') or '')[:100],
+        'is_published': parse_bool(data.get('is_published', False), 'is_published'),
+        'questions': normalized_questions,
+    }
+
+
+def _validated(record: QuizRecord) -> QuizRecord:
+    if record.error is None:
+        try:
+            record.data = validate_quiz(record.data)
+        except InvalidRecord as exc:
+            record.data, record.error = None, str(exc)
+    return record
+
+
+def iter_jsonl(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[QuizRecord]:
+    """Zwraca rekordy zaczynające się w przedziale [start, end) pliku JSONL."""
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        offset = start
+        for line in handle:
+            if end is not None and offset >= end:
+                break
+            record = QuizRecord(offset=offset, end=offset + len(line))
+            offset = record.end
+            if not line.strip():
+                continue
+            try:
+                record.data = json.loads(line)
+            except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+                record.error = f"Niepoprawny JSON: {exc}"
+            yield _validated(record)
+
+
+class _OffsetLines:
+    """Iterator linii tekstu, który pamięta, ile bajtów pliku już oddał."""
+
+    def __init__(self, handle: BinaryIO, offset: int) -> None:
+        self.handle = handle
+        self.offset = offset
+
+    def __iter__(self) -> '_OffsetLines':
+        return self
+
+    def __next__(self) -> str:
+        line = self.handle.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
+
+
+def iter_csv(path: str, start: int = 0) -> Iterator[QuizRecord]:
+    """Grupuje kolejne wiersze CSV w quizy. Rekord zaczyna się na pierwszym wierszu quizu."""
+    with open(path, 'rb') as handle:
+        header_line = handle.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig')]))
+        missing = set(CSV_COLUMNS) - set(header)
+        if missing:
+            raise InvalidRecord(f"Brak kolumn CSV: {', '.join(sorted(missing))}")
+        start = max(start, len(header_line))
+        handle.seek(start)
+        lines = _OffsetLines(handle, start)
+        reader = csv.DictReader(lines, fieldnames=header)
+
+        current_key, current, record_start = None, None, start
+        row_start = start
+        for row in reader:
+            if row['quiz_key'] != current_key:
+                if current is not None:
+                    yield _validated(QuizRecord(offset=record_start, end=row_start, data=current))
+                current_key, record_start = row['quiz_key'], row_start
+                current = {
+                    'title': row['title'], 'description': row['description'],
+                    'category': row['category'], 'is_published': False, 'questions': [],
+                }
+            questions = current['questions']
+            if not questions or questions[-1]['order'] != row['question_order']:
+                questions.append({'order': row['question_order'], 'text': row['question'], 'answers': []})
+            questions[-1]['answers'].append({
+                'text': row['answer'],
+                'is_correct': row['is_correct'].strip().lower() in TRUE_VALUES,
+            })
+            row_start = lines.offset
+        if current is not None:
+            yield _validated(QuizRecord(offset=record_start, end=lines.offset, data=current))
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@transaction.atomic
+def write_chunk(records: list[QuizRecord], author_id: int, checkpoint_key: str, stats: ImportStats) -> None:
+    """Zapisuje paczkę quizów trzema zapytaniami bulk_create i przesuwa punkt kontrolny."""
+    valid = [record for record in records if record.error is None]
+    categories = resolve_categories(record.data['category'] for record in valid)
+    quizzes = Quiz.objects.bulk_create([
+        Quiz(
+            title=record.data['title'], description=record.data['description'],
+            category=categories.get(record.data['category'].strip()), is_published=record.data['is_published'],
+            created_by_id=author_id, question_count=len(record.data['questions']),
+        )
+        for record in valid
+    ])
+    # bulk_create nie wysyła sygnałów - liczniki kategorii, listę quizów i indeks wyszukiwania odświeżamy ręcznie
+    adjust_category_counts(category_deltas((None, (quiz.category_id, quiz.is_published)) for quiz in quizzes))
+    invalidate_catalogue()
+    schedule_search_refresh(quiz.pk for quiz in quizzes)
+
+    questions, answers_per_question = [], []
+    for quiz, record in zip(quizzes, valid):
+        for question in record.data['questions']:
+            questions.append(Question(quiz=quiz, text=question['text'], order=question['order'],
+                                      time_limit=question['time_limit']))
+            answers_per_question.append(question['answers'])
+    questions = Question.objects.bulk_create(questions, batch_size=1000)
+    Answer.objects.bulk_create(
+        (Answer(question=question, **answer)
+         for question, answers in zip(questions, answers_per_question) for answer in answers),
+        batch_size=1000,
+    )
+
+    for record in records:
+        if record.error is not None:
+            stats.add_error(record)
+    stats.imported += len(valid)
+
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(key=checkpoint_key)
+    checkpoint.offset = records[-1].end
+    checkpoint.imported += len(valid)
+    checkpoint.skipped += len(records) - len(valid)
+    checkpoint.save()
+
+
+def resume_offset(checkpoint_key: str, start: int) -> int:
+    offset = ImportCheckpoint.objects.filter(key=checkpoint_key).values_list('offset', flat=True).first()
+    return max(start, offset or 0)
+
+
+def import_file(path: str, fmt: str, author_id: int, chunk_size: int, checkpoint_key: str,
+                start: int = 0, end: Optional[int] = None) -> ImportStats:
+    """Importuje rekordy z przedziału pliku, wznawiając od zapisanego punktu kontrolnego."""
+    stats = ImportStats()
+    offset = resume_offset(checkpoint_key, start)
+    if fmt == 'csv':
+        records = iter_csv(path, offset)
+    else:
+        records = iter_jsonl(path, offset, end)
+    for chunk in chunked(records, chunk_size):
+        write_chunk(chunk, author_id, checkpoint_key, stats)
+    return stats
+
+
+def split_ranges(path: str, parts: int) -> list[tuple[int, int]]:
+    """Dzieli plik JSONL na `parts` przedziałów bajtowych wyrównanych do początków linii."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as handle:
+        for part in range(1, parts):
+            handle.seek(max(size * part // parts, bounds[-1]))
+            if handle.tell() > 0:
+                handle.readline()  # dojdź do początku następnej linii
+            bounds.append(min(handle.tell(), size))
+    bounds.append(size)
+    return [(low, high) for low, high in zip(bounds, bounds[1:]) if low < high]
+
+
+def import_range_worker(path: str, author_id: int, chunk_size: int, checkpoint_key: str,
+                        start: int, end: int) -> ImportStats:
+    """Punkt wejścia procesu roboczego: każdy proces ma własne połączenie z bazą."""
+    try:
+        return import_file(path, 'jsonl', author_id, chunk_size, checkpoint_key, start, end)
+    finally:
+        connections.close_all()
@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key: str) -> int:
+    """
+    Zwraca aktualną wersję dla danego klucza.
+    Brakującą wersję inicjalizujemy znacznikiem czasu, a nie zerem - dzięki temu
+    po wyrzuceniu klucza z cache nie trafimy przypadkiem na stare, wciąż żywe wpisy.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add() nie nadpisze wersji ustawionej w międzyczasie przez inny proces
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+async def aget_version(key: str) -> int:
+    """Asynchroniczny odpowiednik get_version dla widoków async."""
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        await cache.aadd(key, version, None)
+        version = await cache.aget(key, version)
+    return version
+
+
+def bump_version(key: str) -> int:
+    """Unieważnia wszystkie wpisy zależne od klucza, podbijając jego wersję."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
@@ -0,0 +1,89 @@
+"""
+Odczyty z replik bazy danych, zapisy do bazy głównej.
+
+Repliki (aliasy z LUMEN_DB_REPLICAS, budowane w settings z DB_REPLICAS) obsługują tylko
+odczyty żądań GET/HEAD, które przeszły przez ReplicaRoutingMiddleware. Wszystko inne czyta
+z bazy głównej:
+    * żądania zmieniające dane (POST itd.) i żądania, które w trakcie coś zapisały -
+      od pierwszego zapisu kolejne odczyty widzą własne zmiany,
+    * żądania sesji, która niedawno coś zapisała (ciasteczko na LUMEN_REPLICA_STICKY_SECONDS,
+      dłużej niż opóźnienie replikacji) - po ukończeniu quizu profil pokazuje nowy wynik,
+    * odczyty w transakcji (np. compare-and-swap w UserProfile.add_xp),
+    * budowa wpisów cache (blok force_primary()) - wersja w kluczu zmienia się po zatwierdzeniu
+      zmiany, a replika może jej jeszcze nie mieć; stara treść zostałaby zapisana pod nową wersją,
+    * kod poza żądaniem: wykonawcy zadań, polecenia manage.py, migracje.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@dataclass
+class RoutingState:
+    # Replika wybrana dla żądania; None - żądanie czyta z bazy głównej
+    replica: Optional[str] = None
+    wrote: bool = False
+
+
+_state: ContextVar[Optional[RoutingState]] = ContextVar('lumen_db_routing', default=None)
+_force_primary: ContextVar[bool] = ContextVar('lumen_db_force_primary', default=False)
+
+
+def replicas() -> list[str]:
+    return getattr(settings, 'LUMEN_DB_REPLICAS', [])
+
+
+def begin_request(read_from_replica: bool) -> tuple[RoutingState, object]:
+    """Ustala bazę odczytów żądania; zwraca stan i token dla end_request()."""
+    state = RoutingState(replica=random.choice(replicas()) if read_from_replica and replicas() else None)
+    return state, _state.set(state)
+
+
+def end_request(token) -> None:
+    _state.reset(token)
+
+
+@contextmanager
+def force_primary() -> Iterator[None]:
+    """Odczyty w bloku (także w sync_to_async - kontekst przechodzi do wątku) idą do bazy głównej."""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class ReplicaRouter:
+    """Router bazy: bez skonfigurowanych replik zachowuje się jak domyślny routing Django."""
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if not replicas():
+            return None
+        state = _state.get()
+        if (state is None or state.replica is None or state.wrote or _force_primary.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        state = _state.get()
+        if state is not None:
+            # Od teraz żądanie czyta z bazy głównej, a sesja dostanie ciasteczko przyklejenia
+            state.wrote = True
+        return DEFAULT_DB_ALIAS if replicas() else None
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Obiekt odczytany z repliki można powiązać z obiektem z bazy głównej - to te same dane
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, **hints) -> Optional[bool]:
+        # Schemat replik przychodzi z replikacji bazy głównej
+        return False if db in replicas() else None
@@ -0,0 +1,86 @@
+"""
+Strumieniowy eksport historii wyników (QuizResult) do JSONL/CSV.
+
+Wiersze czytamy przez values_list().iterator(), więc nie powstają instancje modeli,
+a pamięć nie rośnie z liczbą wyników.
+
+Eksport przyrostowy idzie po kluczu głównym: `since_id` wskazuje ostatni już wyeksportowany
+wynik, a `since` (data) wybiera tylko początek pierwszego eksportu. completed_at nie nadaje się
+na kursor - ustawiamy go przed zatwierdzeniem transakcji, więc wynik zatwierdzony później może
+mieć datę sprzed już wyeksportowanych i zostałby pominięty. Id z sekwencji również przydzielane
+jest przed zatwierdzeniem, dlatego eksport kończy się na pierwszym wyniku młodszym niż
+LUMEN_EXPORT_SETTLE_SECONDS - transakcje z niższymi id są już wtedy zatwierdzone.
+"""
+import csv
+import json
+from datetime import datetime, timedelta
+from itertools import takewhile
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import QuizResult
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_COLUMNS = ('id', 'user_id', 'username', 'quiz_id', 'quiz_title', 'score', 'completed_at')
+_QUERY_FIELDS = ('id', 'user_id', 'user__username', 'quiz_id', 'quiz__title', 'score', 'completed_at')
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """Zamienia datę ISO 8601 na datetime ze strefą czasową. Rzuca ValueError dla błędnych wartości."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Nieprawidłowa data: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def result_rows(since: Optional[datetime] = None, since_id: int = 0, chunk_size: int = 2000) -> Iterator[tuple]:
+    """
+    Zwraca krotki wyników o id większym niż since_id (bez since_id - zakończonych po since)
+    w kolejności id, do pierwszego wyniku, którego transakcja mogła jeszcze trwać.
+    """
+    queryset = QuizResult.objects.order_by('id')
+    if since_id:
+        queryset = queryset.filter(id__gt=since_id)
+    elif since is not None:
+        queryset = queryset.filter(completed_at__gt=since)
+    settled = timezone.now() - timedelta(seconds=settings.LUMEN_EXPORT_SETTLE_SECONDS)
+    # Nie filtrujemy po dacie w SQL: kursor przeskoczyłby młodszy wynik z niższym id
+    return takewhile(lambda row: row[-1] <= settled,
+                     queryset.values_list(*_QUERY_FIELDS).iterator(chunk_size=chunk_size))
+
+
+def _as_dict(row: tuple) -> dict:
+    record = dict(zip(EXPORT_COLUMNS, row))
+    record['completed_at'] = record['completed_at'].isoformat()
+    return record
+
+
+def render_jsonl(rows: Iterable[tuple]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(_as_dict(row), ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """Pseudo-plik dla csv.writer: zamiast buforować, oddaje zapisany wiersz."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def render_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(_as_dict(row).values())
+
+
+def render_rows(rows: Iterable[tuple], export_format: str) -> Iterator[str]:
+    return render_csv(rows) if export_format == 'csv' else render_jsonl(rows)
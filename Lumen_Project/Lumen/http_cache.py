@@ -0,0 +1,108 @@
+"""
+Warunkowe GET (ETag/Last-Modified) i cache gotowych odpowiedzi JSON dla API quizów.
+
+ETag wynika z wersji treści quizu (snapshot.get_quiz_version), więc odpowiedź 304 nie wymaga
+ani zapytań do bazy, ani serializacji. Pełne treści - zwykła i skompresowana gzipem - są
+trzymane w cache osobno dla widoku administratora i zwykłego użytkownika, bo
+AnswerSerializer ukrywa is_correct przed użytkownikami bez is_staff.
+"""
+import gzip
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .db_routing import force_primary
+from .snapshot import QUIZ_CACHE_TIMEOUT, get_quiz_version
+
+# Wymuszamy rewalidację przy każdym użyciu - klient zawsze pyta, ale zwykle dostaje 304
+CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+
+@dataclass(frozen=True)
+class CachedPayload:
+    etag: str
+    last_modified: float
+    body: bytes
+    gzipped: bytes
+
+
+def _variant(is_staff: bool) -> str:
+    return 'staff' if is_staff else 'public'
+
+
+def accepts_gzip(request: HttpRequest) -> bool:
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def _encoded_etag(etag: str, gzipped: bool) -> str:
+    # Silny ETag musi się różnić między kodowaniami tej samej treści
+    return f'"{etag}-gzip"' if gzipped else f'"{etag}"'
+
+
+def quiz_etag(quiz_id: int, is_staff: bool) -> str:
+    return f'quiz-{quiz_id}-{get_quiz_version(quiz_id)}-{_variant(is_staff)}'
+
+
+def list_etag(parts: Iterable) -> str:
+    """ETag strony listy: skrót z identyfikatorów i wersji quizów na stronie oraz parametrów strony."""
+    return 'quizzes-' + hashlib.sha1(repr(tuple(parts)).encode()).hexdigest()
+
+
+def _payload_key(etag: str) -> str:
+    return f'lumen:payload:{etag}'
+
+
+def get_quiz_payload(quiz_id: int, is_staff: bool, render: Callable[[], Optional[bytes]]) -> Optional[CachedPayload]:
+    """Zwraca gotową treść quizu dla bieżącej wersji, renderując ją tylko przy pierwszym odczycie."""
+    etag = quiz_etag(quiz_id, is_staff)
+    payload = cache.get(_payload_key(etag))
+    if payload is None:
+        with force_primary():
+            body = render()
+        if body is None:
+            return None
+        payload = CachedPayload(etag=etag, last_modified=time.time(), body=body, gzipped=gzip.compress(body))
+        # add(): przy równoległym budowaniu zostaje pierwsza wersja i jej Last-Modified
+        cache.add(_payload_key(etag), payload, QUIZ_CACHE_TIMEOUT)
+        payload = cache.get(_payload_key(etag), payload)
+    return payload
+
+
+def conditional_response(request: HttpRequest, etag: str, last_modified: Optional[float] = None,
+                         gzipped: bool = False) -> Optional[HttpResponse]:
+    """Zwraca 304 Not Modified, jeśli klient ma aktualną wersję; w przeciwnym razie None."""
+    response = get_conditional_response(
+        request, etag=_encoded_etag(etag, gzipped),
+        last_modified=int(last_modified) if last_modified is not None else None,
+    )
+    if response is not None:
+        response['ETag'] = _encoded_etag(etag, gzipped)
+        _patch_headers(response)
+    return response
+
+
+def payload_response(request: HttpRequest, payload: CachedPayload) -> HttpResponse:
+    gzipped = accepts_gzip(request)
+    response = HttpResponse(payload.gzipped if gzipped else payload.body, content_type='application/json')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['Last-Modified'] = http_date(payload.last_modified)
+    set_etag(request, response, payload.etag)
+    return response
+
+
+def set_etag(request: HttpRequest, response: HttpResponse, etag: str) -> None:
+    response['ETag'] = _encoded_etag(etag, response.get('Content-Encoding') == 'gzip')
+    _patch_headers(response)
+
+
+def _patch_headers(response: HttpResponse) -> None:
+    patch_cache_control(response, **CACHE_CONTROL)
+    # Treść zależy od kodowania i od tego, czy użytkownik jest administratorem
+    patch_vary_headers(response, ('Accept-Encoding', 'Cookie', 'Authorization'))
@@ -0,0 +1,203 @@
+"""
+Pochodne przesyłanych obrazów: awatarów, okładek quizów i ilustracji pytań.
+
+Żądanie z przesłanym plikiem zapisuje tylko oryginał i zadanie w kolejce (Lumen/jobs.py).
+Wykonawca skaluje obraz do kilku stałych rozmiarów w WebP, dokłada kilkudziesięciobajtowy
+placeholder i przypina wynik (ImageAsset) do obiektu. Pliki są adresowane skrótem SHA-256
+oryginału - ten sam obraz przesłany kilka razy przetwarzamy i przechowujemy raz.
+
+Szablony korzystają z tagu `{% responsive_image %}` (templatetags/lumen_images.py), a API
+z pola ImageVariantsField; do czasu przetworzenia obu wystarcza oryginał.
+"""
+import base64
+import hashlib
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_save, pre_save
+from PIL import Image, ImageOps
+
+from .jobs import enqueue, register_job
+from .models import ImageAsset
+
+# Najdłuższy bok każdego rozmiaru w pikselach (obrazów nie powiększamy)
+DERIVATIVE_SIZES = getattr(settings, 'LUMEN_IMAGE_SIZES', {'thumb': 160, 'medium': 640, 'large': 1280})
+WEBP_QUALITY = getattr(settings, 'LUMEN_IMAGE_QUALITY', 80)
+PLACEHOLDER_SIZE = 16
+DERIVATIVES_DIR = 'derivatives'
+
+
+def derivative_name(digest: str, size: str) -> str:
+    return f'{DERIVATIVES_DIR}/{digest[:2]}/{digest}/{size}.webp'
+
+
+def scaled(width: int, height: int, edge: int) -> tuple[int, int]:
+    """Wymiary obrazu po zmniejszeniu do najdłuższego boku `edge` (tak jak Image.thumbnail)."""
+    longest = max(width, height)
+    if longest <= edge:
+        return width, height
+    return max(1, round(width * edge / longest)), max(1, round(height * edge / longest))
+
+
+@dataclass(frozen=True)
+class ImageVariants:
+    """Oryginał i (po przetworzeniu) jego pochodne - bez odwołań do bazy, więc nadaje się do migawek."""
+    original: str
+    digest: str = ''
+    width: int = 0
+    height: int = 0
+    placeholder: str = ''
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.digest)
+
+    def url(self, size: str) -> str:
+        return default_storage.url(derivative_name(self.digest, size)) if self.ready else self.original
+
+    def dimensions(self, size: str) -> tuple[int, int]:
+        return scaled(self.width, self.height, DERIVATIVE_SIZES[size])
+
+    def srcset(self) -> str:
+        # Rozmiary większe od oryginału są jego kopią - w srcset wystarczy jeden wpis na szerokość
+        entries = {}
+        for size in DERIVATIVE_SIZES:
+            entries.setdefault(self.dimensions(size)[0], self.url(size))
+        return ', '.join(f'{url} {width}w' for width, url in entries.items())
+
+    def as_dict(self) -> dict:
+        data = {'original': self.original, 'ready': self.ready}
+        if self.ready:
+            data.update({'width': self.width, 'height': self.height, 'placeholder': self.placeholder})
+            data.update({size: self.url(size) for size in DERIVATIVE_SIZES})
+        return data
+
+
+def image_variants(file: Optional[FieldFile], asset: Optional[ImageAsset]) -> Optional[ImageVariants]:
+    """Warianty obrazu z pola pliku i przypiętego ImageAsset (None, gdy obrazu nie ma)."""
+    if not file:
+        return None
+    if asset is None:
+        return ImageVariants(original=file.url)
+    return ImageVariants(original=file.url, digest=asset.digest, width=asset.width, height=asset.height,
+                         placeholder=asset.placeholder)
+
+
+def _webp(image: Image.Image, quality: int = WEBP_QUALITY) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, 'WEBP', quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def process_image(file) -> ImageAsset:
+    """Tworzy (lub odnajduje po skrócie treści) pochodne otwartego pliku obrazu."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+
+    asset = ImageAsset.objects.filter(digest=digest).first()
+    if asset is not None and all(default_storage.exists(derivative_name(digest, size)) for size in DERIVATIVE_SIZES):
+        return asset
+
+    file.seek(0)
+    with Image.open(file) as source:
+        # Zdjęcia z telefonów bywają obrócone tylko w metadanych EXIF
+        image = ImageOps.exif_transpose(source)
+        transparent = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    for size, edge in DERIVATIVE_SIZES.items():
+        name = derivative_name(digest, size)
+        if not default_storage.exists(name):
+            variant = image.copy()
+            variant.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            default_storage.save(name, ContentFile(_webp(variant)))
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(_webp(tiny, quality=30)).decode()
+
+    asset, _ = ImageAsset.objects.get_or_create(digest=digest, defaults={
+        'width': image.width, 'height': image.height, 'placeholder': placeholder,
+    })
+    return asset
+
+
+# (etykieta modelu, pole obrazu) -> funkcja wywoływana po przypięciu pochodnych (np. unieważnienie cache)
+TRACKED_FIELDS: dict[tuple[str, str], Optional[Callable[[models.Model], None]]] = {}
+
+
+def track_image_field(model: type[models.Model], field: str,
+                      on_ready: Optional[Callable[[models.Model], None]] = None) -> None:
+    """
+    Po zapisie obiektu z nowym obrazem w polu `field` zleca budowę pochodnych. Model musi mieć
+    klucz obcy `<field>_asset` do ImageAsset; nowy lub usunięty obraz od razu go czyści.
+    """
+    TRACKED_FIELDS[(model._meta.label, field)] = on_ready
+    asset_field = f'{field}_asset'
+
+    def remember_upload(sender, instance, **kwargs) -> None:
+        file = getattr(instance, field)
+        # Niezatwierdzony plik to świeżo przesłany obraz - FileField zapisze go dopiero w trakcie save()
+        uploaded = bool(file) and not file._committed
+        cleared = not file and getattr(instance, f'{asset_field}_id') is not None
+        if uploaded or cleared:
+            instance._changed_images = getattr(instance, '_changed_images', set()) | {field}
+
+    def schedule_derivatives(sender, instance, **kwargs) -> None:
+        changed = getattr(instance, '_changed_images', set())
+        if field not in changed:
+            return
+        changed.discard(field)
+        # UPDATE zamiast save(): zapis mógł mieć update_fields bez pola pochodnych
+        sender.objects.filter(pk=instance.pk).update(**{asset_field: None})
+        setattr(instance, asset_field, None)
+        file = getattr(instance, field)
+        if file:
+            enqueue_derivatives(instance, field)
+
+    pre_save.connect(remember_upload, sender=model, weak=False, dispatch_uid=f'images-pre-{model._meta.label}-{field}')
+    post_save.connect(schedule_derivatives, sender=model, weak=False,
+                      dispatch_uid=f'images-post-{model._meta.label}-{field}')
+
+
+def enqueue_derivatives(instance: models.Model, field: str):
+    return enqueue('image_derivatives', {
+        'model': instance._meta.label, 'pk': instance.pk, 'field': field, 'name': getattr(instance, field).name,
+    }, max_attempts=3)
+
+
+def enqueue_missing_derivatives() -> int:
+    """Zleca pochodne wszystkich obrazów, które ich jeszcze nie mają (np. przesłanych przed wdrożeniem)."""
+    count = 0
+    for label, field in TRACKED_FIELDS:
+        model = apps.get_model(label)
+        pending = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}) \
+            .filter(**{f'{field}_asset__isnull': True}).only('pk', field)
+        for instance in pending.iterator():
+            enqueue_derivatives(instance, field)
+            count += 1
+    return count
+
+
+@register_job('image_derivatives')
+def build_image_derivatives(payload: dict) -> None:
+    model = apps.get_model(payload['model'])
+    field, name = payload['field'], payload['name']
+    instance = model.objects.filter(pk=payload['pk']).first()
+    file = getattr(instance, field) if instance is not None else None
+    if not file or file.name != name:
+        return  # Obraz usunięto lub podmieniono - pochodne nowego zbuduje nowsze zadanie
+    with file.open('rb'):
+        asset = process_image(file)
+    # Przypinamy tylko wtedy, gdy obiekt nadal wskazuje ten sam plik
+    if model.objects.filter(pk=instance.pk, **{field: name}).update(**{f'{field}_asset': asset}):
+        on_ready = TRACKED_FIELDS.get((payload['model'], field))
+        if on_ready is not None:
+            on_ready(instance)
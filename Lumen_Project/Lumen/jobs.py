@@ -0,0 +1,170 @@
+"""
+Kolejka zadań w tle oparta na bazie danych - bez zewnętrznego brokera.
+
+Zadanie to wiersz Job zapisany przez enqueue() w transakcji żądania: trafia do kolejki tylko
+razem z danymi, których dotyczy (np. nowym kontem), a powolna usługa zewnętrzna (SMTP) nie
+blokuje żądania. Wykonawcy (`manage.py run_workers`) zajmują gotowe zadania partiami jednym
+warunkowym UPDATE - dwa wątki lub procesy nie wykonają tego samego zadania. Nieudane zadanie
+wraca do kolejki z wykładniczo rosnącym opóźnieniem, a po wyczerpaniu prób zostaje oznaczone
+jako nieudane, z treścią błędu do wglądu w panelu admina.
+
+Zadania jednego rodzaju z partii mogą współdzielić zasób - wszystkie maile z partii
+wychodzą jednym połączeniem SMTP.
+"""
+import logging
+import os
+import socket
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import groupby
+from typing import Any, Callable, ContextManager, Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .services import reconcile_category_counters, reconcile_quiz_counters
+
+logger = logging.getLogger('lumen.jobs')
+
+# Opóźnienie pierwszej ponownej próby (w sekundach), podwajane przy każdej kolejnej
+RETRY_DELAY = getattr(settings, 'LUMEN_JOB_RETRY_DELAY', 30)
+MAX_RETRY_DELAY = getattr(settings, 'LUMEN_JOB_MAX_RETRY_DELAY', 60 * 60)
+# Zadanie "w trakcie" dłużej niż tyle sekund uznajemy za porzucone przez wykonawcę, który przestał działać
+LOCK_TIMEOUT = getattr(settings, 'LUMEN_JOB_LOCK_TIMEOUT', 10 * 60)
+BATCH_SIZE = 20
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    func: Callable[..., None]
+    # Fabryka menedżera kontekstu współdzielonego przez partię; zasób trafia do funkcji jako drugi argument
+    resource: Optional[Callable[[], ContextManager]] = None
+
+
+HANDLERS: dict[str, JobHandler] = {}
+
+
+def register_job(name: str, resource: Optional[Callable[[], ContextManager]] = None) -> Callable:
+    """Rejestruje funkcję wykonującą zadania o podanej nazwie."""
+    def decorator(func: Callable[..., None]) -> Callable[..., None]:
+        HANDLERS[name] = JobHandler(func, resource)
+        return func
+    return decorator
+
+
+def enqueue(name: str, payload: Optional[dict[str, Any]] = None, *, delay: int = 0, max_attempts: int = 5) -> Job:
+    """Dodaje zadanie do kolejki; w transakcji będzie widoczne dla wykonawców dopiero po jej zatwierdzeniu."""
+    if name not in HANDLERS:
+        raise ValueError(f"Nieznane zadanie: {name}")
+    return Job.objects.create(
+        name=name, payload=payload or {}, max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_email(subject: str, body: str, to: list[str]) -> Job:
+    return enqueue('send_email', {'subject': subject, 'body': body, 'to': to})
+
+
+def retry_delay(attempts: int) -> int:
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+
+def _ready(now) -> Q:
+    stale = now - timedelta(seconds=LOCK_TIMEOUT)
+    return Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale)
+
+
+def claim_jobs(worker: str, limit: int = BATCH_SIZE) -> list[Job]:
+    """Zajmuje do `limit` najstarszych gotowych zadań i zwraca je pogrupowane po nazwie."""
+    now = timezone.now()
+    ids = list(Job.objects.filter(_ready(now)).order_by('run_at', 'id').values_list('pk', flat=True)[:limit])
+    if not ids:
+        return []
+    # Warunek gotowości jest sprawdzany ponownie w UPDATE - przy wyścigu zadanie zajmie tylko jeden wykonawca
+    Job.objects.filter(_ready(now), pk__in=ids).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+    )
+    return list(Job.objects.filter(pk__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now)
+                .order_by('name', 'id'))
+
+
+def _finish(job: Job) -> None:
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+
+
+def _fail(job: Job, error: str) -> None:
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        logger.error("Zadanie %s #%s nieudane po %s próbach: %s", job.name, job.pk, job.attempts, error)
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, finished_at=now, last_error=error)
+    else:
+        logger.warning("Zadanie %s #%s nieudane (próba %s): %s", job.name, job.pk, job.attempts, error)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.PENDING, run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+            locked_by='', locked_at=None, last_error=error,
+        )
+
+
+def run_jobs(jobs: list[Job]) -> None:
+    """Wykonuje zajęte zadania; zadania jednego rodzaju korzystają ze wspólnego zasobu."""
+    for name, group in groupby(jobs, key=lambda job: job.name):
+        remaining = list(group)
+        handler = HANDLERS.get(name)
+        if handler is None:
+            for job in remaining:
+                job.attempts = job.max_attempts
+                _fail(job, f"Nieznane zadanie: {name}")
+            continue
+        try:
+            with (handler.resource() if handler.resource else nullcontext()) as resource:
+                while remaining:
+                    job = remaining.pop(0)
+                    try:
+                        if handler.resource:
+                            handler.func(job.payload, resource)
+                        else:
+                            handler.func(job.payload)
+                    except Exception as exc:
+                        _fail(job, f'{type(exc).__name__}: {exc}')
+                    else:
+                        _finish(job)
+        except Exception as exc:
+            # Nie udało się otworzyć zasobu (np. połączenia SMTP) - cała reszta partii czeka na ponowną próbę
+            for job in remaining:
+                _fail(job, f'{type(exc).__name__}: {exc}')
+
+
+def work(worker: Optional[str] = None, batch_size: int = BATCH_SIZE) -> int:
+    """Wykonuje jedną partię zadań; zwraca jej rozmiar (0 - kolejka pusta)."""
+    jobs = claim_jobs(worker or worker_name(), batch_size)
+    run_jobs(jobs)
+    return len(jobs)
+
+
+def work_off(worker: Optional[str] = None, batch_size: int = BATCH_SIZE) -> int:
+    """Wykonuje gotowe zadania aż do opróżnienia kolejki (np. w testach i przy `run_workers --once`)."""
+    total = 0
+    while processed := work(worker, batch_size):
+        total += processed
+    return total
+
+
+@register_job('send_email', resource=get_connection)
+def send_email(payload: dict[str, Any], connection) -> None:
+    EmailMessage(payload['subject'], payload['body'], to=payload['to'], connection=connection).send()
+
+
+@register_job('reconcile_counters')
+def reconcile_counters(payload: dict[str, Any]) -> None:
+    reconcile_quiz_counters()
+    reconcile_category_counters()
@@ -0,0 +1,302 @@
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import F, Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LeaderboardEntry, LeaderboardRankNode
+
+GLOBAL_BOARD = 'global'
+DEFAULT_STORE = 'Lumen.leaderboards.DatabaseLeaderboardStore'
+
+
+def quiz_board(quiz_id: int) -> str:
+    return f'quiz:{quiz_id}'
+
+
+class RankedEntry(NamedTuple):
+    rank: int
+    user_id: int
+    score: int
+
+
+class LeaderboardStore:
+    """
+    Interfejs magazynu rankingów. Kolejność: wynik malejąco, przy remisie niższe id użytkownika.
+    Rangi są liczone od 1.
+    """
+
+    def submit(self, board: str, user_id: int, score: int, keep_best: bool = False) -> None:
+        """Zapisuje wynik użytkownika. Przy keep_best=True zachowuje wyższy z wyników."""
+        raise NotImplementedError
+
+    def top(self, board: str, limit: int) -> list[RankedEntry]:
+        raise NotImplementedError
+
+    def rank(self, board: str, user_id: int) -> Optional[int]:
+        raise NotImplementedError
+
+    def around(self, board: str, user_id: int, radius: int) -> list[RankedEntry]:
+        """Zwraca otoczenie użytkownika: do `radius` pozycji nad nim i pod nim."""
+        raise NotImplementedError
+
+    def replace_board(self, board: str, scores: Iterable[tuple[int, int]]) -> None:
+        """Zastępuje cały ranking podanymi parami (user_id, wynik)."""
+        raise NotImplementedError
+
+    def clear(self, board: str) -> None:
+        raise NotImplementedError
+
+    def remove_user(self, user_id: int) -> None:
+        """Usuwa pozycje użytkownika ze wszystkich rankingów (przed usunięciem konta)."""
+        raise NotImplementedError
+
+
+# Zakres wyników drzewa rang (potęga dwójki); wyższe wyniki liczą się jak TREE_SIZE - 1
+TREE_SIZE = 2 ** 32
+
+
+def _tree_index(score: int) -> int:
+    # Indeksy rosną od najwyższego wyniku. Węzeł obejmuje wtedy pasmo wyników [m * 2^k, (m + 1) * 2^k)
+    # z nieparzystym m, więc zapisy wyników różnego rzędu nie blokują wspólnych wierszy. Wszystkie pozycje
+    # dzieli tylko korzeń (TREE_SIZE) - liczby pozycji z wyższym wynikiem nigdy go nie czytają, więc go nie zapisujemy.
+    return TREE_SIZE - min(max(score, 0), TREE_SIZE - 1)
+
+
+def update_nodes(score: int) -> list[int]:
+    """Węzły drzewa Fenwicka (bez korzenia), które obejmują wynik - zmieniane przy dodaniu lub usunięciu pozycji."""
+    index, nodes = _tree_index(score), []
+    while index < TREE_SIZE:
+        nodes.append(index)
+        index += index & -index
+    return nodes
+
+
+def above_nodes(score: int) -> list[int]:
+    """Węzły, których suma to liczba pozycji z wynikiem wyższym niż `score`."""
+    index, nodes = _tree_index(score) - 1, []
+    while index:
+        nodes.append(index)
+        index -= index & -index
+    return nodes
+
+
+def node_deltas(deltas: dict[int, int]) -> Counter:
+    """Zmiany liczników węzłów dla przyrostów liczby pozycji na wynik - wspólne węzły się znoszą."""
+    nodes = Counter()
+    for score, delta in deltas.items():
+        for node in update_nodes(score):
+            nodes[node] += delta
+    return Counter({node: delta for node, delta in nodes.items() if delta})
+
+
+def tree_counts(scores: Iterable[int]) -> Counter:
+    """Liczniki węzłów drzewa dla podanych wyników (przebudowa rankingu i migracja)."""
+    counts = Counter()
+    for score in scores:
+        counts.update(update_nodes(score))
+    return counts
+
+
+class DatabaseLeaderboardStore(LeaderboardStore):
+    """
+    Ranking w tabeli LeaderboardEntry z drzewem rang (LeaderboardRankNode). Liczbę pozycji
+    z wyższym wynikiem daje jeden odczyt najwyżej 32 węzłów po kluczu - koszt nie rośnie
+    z rangą, jak przy COUNT(*) wszystkich wierszy przed graczem. Remisy (ten sam wynik, niższe
+    id) liczymy zakresem indeksu (board, -score, user), więc płacimy tylko za liczbę remisów.
+    Zapis wyniku to kilka poleceń w jednej transakcji: pozycja i dwie ścieżki w drzewie.
+    """
+
+    def submit(self, board: str, user_id: int, score: int, keep_best: bool = False) -> None:
+        with transaction.atomic():
+            # get_or_create przy wyścigu dwóch pierwszych zapisów zwróci wiersz zwycięzcy
+            entry, created = LeaderboardEntry.objects.get_or_create(
+                board=board, user_id=user_id, defaults={'score': score},
+            )
+            if created:
+                self._adjust(board, {score: 1})
+                return
+            # Blokada wiersza: równoległe zapisy tego samego gracza zmieniają drzewo po kolei
+            old = LeaderboardEntry.objects.select_for_update().filter(pk=entry.pk) \
+                .values_list('score', flat=True).get()
+            if old == score or (keep_best and old >= score):
+                return
+            LeaderboardEntry.objects.filter(pk=entry.pk).update(score=score, updated_at=timezone.now())
+            self._adjust(board, {old: -1, score: 1})
+
+    def _adjust(self, board: str, deltas: dict[int, int]) -> None:
+        """Zmienia liczniki węzłów o podane przyrosty na wynik (wspólne węzły się znoszą)."""
+        nodes = node_deltas(deltas)
+        if not nodes:
+            return
+        by_delta = defaultdict(list)
+        for node, delta in nodes.items():
+            by_delta[delta].append(node)
+        LeaderboardRankNode.objects.bulk_create(
+            [LeaderboardRankNode(board=board, node=node) for node in sorted(nodes)], ignore_conflicts=True,
+        )
+        for delta, changed in by_delta.items():
+            LeaderboardRankNode.objects.filter(board=board, node__in=changed).update(count=F('count') + delta)
+
+    def remove_user(self, user_id: int) -> None:
+        with transaction.atomic():
+            entries = list(LeaderboardEntry.objects.select_for_update().filter(user_id=user_id)
+                           .values_list('pk', 'board', 'score'))
+            for _, board, score in entries:
+                self._adjust(board, {score: -1})
+            LeaderboardEntry.objects.filter(pk__in=[pk for pk, _, _ in entries]).delete()
+
+    def top(self, board: str, limit: int) -> list[RankedEntry]:
+        rows = LeaderboardEntry.objects.filter(board=board).order_by('-score', 'user_id').values_list(
+            'user_id', 'score'
+        )[:limit]
+        return [RankedEntry(position, user_id, score) for position, (user_id, score) in enumerate(rows, start=1)]
+
+    def count_above(self, board: str, score: int) -> int:
+        """Liczba pozycji z wynikiem wyższym niż `score` - jeden odczyt węzłów drzewa."""
+        return sum(LeaderboardRankNode.objects.filter(board=board, node__in=above_nodes(score))
+                   .values_list('count', flat=True))
+
+    def _position(self, board: str, user_id: int) -> Optional[tuple[int, int]]:
+        score = LeaderboardEntry.objects.filter(board=board, user_id=user_id).values_list('score', flat=True).first()
+        if score is None:
+            return None
+        ties_ahead = LeaderboardEntry.objects.filter(board=board, score=score, user_id__lt=user_id).count()
+        return score, self.count_above(board, score) + ties_ahead + 1
+
+    def rank(self, board: str, user_id: int) -> Optional[int]:
+        position = self._position(board, user_id)
+        return position[1] if position else None
+
+    def around(self, board: str, user_id: int, radius: int) -> list[RankedEntry]:
+        position = self._position(board, user_id)
+        if position is None:
+            return []
+        score, rank = position
+        entries = LeaderboardEntry.objects.filter(board=board)
+        above = list(entries.filter(
+            Q(score__gt=score) | Q(score=score, user_id__lt=user_id)
+        ).order_by('score', '-user_id').values_list('user_id', 'score')[:radius])
+        below = list(entries.filter(
+            Q(score__lt=score) | Q(score=score, user_id__gte=user_id)
+        ).order_by('-score', 'user_id').values_list('user_id', 'score')[:radius + 1])
+        rows = above[::-1] + below
+        first_rank = rank - len(above)
+        return [RankedEntry(first_rank + i, uid, value) for i, (uid, value) in enumerate(rows)]
+
+    @transaction.atomic
+    def replace_board(self, board: str, scores: Iterable[tuple[int, int]]) -> None:
+        self.clear(board)
+        scores = list(scores)
+        LeaderboardEntry.objects.bulk_create(
+            (LeaderboardEntry(board=board, user_id=user_id, score=score) for user_id, score in scores),
+            batch_size=1000,
+        )
+        LeaderboardRankNode.objects.bulk_create(
+            (LeaderboardRankNode(board=board, node=node, count=count)
+             for node, count in tree_counts(score for _, score in scores).items()),
+            batch_size=1000,
+        )
+
+    @transaction.atomic
+    def clear(self, board: str) -> None:
+        LeaderboardEntry.objects.filter(board=board).delete()
+        LeaderboardRankNode.objects.filter(board=board).delete()
+
+
+class InMemoryLeaderboardStore(LeaderboardStore):
+    """
+    Ranking w pamięci procesu na posortowanej liście kluczy (-wynik, user_id).
+    Ranga to wyszukiwanie binarne - O(log n). Przydatny w testach i jako wzorzec zachowania.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._scores: dict[str, dict[int, int]] = defaultdict(dict)
+        self._keys: dict[str, list[tuple[int, int]]] = defaultdict(list)
+
+    def _set(self, board: str, user_id: int, score: int) -> None:
+        scores, keys = self._scores[board], self._keys[board]
+        old = scores.get(user_id)
+        if old is not None:
+            del keys[bisect_left(keys, (-old, user_id))]
+        insort(keys, (-score, user_id))
+        scores[user_id] = score
+
+    def submit(self, board: str, user_id: int, score: int, keep_best: bool = False) -> None:
+        with self._lock:
+            old = self._scores[board].get(user_id)
+            if keep_best and old is not None and old >= score:
+                return
+            self._set(board, user_id, score)
+
+    def top(self, board: str, limit: int) -> list[RankedEntry]:
+        with self._lock:
+            keys = self._keys[board][:limit]
+        return [RankedEntry(position, user_id, -neg_score) for position, (neg_score, user_id) in enumerate(keys, 1)]
+
+    def _index(self, board: str, user_id: int) -> Optional[int]:
+        score = self._scores[board].get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys[board], (-score, user_id))
+
+    def rank(self, board: str, user_id: int) -> Optional[int]:
+        with self._lock:
+            index = self._index(board, user_id)
+        return None if index is None else index + 1
+
+    def around(self, board: str, user_id: int, radius: int) -> list[RankedEntry]:
+        with self._lock:
+            index = self._index(board, user_id)
+            if index is None:
+                return []
+            start = max(0, index - radius)
+            keys = self._keys[board][start:index + radius + 1]
+        return [RankedEntry(start + i + 1, uid, -neg_score) for i, (neg_score, uid) in enumerate(keys)]
+
+    def replace_board(self, board: str, scores: Iterable[tuple[int, int]]) -> None:
+        with self._lock:
+            self._scores[board] = dict(scores)
+            self._keys[board] = sorted((-score, user_id) for user_id, score in self._scores[board].items())
+
+    def clear(self, board: str) -> None:
+        with self._lock:
+            self._scores.pop(board, None)
+            self._keys.pop(board, None)
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            for board, scores in self._scores.items():
+                score = scores.pop(user_id, None)
+                if score is not None:
+                    keys = self._keys[board]
+                    del keys[bisect_left(keys, (-score, user_id))]
+
+
+@lru_cache(maxsize=None)
+def get_leaderboard_store() -> LeaderboardStore:
+    """Zwraca magazyn rankingów wskazany w LUMEN_LEADERBOARD_STORE (domyślnie tabela w bazie)."""
+    return import_string(getattr(settings, 'LUMEN_LEADERBOARD_STORE', DEFAULT_STORE))()
+
+
+@receiver(setting_changed)
+def reset_leaderboard_store(setting: str, **kwargs) -> None:
+    if setting == 'LUMEN_LEADERBOARD_STORE':
+        get_leaderboard_store.cache_clear()
+
+
+def record_leaderboard_scores(user: AbstractBaseUser, quiz_id: int, score: int) -> None:
+    """Przyrostowo aktualizuje ranking quizu (najlepszy wynik) i ranking globalny (łączne XP)."""
+    store = get_leaderboard_store()
+    store.submit(quiz_board(quiz_id), user.pk, score, keep_best=True)
+    store.submit(GLOBAL_BOARD, user.pk, user.profile.total_xp)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from Lumen.images import enqueue_missing_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Zleca budowę pochodnych (WebP, placeholder) obrazów, które ich jeszcze nie mają'
+
+    def handle(self, *args, **options):
+        count = enqueue_missing_derivatives()
+        self.stdout.write(self.style.SUCCESS(
+            f"Sukces! Zlecono pochodne {count} obrazów - wykona je `python manage.py run_workers`."
+        ))
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Lumen.exports import EXPORT_FORMATS, parse_since, render_rows, result_rows
+
+
+class Command(BaseCommand):
+    help = 'Strumieniowo eksportuje historię wyników quizów do JSONL/CSV (opcjonalnie tylko przyrost)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl')
+        parser.add_argument('--output', type=str, help='Plik wynikowy (domyślnie standardowe wyjście)')
+        parser.add_argument('--since', type=str, help='Pierwszy eksport: wyniki zakończone po tej dacie (ISO 8601)')
+        parser.add_argument('--since-id', type=int, default=0, help='Eksportuj wyniki o id większym niż podane')
+        parser.add_argument('--state-file', type=str,
+                            help='Plik JSON z pozycją ostatniego eksportu - odczytywany na starcie i nadpisywany na końcu')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        since_value, since_id = options['since'], options['since_id']
+        state_file = options['state_file']
+        if state_file and not (since_value or since_id):
+            try:
+                with open(state_file, encoding='utf-8') as handle:
+                    since_id = json.load(handle)['since_id']
+            except FileNotFoundError:
+                pass
+        try:
+            since = parse_since(since_value)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        last = {}
+
+        def tracked(rows):
+            # Zapamiętujemy pozycję ostatniego wiersza, aby kolejny eksport zaczął się tuż za nim
+            for row in rows:
+                last['since_id'] = row[0]
+                yield row
+
+        rows = tracked(result_rows(since, since_id, options['chunk_size']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as handle:
+                for chunk in render_rows(rows, options['format']):
+                    handle.write(chunk)
+        else:
+            for chunk in render_rows(rows, options['format']):
+                self.stdout.write(chunk, ending='')
+
+        if state_file and last:
+            with open(state_file, 'w', encoding='utf-8') as handle:
+                json.dump(last, handle)
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Sukces! Wyeksportowano wyniki do {options['output']}."))
@@ -1,12 +1,103 @@
 import requests
 import html
 import random
-from django.core.management.base import BaseCommand
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from Lumen.models import Quiz, Question, Answer
+from Lumen.services import resolve_category
+from Lumen.snapshot import invalidate_quiz
 
 User = get_user_model()
 
+# Kody odpowiedzi OpenTDB
+RESPONSE_SUCCESS = 0
+RESPONSE_NO_RESULTS = 1
+RESPONSE_TOKEN_NOT_FOUND = 3
+RESPONSE_TOKEN_EMPTY = 4
+RESPONSE_RATE_LIMIT = 5
+
+
+class RateLimiter:
+    """Wspólny dla wszystkich wątków limit: najwyżej jedno żądanie na `interval` sekund."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class OpenTDBClient:
+    """
+    Klient OpenTDB na jednej sesji HTTP z pulą połączeń.
+    Pilnuje tokenu sesji (brak powtórzeń pytań) i limitu zapytań API.
+    """
+
+    def __init__(self, base_url: str, workers: int, interval: float, retries: int = 5) -> None:
+        self.api_url = f"{base_url.rstrip('/')}/api.php"
+        self.token_url = f"{base_url.rstrip('/')}/api_token.php"
+        self.limiter = RateLimiter(interval)
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._token_lock = threading.Lock()
+        self.token = None
+
+    def _get(self, url: str, params: dict) -> dict:
+        self.limiter.wait()
+        response = self.session.get(url, params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def _refresh_token(self, stale_token) -> None:
+        """Pobiera nowy token - tylko raz, nawet gdy kilka wątków zauważy wygaśnięcie jednocześnie."""
+        with self._token_lock:
+            if self.token != stale_token:
+                return
+            data = self._get(self.token_url, {'command': 'request'})
+            self.token = data.get('token')
+
+    def fetch(self, category_id: int, amount: int) -> list[dict]:
+        if self.token is None:
+            self._refresh_token(None)
+
+        for _ in range(self.retries):
+            token = self.token
+            params = {'amount': amount, 'category': category_id, 'type': 'multiple'}
+            if token:
+                params['token'] = token
+            data = self._get(self.api_url, params)
+            code = data.get('response_code')
+
+            if code == RESPONSE_SUCCESS:
+                return data.get('results', [])
+            if code in (RESPONSE_TOKEN_NOT_FOUND, RESPONSE_TOKEN_EMPTY):
+                # Token wygasł albo wyczerpał pulę pytań - zaczynamy nową sesję
+                self._refresh_token(token)
+            elif code == RESPONSE_RATE_LIMIT:
+                # Limiter już rozkłada żądania, ale serwer mógł liczyć inaczej - czekamy dodatkowy interwał
+                time.sleep(self.limiter.interval)
+            else:
+                return []
+        return []
+
+    def close(self) -> None:
+        self.session.close()
+
 
 class Command(BaseCommand):
     help = 'Pobiera quizy z Open Trivia DB i zapisuje w bazie danych'
@@ -16,29 +107,63 @@ class Command(BaseCommand):
         "Komputery": 18, "Filmy": 11, "Muzyka": 12,
         "Gry Wideo": 15, "Mitologia": 20,
     }
-    OPENTDB_API_URL = "https://opentdb.com/api.php"
+    OPENTDB_BASE_URL = "https://opentdb.com"
+    # OpenTDB pozwala na jedno zapytanie na 5 sekund z jednego adresu IP
+    OPENTDB_RATE_LIMIT = 5.0
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=str, default='',
+                            help='Nazwy kategorii oddzielone przecinkami (domyślnie jedna losowa)')
+        parser.add_argument('--amount', type=int, default=10, help='Liczba pytań w quizie (1-50)')
+        parser.add_argument('--batches', type=int, default=1, help='Liczba quizów na kategorię')
+        parser.add_argument('--workers', type=int, default=4, help='Liczba równoległych pobrań')
+        parser.add_argument('--rate-limit', type=float, default=self.OPENTDB_RATE_LIMIT,
+                            help='Minimalny odstęp między zapytaniami do API (s)')
+        parser.add_argument('--base-url', type=str, default=self.OPENTDB_BASE_URL, help='Adres serwera OpenTDB')
 
     def handle(self, *args, **options):
-        category_name, category_id = random.choice(list(self.CATEGORIES.items()))
-        self.stdout.write(f"Pobieranie pytań dla kategorii: {category_name}...")
-
-        params = {'amount': 10, 'category': category_id, 'type': 'multiple'}
+        if not 1 <= options['amount'] <= 50:
+            raise CommandError("--amount musi być z zakresu 1-50.")
+        categories = self.parse_categories(options['categories'])
+        jobs = [(name, category_id) for name, category_id in categories for _ in range(options['batches'])]
 
+        client = OpenTDBClient(options['base_url'], options['workers'], options['rate_limit'])
+        created = 0
         try:
-            response = requests.get(self.OPENTDB_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("response_code") != 0:
-                self.stdout.write(self.style.WARNING(f"Brak pytań dla {category_name}."))
-                return
-
-            results = data.get('results', [])
-            self.create_quiz_from_data(category_name, results)
-
-        except requests.RequestException as e:
-            self.stdout.write(self.style.ERROR(f"Błąd połączenia: {e}"))
-
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                futures = {
+                    executor.submit(client.fetch, category_id, options['amount']): name
+                    for name, category_id in jobs
+                }
+                self.stdout.write(f"Pobieranie {len(jobs)} paczek pytań...")
+                # Zapis do bazy w wątku głównym, w miarę napływania kolejnych paczek
+                for future in as_completed(futures):
+                    category_name = futures[future]
+                    try:
+                        results = future.result()
+                    except requests.RequestException as e:
+                        self.stdout.write(self.style.ERROR(f"Błąd połączenia: {e}"))
+                        continue
+                    if not results:
+                        self.stdout.write(self.style.WARNING(f"Brak pytań dla {category_name}."))
+                        continue
+                    self.create_quiz_from_data(category_name, results)
+                    created += 1
+        finally:
+            client.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Zakończono import: {created} z {len(jobs)} quizów."))
+
+    def parse_categories(self, raw: str) -> list[tuple[str, int]]:
+        if not raw:
+            return [random.choice(list(self.CATEGORIES.items()))]
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.CATEGORIES]
+        if unknown:
+            raise CommandError(f"Nieznane kategorie: {', '.join(unknown)}. Dostępne: {', '.join(self.CATEGORIES)}")
+        return [(name, self.CATEGORIES[name]) for name in names]
+
+    @transaction.atomic
     def create_quiz_from_data(self, category_name, questions_data):
         # Tworzymy bota systemowego, jeśli nie istnieje
         bot_user, _ = User.objects.get_or_create(username='LumenBot', defaults={'email': 'bot@lumen.com'})
@@ -46,21 +171,21 @@ class Command(BaseCommand):
         quiz = Quiz.objects.create(
             title=f"Quiz o {category_name}",
             description=f"Automatycznie wygenerowany quiz z {len(questions_data)} pytaniami.",
-            category=category_name,
+            category=resolve_category(category_name),
             created_by=bot_user,
-            is_published=True
+            is_published=True,
+            # Pytania dodajemy przez bulk_create (bez sygnałów) - licznik ustawiamy od razu
+            question_count=len(questions_data),
         )
 
-        questions_to_create = []
-        answers_to_create = []
-
-        for i, q_data in enumerate(questions_data):
-            question = Question.objects.create(
-                quiz=quiz,
-                text=html.unescape(q_data['question']),
-                order=i + 1
-            )
+        # Bulk create dla wydajności: jedno zapytanie na wszystkie pytania i jedno na wszystkie odpowiedzi
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=html.unescape(q_data['question']), order=i + 1)
+            for i, q_data in enumerate(questions_data)
+        ])
 
+        answers_to_create = []
+        for question, q_data in zip(questions, questions_data):
             # Przygotowanie odpowiedzi
             ans_list = []
             ans_list.append(Answer(question=question, text=html.unescape(q_data['correct_answer']), is_correct=True))
@@ -70,7 +195,7 @@ class Command(BaseCommand):
             random.shuffle(ans_list)
             answers_to_create.extend(ans_list)
 
-        # Bulk create dla wydajności (zapisuje wszystkie odpowiedzi jednym zapytaniem SQL)
         Answer.objects.bulk_create(answers_to_create)
+        invalidate_quiz(quiz.pk)
 
-        self.stdout.write(self.style.SUCCESS(f"Sukces! Utworzono quiz: '{quiz.title}'"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"Sukces! Utworzono quiz: '{quiz.title}'"))
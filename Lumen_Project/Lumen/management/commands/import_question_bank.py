@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from Lumen.bank_import import ImportStats, InvalidRecord, import_file, import_range_worker, split_ranges
+from Lumen.models import ImportCheckpoint
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Strumieniowo importuje bank pytań z pliku JSONL lub CSV (paczkami, z punktami kontrolnymi)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Ścieżka do pliku .jsonl lub .csv')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help='Format pliku (domyślnie z rozszerzenia)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Liczba quizów w jednej transakcji')
+        parser.add_argument('--author', type=str, default='LumenBot', help='Nazwa użytkownika autora quizów')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Liczba procesów (tylko JSONL). Wznawiaj z tą samą liczbą procesów.')
+        parser.add_argument('--checkpoint-key', type=str, help='Klucz punktu kontrolnego (domyślnie ścieżka pliku)')
+        parser.add_argument('--restart', action='store_true', help='Ignoruj zapisany punkt kontrolny i zacznij od nowa')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"Nie znaleziono pliku: {path}")
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        workers = options['workers']
+        if workers > 1 and fmt != 'jsonl':
+            raise CommandError("Tryb wieloprocesowy obsługuje tylko pliki JSONL.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size musi być dodatnie.")
+
+        author, _ = User.objects.get_or_create(username=options['author'], defaults={'email': 'bot@lumen.com'})
+        key = options['checkpoint_key'] or os.path.abspath(path)
+        if options['restart']:
+            # Punkt kontrolny tego importu i jego zakresów z --workers (`<klucz>#<bajt>`) - bez innych
+            # importów, których klucz tylko zaczyna się tak samo (np. `bank` i `bank-2`)
+            ImportCheckpoint.objects.filter(Q(key=key) | Q(key__startswith=f"{key}#")).delete()
+
+        try:
+            if workers > 1:
+                stats = self.import_parallel(path, author.pk, options['chunk_size'], key, workers)
+            else:
+                stats = import_file(path, fmt, author.pk, options['chunk_size'], key)
+        except InvalidRecord as exc:
+            raise CommandError(str(exc))
+
+        for error in stats.errors:
+            self.stdout.write(self.style.WARNING(f"Pominięto rekord ({error})"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Sukces! Zaimportowano {stats.imported} quizów, pominięto {stats.skipped} rekordów."
+        ))
+
+    def import_parallel(self, path, author_id, chunk_size, key, workers) -> ImportStats:
+        ranges = split_ranges(path, workers)
+        # Procesy potomne nie mogą dzielić połączeń rodzica
+        connections.close_all()
+        stats = ImportStats()
+        with ProcessPoolExecutor(max_workers=len(ranges), initializer=django.setup) as executor:
+            futures = [
+                executor.submit(import_range_worker, path, author_id, chunk_size, f"{key}#{start}", start, end)
+                for start, end in ranges
+            ]
+            for future in futures:
+                stats.merge(future.result())
+        return stats
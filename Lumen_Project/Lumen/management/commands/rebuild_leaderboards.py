@@ -0,0 +1,32 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from Lumen.leaderboards import GLOBAL_BOARD, get_leaderboard_store, quiz_board
+from Lumen.models import QuizResult
+from users.leveling import total_xp_for
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Przebudowuje zmaterializowane rankingi (globalny XP i najlepsze wyniki quizów) od zera'
+
+    def handle(self, *args, **options):
+        store = get_leaderboard_store()
+
+        profiles = UserProfile.objects.values_list('user_id', 'level', 'xp').iterator(chunk_size=2000)
+        store.replace_board(GLOBAL_BOARD, (
+            (user_id, total_xp_for(level, xp)) for user_id, level, xp in profiles
+        ))
+        self.stdout.write("Przebudowano ranking globalny.")
+
+        best_scores = QuizResult.objects.values('quiz_id', 'user_id').annotate(best=Max('score')).order_by('quiz_id')
+        # Wiersze są posortowane po quizie, więc w pamięci trzymamy naraz tylko jeden ranking
+        boards_count = 0
+        for quiz_id, rows in groupby(best_scores.iterator(chunk_size=2000), key=itemgetter('quiz_id')):
+            store.replace_board(quiz_board(quiz_id), ((row['user_id'], row['best']) for row in rows))
+            boards_count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Sukces! Przebudowano rankingi {boards_count} quizów."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from Lumen.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Przebudowuje dokumenty i indeks wyszukiwania pełnotekstowego wszystkich quizów'
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        backend = type(get_search_backend()).__name__
+        self.stdout.write(self.style.SUCCESS(f"Sukces! Zindeksowano {count} quizów ({backend})."))
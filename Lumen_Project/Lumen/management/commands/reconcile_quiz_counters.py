@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from Lumen.jobs import enqueue
+from Lumen.services import reconcile_category_counters, reconcile_quiz_counters
+
+
+class Command(BaseCommand):
+    help = 'Porównuje liczniki quizów (pytania, podejścia) i kategorii z faktycznymi danymi i poprawia rozbieżności'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Tylko wypisz rozbieżności, bez zapisu')
+        parser.add_argument('--enqueue', action='store_true', help='Zleć uzgodnienie wykonawcom zadań (run_workers)')
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            job = enqueue('reconcile_counters')
+            self.stdout.write(self.style.SUCCESS(f"Sukces! Dodano zadanie #{job.pk} do kolejki."))
+            return
+        rows = reconcile_quiz_counters(dry_run=options['dry_run'])
+        for quiz_id, stored_questions, questions, stored_attempts, attempts in rows:
+            self.stdout.write(
+                f"Quiz {quiz_id}: pytania {stored_questions} -> {questions}, podejścia {stored_attempts} -> {attempts}"
+            )
+        categories = reconcile_category_counters(dry_run=options['dry_run'])
+        for category_id, stored_total, total, stored_published, published in categories:
+            self.stdout.write(
+                f"Kategoria {category_id}: quizy {stored_total} -> {total}, opublikowane {stored_published} -> {published}"
+            )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f"Znaleziono {len(rows)} quizów i {len(categories)} kategorii z rozbieżnymi licznikami."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Sukces! Poprawiono liczniki {len(rows)} quizów i {len(categories)} kategorii."
+            ))
@@ -0,0 +1,59 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Lumen.jobs import BATCH_SIZE, work, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Uruchamia wykonawców zadań w tle (wysyłka maili, uzgadnianie liczników) z kolejki w bazie danych'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Liczba wątków wykonawców')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Liczba zadań zajmowanych naraz')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Przerwa (w sekundach) między sprawdzeniami pustej kolejki')
+        parser.add_argument('--once', action='store_true', help='Zakończ po opróżnieniu kolejki')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        processed = []
+
+        def loop() -> None:
+            name = worker_name()
+            while not stop.is_set():
+                count = work(name, options['batch_size'])
+                processed.append(count)
+                if not count:
+                    if options['once']:
+                        return
+                    stop.wait(options['poll_interval'])
+
+        def thread_loop() -> None:
+            try:
+                loop()
+            finally:
+                # Każdy wątek ma własne połączenie z bazą - zamykamy je razem z wątkiem
+                connections.close_all()
+
+        workers = max(1, options['workers'])
+        self.stdout.write(f"Uruchomiono {workers} wykonawców (Ctrl+C kończy pracę).")
+        threads = [threading.Thread(target=thread_loop, name=f'worker-{i}', daemon=True) for i in range(workers)]
+        try:
+            if workers == 1:
+                loop()
+            else:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    # join z limitem czasu, aby Ctrl+C docierało do głównego wątku
+                    while thread.is_alive():
+                        thread.join(0.5)
+        except KeyboardInterrupt:
+            # Wykonawcy kończą bieżącą partię - przerwane zadania czekałyby na LUMEN_JOB_LOCK_TIMEOUT
+            stop.set()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Sukces! Wykonano {sum(processed)} zadań."))
@@ -0,0 +1,131 @@
+import random
+from itertools import groupby
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from Lumen.leaderboards import GLOBAL_BOARD, get_leaderboard_store, quiz_board
+from Lumen.models import Quiz, Question, Answer, QuizResult
+from Lumen.services import (
+    POINTS_PER_CORRECT_ANSWER, adjust_category_counts, category_deltas, rebuild_player_stats,
+    reconcile_quiz_counters, resolve_categories,
+)
+from Lumen.search import refresh_search_documents
+from Lumen.snapshot import invalidate_catalogue
+from users.leveling import total_xp_for
+from users.models import UserProfile
+
+User = get_user_model()
+
+# Wspólny prefiks nazw kont - po nim benchmark znajduje dane, a --clear je usuwa
+USERNAME_PREFIX = 'bench_user_'
+BENCHMARK_PASSWORD = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Generuje syntetyczne dane (użytkownicy, quizy, pytania, odpowiedzi, wyniki) do benchmarków'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Liczba użytkowników')
+        parser.add_argument('--quizzes', type=int, default=500, help='Liczba quizów')
+        parser.add_argument('--questions', type=int, default=10, help='Liczba pytań w quizie')
+        parser.add_argument('--answers', type=int, default=4, help='Liczba odpowiedzi w pytaniu (min. 2)')
+        parser.add_argument('--results', type=int, default=5000, help='Liczba wyników quizów (QuizResult)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rozmiar paczki bulk_create')
+        parser.add_argument('--seed', type=int, default=0, help='Ziarno generatora losowego')
+        parser.add_argument('--clear', action='store_true', help='Najpierw usuń wcześniej wygenerowane dane')
+
+    def handle(self, *args, **options):
+        if options['answers'] < 2:
+            raise CommandError("--answers musi wynosić co najmniej 2.")
+        if min(options['users'], options['quizzes'], options['questions']) < 1:
+            raise CommandError("--users, --quizzes i --questions muszą być dodatnie.")
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            if options['clear']:
+                # Quizy, wyniki i profile znikają kaskadowo razem z kontami
+                deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+                self.stdout.write(f"Usunięto {deleted} obiektów z poprzedniego zestawu.")
+            elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+                raise CommandError("Dane benchmarku już istnieją - użyj --clear, aby wygenerować je od nowa.")
+
+            users = self.create_users(options['users'], batch_size)
+            quizzes = self.create_quizzes(rng, users, options, batch_size)
+            results = self.create_results(rng, users, quizzes, options, batch_size)
+            # bulk_create pomija sygnały: liczniki kategorii korygujemy o same wygenerowane quizy
+            adjust_category_counts(category_deltas((None, (quiz.category_id, quiz.is_published)) for quiz in quizzes))
+
+        # Podsumowania, liczniki, wyszukiwarkę i rankingi przeliczamy tylko dla wygenerowanych kont
+        # i quizów - generator uruchomiony na bazie z prawdziwymi danymi ich nie nadpisuje
+        user_ids, quiz_ids = [user.pk for user in users], [quiz.pk for quiz in quizzes]
+        rebuild_player_stats(user_ids)
+        reconcile_quiz_counters(quiz_ids=quiz_ids)
+        refresh_search_documents(quiz_ids)
+        invalidate_catalogue()
+        self.rebuild_leaderboards(user_ids, quiz_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Sukces! Utworzono {len(users)} użytkowników, {len(quizzes)} quizów "
+            f"po {options['questions']} pytań i {results} wyników."
+        ))
+
+    def rebuild_leaderboards(self, user_ids, quiz_ids):
+        store = get_leaderboard_store()
+        for user_id, level, xp in UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'level', 'xp'):
+            store.submit(GLOBAL_BOARD, user_id, total_xp_for(level, xp))
+
+        # Wyniki wygenerowanych quizów pochodzą tylko od wygenerowanych kont - ich rankingi budujemy od zera
+        best_scores = QuizResult.objects.filter(quiz_id__in=quiz_ids).values('quiz_id', 'user_id') \
+            .annotate(best=Max('score')).order_by('quiz_id')
+        for quiz_id, rows in groupby(best_scores.iterator(chunk_size=2000), key=itemgetter('quiz_id')):
+            store.replace_board(quiz_board(quiz_id), ((row['user_id'], row['best']) for row in rows))
+
+    def create_users(self, count, batch_size):
+        # Jeden skrót hasła dla wszystkich kont - haszowanie jest celowo wolne
+        password = make_password(BENCHMARK_PASSWORD)
+        users = User.objects.bulk_create(
+            (User(username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com', password=password)
+             for i in range(count)),
+            batch_size=batch_size,
+        )
+        # bulk_create nie wysyła post_save, więc profile tworzymy sami
+        UserProfile.objects.bulk_create((UserProfile(user=user) for user in users), batch_size=batch_size)
+        return users
+
+    def create_quizzes(self, rng, users, options, batch_size):
+        categories = list(resolve_categories(f'Kategoria {i}' for i in range(8)).values())
+        quizzes = Quiz.objects.bulk_create(
+            (Quiz(title=f'Quiz testowy {i}', description='Dane syntetyczne do benchmarków.',
+                  category=categories[i % 8], is_published=True, created_by=rng.choice(users),
+                  question_count=options['questions'])
+             for i in range(options['quizzes'])),
+            batch_size=batch_size,
+        )
+        questions = Question.objects.bulk_create(
+            (Question(quiz=quiz, text=f'Pytanie {order} quizu {quiz.pk}', order=order)
+             for quiz in quizzes for order in range(1, options['questions'] + 1)),
+            batch_size=batch_size,
+        )
+
+        def answers():
+            for question in questions:
+                correct = rng.randrange(options['answers'])
+                for index in range(options['answers']):
+                    yield Answer(question=question, text=f'Odpowiedź {index + 1}', is_correct=index == correct)
+
+        Answer.objects.bulk_create(answers(), batch_size=batch_size)
+        return quizzes
+
+    def create_results(self, rng, users, quizzes, options, batch_size):
+        max_score = options['questions'] * POINTS_PER_CORRECT_ANSWER
+        QuizResult.objects.bulk_create(
+            (QuizResult(user=rng.choice(users), quiz=rng.choice(quizzes), score=rng.randint(0, max_score))
+             for _ in range(options['results'])),
+            batch_size=batch_size,
+        )
+        return options['results']
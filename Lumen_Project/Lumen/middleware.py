@@ -0,0 +1,279 @@
+"""
+Profilowanie żądań: zapytania SQL, czas bazy, czas renderowania szablonów i powtórzone
+zapytania (wzorzec N+1) w nagłówku Server-Timing. Oraz serwowanie plików statycznych
+zebranych przez `collectstatic` (wersje .gz, nagłówki cache dla nazw z odciskiem)
+i wybór repliki bazy dla odczytów żądania (Lumen/db_routing.py).
+
+Wszystkie middleware są opcjonalne - wyłączone zgłaszają MiddlewareNotUsed i Django
+w ogóle nie włącza ich do łańcucha, więc nic nie kosztują.
+"""
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseNotModified
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .db_routing import begin_request, end_request
+from .http_cache import accepts_gzip
+from .staticfiles import GZIP_SUFFIX
+
+logger = logging.getLogger('lumen.profiling')
+
+# Listy parametrów IN (%s, %s, ...) o różnej długości to wciąż to samo zapytanie
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+# Ile najczęściej powtarzanych zapytań trafia do logu
+TOP_DUPLICATES = 5
+
+_current: ContextVar[Optional['RequestProfile']] = ContextVar('lumen_request_profile', default=None)
+
+
+def query_signature(sql: str) -> str:
+    """Postać zapytania bez parametrów - po niej rozpoznajemy powtórzenia."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+@dataclass
+class RequestProfile:
+    queries: list[tuple[str, float]] = field(default_factory=list)
+    db_time: float = 0.0
+    template_time: float = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Wrapper dla connection.execute_wrapper - mierzy każde zapytanie."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_time += duration
+            self.queries.append((sql, duration))
+
+    def duplicates(self) -> list[tuple[str, int]]:
+        counts = Counter(query_signature(sql) for sql, _ in self.queries)
+        return [(signature, count) for signature, count in counts.most_common() if count > 1]
+
+
+def _timed_render(render: Callable) -> Callable:
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+    wrapper.lumen_profiled = True
+    return wrapper
+
+
+def _instrument_templates() -> None:
+    """Owija render() szablonów Django (raz na proces) - liczy tylko w trakcie profilowanego żądania."""
+    if not getattr(DjangoTemplate.render, 'lumen_profiled', False):
+        DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+
+
+class RequestProfilingMiddleware:
+    """
+    Mierzy każde żądanie i dopisuje nagłówek Server-Timing. Żądania przekraczające budżet
+    czasu lub liczby zapytań trafiają do logu `lumen.profiling` jako rekord JSON;
+    pełna lista zapytań dołączana jest tylko do losowej części z nich.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not getattr(settings, 'LUMEN_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.budget_ms = getattr(settings, 'LUMEN_PROFILING_BUDGET_MS', 500)
+        self.query_budget = getattr(settings, 'LUMEN_PROFILING_QUERY_BUDGET', 50)
+        self.sample_rate = getattr(settings, 'LUMEN_PROFILING_SAMPLE_RATE', 0.1)
+        _instrument_templates()
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # Wszystkie skonfigurowane bazy (także repliki) - obiekty połączeń są tanie, nie łączą się
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        duplicates = profile.duplicates()
+        duplicated = sum(count - 1 for _, count in duplicates)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.2f};desc="{len(profile.queries)} queries"',
+            f'tpl;dur={profile.template_time * 1000:.2f}',
+            f'dup;desc="{duplicated} duplicated"',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        if total_ms > self.budget_ms or len(profile.queries) > self.query_budget:
+            self.log_slow_request(request, response, profile, total_ms, duplicates)
+        return response
+
+    def log_slow_request(self, request: HttpRequest, response: HttpResponse, profile: RequestProfile,
+                         total_ms: float, duplicates: list[tuple[str, int]]) -> None:
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'template_ms': round(profile.template_time * 1000, 2),
+            'queries': len(profile.queries),
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates[:TOP_DUPLICATES]],
+        }
+        if random.random() < self.sample_rate:
+            record['query_log'] = [{'sql': sql, 'ms': round(duration * 1000, 3)} for sql, duration in profile.queries]
+        logger.warning(json.dumps(record, ensure_ascii=False), extra={'profiling': record})
+
+
+class StaticFilesMiddleware:
+    """
+    Serwuje pliki z STATIC_ROOT, zanim żądanie dotrze do sesji i uwierzytelniania. Klient
+    akceptujący gzip dostaje gotową wersję .gz z `collectstatic`; pliki z odciskiem w nazwie
+    (z manifestu) mają nagłówek `immutable` i rok ważności, pozostałe - krótki czas ważności
+    i rewalidację po Last-Modified. Włączone przy LUMEN_SERVE_STATIC (domyślnie gdy DEBUG=False).
+    """
+
+    # Pod ASGI middleware tylko synchroniczne zmusiłoby cały łańcuch (także widoki async) do wątków
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not getattr(settings, 'LUMEN_SERVE_STATIC', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT)
+        self.max_age = getattr(settings, 'LUMEN_STATIC_MAX_AGE', 60)
+        self.immutable_max_age = getattr(settings, 'LUMEN_STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 60 * 60)
+        # Manifest czytamy raz - po `collectstatic` serwer i tak jest restartowany
+        self.fingerprinted = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve_static(request, stream=True)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # Pliki statyczne są małe: czytamy je w pętli zdarzeń w całości - FileResponse pod ASGI
+        # iterowałby plik synchronicznie, porcja po porcji w wątkach
+        response = self.serve_static(request, stream=False)
+        return response if response is not None else await self.get_response(request)
+
+    def serve_static(self, request: HttpRequest, stream: bool) -> Optional[HttpResponse]:
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return self.serve(request, request.path[len(self.prefix):], stream)
+        return None
+
+    def serve(self, request: HttpRequest, name: str, stream: bool = True) -> Optional[HttpResponse]:
+        name = posixpath.normpath(name).lstrip('/')
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None  # Nieznany plik - dalej obsłuży go zwykły łańcuch (404)
+
+        compressed = os.path.isfile(path + GZIP_SUFFIX)
+        stat = os.stat(path)
+        if name not in self.fingerprinted and not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'), int(stat.st_mtime)):
+            response = HttpResponseNotModified()
+        else:
+            content_type, encoding = mimetypes.guess_type(name)
+            served = path + GZIP_SUFFIX if compressed and accepts_gzip(request) else path
+            content_type = content_type or 'application/octet-stream'
+            if stream:
+                response = FileResponse(open(served, 'rb'), content_type=content_type)
+            else:
+                with open(served, 'rb') as file:
+                    response = HttpResponse(file.read(), content_type=content_type)
+            if served != path:
+                response['Content-Encoding'] = 'gzip'
+            elif encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if name in self.fingerprinted:
+            patch_cache_control(response, public=True, max_age=self.immutable_max_age, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        if compressed:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Kieruje odczyty żądań GET/HEAD do losowej repliki. Żądanie, które coś zapisało, ustawia
+    ciasteczko - przez LUMEN_REPLICA_STICKY_SECONDS kolejne żądania tej przeglądarki czytają
+    z bazy głównej i widzą własne zmiany. Aktywne tylko przy skonfigurowanych replikach.
+    """
+    cookie_name = 'lumen_primary'
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        if not getattr(settings, 'LUMEN_DB_REPLICAS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'LUMEN_REPLICA_STICKY_SECONDS', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = begin_request(self.reads_from_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.stick(state, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        # Stan w ContextVar: sync_to_async przenosi kontekst do wątku, a zapis w nim oznacza ten sam obiekt
+        state, token = begin_request(self.reads_from_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.stick(state, response)
+
+    def reads_from_replica(self, request: HttpRequest) -> bool:
+        return request.method in ('GET', 'HEAD') and self.cookie_name not in request.COOKIES
+
+    def stick(self, state, response: HttpResponse) -> HttpResponse:
+        if state.wrote:
+            response.set_cookie(self.cookie_name, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0004_alter_answer_options_alter_question_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['-created_at', 'id'], name='quiz_created_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['is_published', '-created_at', 'id'], name='quiz_published_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0005_quiz_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=50, verbose_name='Ranking')),
+                ('score', models.BigIntegerField(verbose_name='Wynik')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pozycja w rankingu',
+                'verbose_name_plural': 'Pozycje w rankingu',
+                'indexes': [models.Index(fields=['board', '-score', 'user'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('board', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0006_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=500, unique=True, verbose_name='Klucz importu')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Pozycja w pliku')),
+                ('imported', models.IntegerField(default=0, verbose_name='Zaimportowane quizy')),
+                ('skipped', models.IntegerField(default=0, verbose_name='Pominięte rekordy')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Punkt kontrolny importu',
+                'verbose_name_plural': 'Punkty kontrolne importu',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0007_importcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['completed_at', 'id'], name='result_export_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def renumber_duplicate_orders(apps, schema_editor):
+    """Quizy z powtórzoną kolejnością pytań dostają kolejne numery 1..n według (order, id)."""
+    Question = apps.get_model('Lumen', 'Question')
+    duplicated = (
+        Question.objects.values('quiz_id', 'order')
+        .annotate(count=models.Count('id')).filter(count__gt=1)
+        .values_list('quiz_id', flat=True).distinct()
+    )
+    for quiz_id in set(duplicated):
+        questions = list(Question.objects.filter(quiz_id=quiz_id).order_by('order', 'id'))
+        for position, question in enumerate(questions, start=1):
+            question.order = position
+        # Najpierw pozycje tymczasowe, żeby nowe numery nie zderzyły się ze starymi
+        Question.objects.filter(quiz_id=quiz_id).update(order=-models.F('id'))
+        Question.objects.bulk_update(questions, ['order'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0008_quizresult_export_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='quiz',
+            name='quiz_published_keyset_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at', 'id'], name='quiz_published_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['user', 'quiz'], name='result_user_quiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['user', '-completed_at'], name='result_user_history_idx'),
+        ),
+        migrations.RunPython(renumber_duplicate_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='question',
+            constraint=models.UniqueConstraint(fields=('quiz', 'order'), name='unique_question_order'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_player_stats(apps, schema_editor):
+    """Wylicza podsumowania z dotychczasowej historii wyników - jednorazowo, jednym zapytaniem grupującym."""
+    QuizResult = apps.get_model('Lumen', 'QuizResult')
+    PlayerStats = apps.get_model('Lumen', 'PlayerStats')
+    rows = QuizResult.objects.values('user_id').annotate(
+        attempts=models.Count('id'), total_score=models.Sum('score'),
+        best_score=models.Max('score'), last_played_at=models.Max('completed_at'),
+    ).order_by()
+    PlayerStats.objects.bulk_create((PlayerStats(**row) for row in rows.iterator(chunk_size=2000)), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0009_hot_path_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='player_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Liczba podejść')),
+                ('total_score', models.BigIntegerField(default=0, verbose_name='Suma punktów')),
+                ('best_score', models.IntegerField(default=0, verbose_name='Najlepszy wynik')),
+                ('last_played_at', models.DateTimeField(blank=True, null=True, verbose_name='Ostatnia gra')),
+            ],
+            options={
+                'verbose_name': 'Statystyki gracza',
+                'verbose_name_plural': 'Statystyki graczy',
+            },
+        ),
+        migrations.RunPython(backfill_player_stats, migrations.RunPython.noop),
+    ]
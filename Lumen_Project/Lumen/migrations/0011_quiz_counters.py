@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:36
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Jednorazowe przeliczenie liczników jednym UPDATE z podzapytaniami."""
+    Quiz = apps.get_model('Lumen', 'Quiz')
+    Question = apps.get_model('Lumen', 'Question')
+    QuizResult = apps.get_model('Lumen', 'QuizResult')
+
+    def count_of(model):
+        counts = model.objects.filter(quiz=models.OuterRef('pk')).order_by().values('quiz') \
+            .annotate(total=models.Count('pk')).values('total')
+        return Coalesce(models.Subquery(counts), 0)
+
+    Quiz.objects.update(question_count=count_of(Question), attempt_count=count_of(QuizResult))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0010_playerstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='attempt_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Liczba podejść'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Liczba pytań'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
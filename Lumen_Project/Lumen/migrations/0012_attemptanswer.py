@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0011_quiz_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField(verbose_name='Czy poprawna?')),
+                ('answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Lumen.answer')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Lumen.question')),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='Lumen.quizresult')),
+            ],
+            options={
+                'verbose_name': 'Odpowiedź w podejściu',
+                'verbose_name_plural': 'Odpowiedzi w podejściach',
+                'constraints': [models.UniqueConstraint(fields=('result', 'question'), name='unique_attempt_answer')],
+            },
+        ),
+    ]
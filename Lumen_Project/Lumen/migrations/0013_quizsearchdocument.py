@@ -0,0 +1,92 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:54
+
+from collections import defaultdict
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'lumen_quiz_fts'
+
+
+def create_search_index(apps, schema_editor):
+    """Indeks zależny od bazy: GIN na PostgreSQL, wirtualna tabela FTS5 na SQLite."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX quiz_search_vector_idx ON "Lumen_quizsearchdocument" USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        # remove_diacritics: "sniadanie" znajduje "śniadanie" (poza "ł", które w Unicode nie ma rozkładu)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, questions, "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS quiz_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def backfill_documents(apps, schema_editor):
+    """Dokumenty dla istniejących quizów paczkami (dwa zapytania na paczkę), indeks jednym zapytaniem na koniec."""
+    Quiz = apps.get_model('Lumen', 'Quiz')
+    Question = apps.get_model('Lumen', 'Question')
+    QuizSearchDocument = apps.get_model('Lumen', 'QuizSearchDocument')
+
+    quiz_ids = list(Quiz.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(quiz_ids), 500):
+        batch = quiz_ids[start:start + 500]
+        questions = defaultdict(list)
+        for quiz_id, text in Question.objects.filter(quiz_id__in=batch).order_by('quiz_id', 'order') \
+                .values_list('quiz_id', 'text'):
+            questions[quiz_id].append(text)
+        QuizSearchDocument.objects.bulk_create(
+            QuizSearchDocument(quiz_id=quiz_id, title=title, body='\n'.join(filter(None, (category, description))),
+                               questions='\n'.join(questions[quiz_id]))
+            for quiz_id, title, category, description
+            in Quiz.objects.filter(pk__in=batch).values_list('pk', 'title', 'category', 'description')
+        )
+
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE \"Lumen_quizsearchdocument\" SET search_vector = "
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B') "
+            "|| setweight(to_tsvector('simple', questions), 'C')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, body, questions) '
+            f'SELECT quiz_id, title, body, questions FROM "Lumen_quizsearchdocument"'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0012_attemptanswer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSearchDocument',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='Lumen.quiz')),
+                ('title', models.CharField(max_length=200, verbose_name='Tytuł')),
+                ('body', models.TextField(blank=True, verbose_name='Kategoria i opis')),
+                ('questions', models.TextField(blank=True, verbose_name='Treści pytań')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+            options={
+                'verbose_name': 'Dokument wyszukiwania',
+                'verbose_name_plural': 'Dokumenty wyszukiwania',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
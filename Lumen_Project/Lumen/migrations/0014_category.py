@@ -0,0 +1,83 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def categories_from_names(apps, schema_editor):
+    """
+    Zamienia dotychczasowe nazwy kategorii (tekst) na wiersze Category - jeden UPDATE na nazwę,
+    a liczniki wylicza jednym zapytaniem grupującym.
+    """
+    Quiz = apps.get_model('Lumen', 'Quiz')
+    Category = apps.get_model('Lumen', 'Category')
+
+    names = Quiz.objects.exclude(category='').order_by().values_list('category', flat=True).distinct()
+    by_name = {}
+    for name in names:
+        # Nazwy różniące się tylko białymi znakami na brzegach trafiają do jednej kategorii
+        category = by_name.get(name.strip())
+        if category is None:
+            category = by_name[name.strip()] = Category.objects.create(name=name.strip())
+        Quiz.objects.filter(category=name).update(category_ref=category)
+
+    counts = Quiz.objects.filter(category_ref__isnull=False).order_by().values('category_ref').annotate(
+        total=models.Count('pk'), published=models.Count('pk', filter=models.Q(is_published=True)),
+    )
+    for row in counts:
+        Category.objects.filter(pk=row['category_ref']).update(quiz_count=row['total'], published_count=row['published'])
+
+
+def names_from_categories(apps, schema_editor):
+    Quiz = apps.get_model('Lumen', 'Quiz')
+    Category = apps.get_model('Lumen', 'Category')
+    for category in Category.objects.all():
+        Quiz.objects.filter(category_ref=category).update(category=category.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0013_quizsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nazwa')),
+                ('quiz_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Liczba quizów')),
+                ('published_count', models.PositiveIntegerField(default=0, editable=False, verbose_name='Liczba opublikowanych quizów')),
+            ],
+            options={
+                'verbose_name': 'Kategoria',
+                'verbose_name_plural': 'Kategorie',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='category_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Lumen.category'),
+        ),
+        migrations.RunPython(categories_from_names, names_from_categories),
+        migrations.RemoveField(
+            model_name='quiz',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='quiz',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quizzes', to='Lumen.category', verbose_name='Kategoria'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['category', '-created_at', 'id'], name='quiz_category_keyset_idx'),
+        ),
+    ]
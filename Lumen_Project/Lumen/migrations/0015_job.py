@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0014_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Zadanie')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Dane')),
+                ('status', models.CharField(choices=[('pending', 'Oczekuje'), ('running', 'W trakcie'), ('done', 'Wykonane'), ('failed', 'Nieudane')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Liczba prób')),
+                ('max_attempts', models.PositiveIntegerField(default=5, verbose_name='Maksymalna liczba prób')),
+                ('run_at', models.DateTimeField(verbose_name='Uruchom po')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Wykonawca')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Pobrane')),
+                ('last_error', models.TextField(blank=True, verbose_name='Ostatni błąd')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Zakończone')),
+            ],
+            options={
+                'verbose_name': 'Zadanie w tle',
+                'verbose_name_plural': 'Zadania w tle',
+                'indexes': [models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx')],
+            },
+        ),
+    ]
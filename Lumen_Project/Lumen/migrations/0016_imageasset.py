@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0015_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='Skrót SHA-256')),
+                ('width', models.PositiveIntegerField(verbose_name='Szerokość')),
+                ('height', models.PositiveIntegerField(verbose_name='Wysokość')),
+                ('placeholder', models.TextField(blank=True, verbose_name='Placeholder (data URI)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Obraz',
+                'verbose_name_plural': 'Obrazy',
+            },
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='image_asset',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Lumen.imageasset'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='image_asset',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Lumen.imageasset'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:48
+
+from collections import Counter
+
+from django.db import migrations, models
+
+TREE_SIZE = 2 ** 32
+
+
+def build_rank_trees(apps, schema_editor):
+    """Drzewo rang z istniejących pozycji - jedno przejście po tabeli posortowanej według rankingu."""
+    LeaderboardEntry = apps.get_model('Lumen', 'LeaderboardEntry')
+    LeaderboardRankNode = apps.get_model('Lumen', 'LeaderboardRankNode')
+
+    def flush(board, counts):
+        LeaderboardRankNode.objects.bulk_create(
+            (LeaderboardRankNode(board=board, node=node, count=count) for node, count in counts.items()),
+            batch_size=1000,
+        )
+
+    board, counts = None, Counter()
+    for entry_board, score in LeaderboardEntry.objects.order_by('board').values_list('board', 'score').iterator():
+        if entry_board != board:
+            if board is not None:
+                flush(board, counts)
+            board, counts = entry_board, Counter()
+        # Jak Lumen.leaderboards.update_nodes: indeksy od najwyższego wyniku, bez korzenia
+        index = TREE_SIZE - min(max(score, 0), TREE_SIZE - 1)
+        while index < TREE_SIZE:
+            counts[index] += 1
+            index += index & -index
+    if board is not None:
+        flush(board, counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0016_imageasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRankNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(max_length=50, verbose_name='Ranking')),
+                ('node', models.BigIntegerField(verbose_name='Węzeł')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Liczba pozycji')),
+            ],
+            options={
+                'verbose_name': 'Węzeł drzewa rang',
+                'verbose_name_plural': 'Węzły drzewa rang',
+                'constraints': [models.UniqueConstraint(fields=('board', 'node'), name='unique_leaderboard_rank_node')],
+            },
+        ),
+        migrations.RunPython(build_rank_trees, migrations.RunPython.noop),
+    ]
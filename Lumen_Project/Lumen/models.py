@@ -1,14 +1,63 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext_lazy as _
 
 
+class ImageAsset(models.Model):
+    """
+    Pochodne przesłanego obrazu (WebP w kilku rozmiarach) adresowane treścią: pliki leżą pod
+    skrótem SHA-256 oryginału, więc ten sam obraz przesłany wielokrotnie przetwarzamy i trzymamy raz.
+    Placeholder to kilkudziesięciobajtowy WebP wbudowany w stronę jako data URI.
+    """
+    digest = models.CharField(_("Skrót SHA-256"), max_length=64, unique=True)
+    width = models.PositiveIntegerField(_("Szerokość"))
+    height = models.PositiveIntegerField(_("Wysokość"))
+    placeholder = models.TextField(_("Placeholder (data URI)"), blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Obraz")
+        verbose_name_plural = _("Obrazy")
+
+    def __str__(self) -> str:
+        return f"{self.digest[:12]} ({self.width}x{self.height})"
+
+
+class Category(models.Model):
+    """
+    Kategoria quizów z licznikami utrzymywanymi przyrostowo (services.adjust_category_counts) -
+    przeglądanie po kategoriach i filtr w panelu admina nie grupują tabeli quizów.
+    """
+    name = models.CharField(_("Nazwa"), max_length=100, unique=True)
+    quiz_count = models.PositiveIntegerField(_("Liczba quizów"), default=0, editable=False)
+    published_count = models.PositiveIntegerField(_("Liczba opublikowanych quizów"), default=0, editable=False)
+
+    class Meta:
+        verbose_name = _("Kategoria")
+        verbose_name_plural = _("Kategorie")
+        ordering = ['name']
+
+    def __str__(self) -> str:
+        return self.name
+
+
 class Quiz(models.Model):
     title = models.CharField(_("Tytuł"), max_length=200)
     description = models.TextField(_("Opis"), blank=True)
-    category = models.CharField(_("Kategoria"), max_length=100, blank=True)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="quizzes",
+        verbose_name=_("Kategoria")
+    )
     # Dodano slug i image (z poprzednich migracji)
     image = models.ImageField(upload_to="quiz_covers/", blank=True, null=True)
+    # Pochodne obrazu - ustawiane w tle po przesłaniu (Lumen/images.py)
+    image_asset = models.ForeignKey(ImageAsset, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                    related_name="+")
     slug = models.SlugField(blank=True, null=True)
 
     created_by = models.ForeignKey(
@@ -19,20 +68,46 @@ class Quiz(models.Model):
     )
     created_at = models.DateTimeField(_("Data utworzenia"), auto_now_add=True)
     is_published = models.BooleanField(_("Opublikowany"), default=False, db_index=True)
+    # Zdenormalizowane liczniki - zmieniane wyłącznie atomowymi UPDATE-ami (F()), odczyt bez COUNT(*)
+    question_count = models.PositiveIntegerField(_("Liczba pytań"), default=0, editable=False)
+    attempt_count = models.PositiveIntegerField(_("Liczba podejść"), default=0, editable=False)
+
+    COUNTER_FIELDS = ('question_count', 'attempt_count')
 
     class Meta:
         verbose_name = _("Quiz")
         verbose_name_plural = _("Quizy")
         ordering = ['-created_at']
+        indexes = [
+            # Paginacja kursorowa listy quizów po (-created_at, id)
+            models.Index(fields=['-created_at', 'id'], name='quiz_created_keyset_idx'),
+            # Publiczna lista czyta tylko opublikowane quizy - indeks częściowy pomija szkice
+            models.Index(fields=['-created_at', 'id'], condition=models.Q(is_published=True),
+                         name='quiz_published_keyset_idx'),
+            # Lista quizów jednej kategorii (API przeglądania po kategoriach)
+            models.Index(fields=['category', '-created_at', 'id'], name='quiz_category_keyset_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs) -> None:
+        # Zwykły zapis istniejącego quizu (admin, API) nie może nadpisać liczników wartością
+        # wczytaną wcześniej - w międzyczasie mogły je zmienić równoległe podejścia
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Question(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="questions")
     text = models.TextField(_("Treść pytania"))
     image = models.ImageField(upload_to="question_images/", blank=True, null=True)
+    image_asset = models.ForeignKey(ImageAsset, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                    related_name="+")
     time_limit = models.IntegerField(_("Limit czasu (s)"), default=30)
     order = models.IntegerField(_("Kolejność"), default=0)
 
@@ -40,6 +115,10 @@ class Question(models.Model):
         verbose_name = _("Pytanie")
         verbose_name_plural = _("Pytania")
         ordering = ['order']
+        constraints = [
+            # Rozgrywka wyszukuje pytanie po (quiz, kolejność) - musi być jednoznaczne
+            models.UniqueConstraint(fields=['quiz', 'order'], name='unique_question_order'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.quiz.title} - Pytanie {self.order}"
@@ -58,6 +137,27 @@ class Answer(models.Model):
         return self.text
 
 
+class QuizSearchDocument(models.Model):
+    """
+    Treść quizu do wyszukiwania pełnotekstowego (tytuł, kategoria z opisem, treści pytań),
+    odświeżana przyrostowo po zmianach quizu i jego pytań (Lumen/search.py).
+    Na PostgreSQL indeksem jest `search_vector` (GIN), na SQLite - tabela FTS5 `lumen_quiz_fts`.
+    """
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name="search_document")
+    title = models.CharField(_("Tytuł"), max_length=200)
+    body = models.TextField(_("Kategoria i opis"), blank=True)
+    questions = models.TextField(_("Treści pytań"), blank=True)
+    # Wypełniane tylko na PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        verbose_name = _("Dokument wyszukiwania")
+        verbose_name_plural = _("Dokumenty wyszukiwania")
+
+    def __str__(self) -> str:
+        return self.title
+
+
 class QuizResult(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
@@ -67,6 +167,165 @@ class QuizResult(models.Model):
     class Meta:
         verbose_name = _("Wynik Quizu")
         verbose_name_plural = _("Wyniki Quizów")
+        indexes = [
+            # Pierwszy eksport wyników od daty (?since=)
+            models.Index(fields=['completed_at', 'id'], name='result_export_idx'),
+            # Liczenie poprzednich podejść w finish_quiz_view
+            models.Index(fields=['user', 'quiz'], name='result_user_quiz_idx'),
+            # Historia gier w profilu, od najnowszych
+            models.Index(fields=['user', '-completed_at'], name='result_user_history_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user.username} - {self.quiz.title} ({self.score} pkt)"
+
+
+class AttemptAnswer(models.Model):
+    """Odpowiedź udzielona w zakończonym podejściu - zapisywana hurtowo razem z wynikiem."""
+    result = models.ForeignKey(QuizResult, on_delete=models.CASCADE, related_name="answers")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="+")
+    # Usunięcie odpowiedzi z quizu nie kasuje historii - zostaje informacja, czy była poprawna
+    answer = models.ForeignKey(Answer, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    is_correct = models.BooleanField(_("Czy poprawna?"))
+
+    class Meta:
+        verbose_name = _("Odpowiedź w podejściu")
+        verbose_name_plural = _("Odpowiedzi w podejściach")
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'question'], name='unique_attempt_answer'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Wynik {self.result_id} - pytanie {self.question_id}"
+
+
+class PlayerStats(models.Model):
+    """
+    Podsumowanie gier użytkownika, aktualizowane w tej samej transakcji co zapis wyniku.
+    Nagłówek profilu czyta jeden wiersz zamiast agregować całą historię podejść.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="player_stats"
+    )
+    attempts = models.PositiveIntegerField(_("Liczba podejść"), default=0)
+    total_score = models.BigIntegerField(_("Suma punktów"), default=0)
+    best_score = models.IntegerField(_("Najlepszy wynik"), default=0)
+    last_played_at = models.DateTimeField(_("Ostatnia gra"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Statystyki gracza")
+        verbose_name_plural = _("Statystyki graczy")
+
+    def __str__(self) -> str:
+        return f"{self.user_id}: {self.attempts} podejść"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Zmaterializowana pozycja w rankingu - globalnym (łączne XP) albo quizu (najlepszy wynik).
+    Aktualizowana przyrostowo przy każdym ukończonym quizie, zamiast sortować całą historię wyników.
+    """
+    board = models.CharField(_("Ranking"), max_length=50)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries"
+    )
+    score = models.BigIntegerField(_("Wynik"))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Pozycja w rankingu")
+        verbose_name_plural = _("Pozycje w rankingu")
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['board', '-score', 'user'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.board}: {self.user_id} ({self.score})"
+
+
+class LeaderboardRankNode(models.Model):
+    """
+    Węzeł drzewa Fenwicka nad wynikami rankingu: liczba pozycji o wyniku z przedziału, za który
+    odpowiada węzeł. Ranga to suma co najwyżej kilkudziesięciu węzłów - O(log zakresu wyników)
+    niezależnie od liczby graczy przed użytkownikiem (Lumen/leaderboards.py).
+    """
+    board = models.CharField(_("Ranking"), max_length=50)
+    node = models.BigIntegerField(_("Węzeł"))
+    count = models.BigIntegerField(_("Liczba pozycji"), default=0)
+
+    class Meta:
+        verbose_name = _("Węzeł drzewa rang")
+        verbose_name_plural = _("Węzły drzewa rang")
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'node'], name='unique_leaderboard_rank_node'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.board}#{self.node}: {self.count}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Postęp importu banku pytań z pliku: bajt, od którego należy wznowić odczyt.
+    Zapisywany w tej samej transakcji co paczka quizów, więc wznowienie nie dubluje danych.
+    """
+    key = models.CharField(_("Klucz importu"), max_length=500, unique=True)
+    offset = models.BigIntegerField(_("Pozycja w pliku"), default=0)
+    imported = models.IntegerField(_("Zaimportowane quizy"), default=0)
+    skipped = models.IntegerField(_("Pominięte rekordy"), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Punkt kontrolny importu")
+        verbose_name_plural = _("Punkty kontrolne importu")
+
+    def __str__(self) -> str:
+        return f"{self.key} @ {self.offset}"
+
+
+class Job(models.Model):
+    """
+    Zadanie w tle (np. wysyłka maila) w kolejce opartej na bazie danych - zapisywane w tej samej
+    transakcji co dane, których dotyczy, i wykonywane przez `manage.py run_workers` (Lumen/jobs.py).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _("Oczekuje")),
+        (RUNNING, _("W trakcie")),
+        (DONE, _("Wykonane")),
+        (FAILED, _("Nieudane")),
+    ]
+
+    name = models.CharField(_("Zadanie"), max_length=100)
+    payload = models.JSONField(_("Dane"), default=dict, blank=True)
+    status = models.CharField(_("Status"), max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(_("Liczba prób"), default=0)
+    max_attempts = models.PositiveIntegerField(_("Maksymalna liczba prób"), default=5)
+    run_at = models.DateTimeField(_("Uruchom po"))
+    locked_by = models.CharField(_("Wykonawca"), max_length=100, blank=True)
+    locked_at = models.DateTimeField(_("Pobrane"), null=True, blank=True)
+    last_error = models.TextField(_("Ostatni błąd"), blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(_("Zakończone"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Zadanie w tle")
+        verbose_name_plural = _("Zadania w tle")
+        indexes = [
+            # Pobieranie najstarszych zadań gotowych do wykonania
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.user.username} - {self.quiz.title} ({self.score} pkt)"
\ No newline at end of file
+        return f"{self.name} #{self.pk} ({self.status})"
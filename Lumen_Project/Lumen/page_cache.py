@@ -0,0 +1,39 @@
+"""
+Cache fragmentów stron HTML z listą i szczegółami quizów.
+
+Zapisujemy tylko blok treści - nawigacja zależy od zalogowanego użytkownika i zawiera token
+CSRF, więc renderuje się przy każdym żądaniu. Klucz listy zawiera wersję katalogu, a klucz
+szczegółów wersję quizu (snapshot.py): każda zmiana, publikacja czy import kieruje odczyty pod
+nowy klucz, a stare wpisy po prostu wygasają.
+"""
+import hashlib
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import SafeString, mark_safe
+
+from .db_routing import force_primary
+from .snapshot import get_catalogue_version, get_quiz_version
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'LUMEN_PAGE_CACHE_TIMEOUT', 10 * 60)
+
+
+def quiz_list_key(cursor: Optional[str]) -> str:
+    # Kursor pochodzi z adresu - skrót trzyma długość klucza w ryzach (limit memcached: 250 znaków)
+    digest = hashlib.sha1((cursor or '').encode()).hexdigest()
+    return f'lumen:page:quiz_list:{get_catalogue_version()}:{digest}'
+
+
+def quiz_detail_key(quiz_id: int) -> str:
+    return f'lumen:page:quiz_detail:{quiz_id}:{get_quiz_version(quiz_id)}'
+
+
+def cached_fragment(key: str, render: Callable[[], str]) -> SafeString:
+    """Zwraca zapisany fragment HTML; render() wywołujemy tylko przy braku wpisu (może zgłosić Http404)."""
+    html = cache.get(key)
+    if html is None:
+        with force_primary():
+            html = str(render())
+        cache.set(key, html, PAGE_CACHE_TIMEOUT)
+    return mark_safe(html)
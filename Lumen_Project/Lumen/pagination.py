@@ -0,0 +1,104 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    """Kursor nie daje się zdekodować."""
+
+
+def encode_cursor(value: datetime, pk: int) -> str:
+    """Koduje pozycję (data, id) jako nieprzezroczysty, bezpieczny dla URL ciąg znaków."""
+    raw = json.dumps([value.isoformat(), pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def paginate_keyset(
+    queryset: QuerySet,
+    cursor: Optional[str],
+    page_size: int,
+    field: str = 'created_at',
+) -> tuple[list[Any], Optional[str]]:
+    """
+    Stronicowanie po kluczu (-field, id): zamiast OFFSET filtrujemy od ostatniego
+    widzianego wiersza, więc koszt strony nie rośnie wraz z jej numerem.
+    Zwraca elementy strony i kursor następnej strony (albo None na końcu listy).
+    """
+    queryset = queryset.order_by(f'-{field}', 'pk')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+    # Pobieramy jeden wiersz więcej, aby wiedzieć, czy istnieje następna strona
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
+
+
+class KeysetPagination(BasePagination):
+    """Paginacja kursorowa DRF oparta na paginate_keyset (tylko do przodu)."""
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            items, self.next_cursor = paginate_keyset(
+                queryset,
+                request.query_params.get(self.cursor_query_param),
+                self.get_page_size(request),
+                self.ordering_field,
+            )
+        except InvalidCursor:
+            raise NotFound("Nieprawidłowy kursor.")
+        return items
+
+    def get_page_size(self, request) -> int:
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,10 @@
+from rest_framework import permissions
+
+
+class IsAuthorOrStaffOrReadOnly(permissions.BasePermission):
+    """Edytować i usuwać quiz może tylko jego autor albo administrator."""
+
+    def has_object_permission(self, request, view, obj) -> bool:
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return request.user.is_staff or obj.created_by_id == request.user.pk
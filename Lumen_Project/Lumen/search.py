@@ -0,0 +1,233 @@
+"""
+Wyszukiwanie pełnotekstowe quizów.
+
+Każdy quiz ma dokument wyszukiwania (QuizSearchDocument) odświeżany przyrostowo: zmiany
+quizu i pytań zgłaszają identyfikatory quizów, a dokumenty przebudowujemy hurtowo raz,
+po zatwierdzeniu transakcji - zapis w panelu admina z dziesięcioma pytaniami to jedno
+odświeżenie, nie dziesięć.
+
+Indeks zależy od bazy:
+    * PostgreSQL - kolumna `search_vector` (tsvector z wagami A/B/C) z indeksem GIN,
+    * SQLite     - wirtualna tabela FTS5 `lumen_quiz_fts` z rankingiem bm25,
+    * inne bazy  - zapasowe `icontains` po dokumentach (bez indeksu).
+Backend można wskazać jawnie w LUMEN_SEARCH_BACKEND.
+"""
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Question, Quiz, QuizSearchDocument
+
+FTS_TABLE = 'lumen_quiz_fts'
+# Wagi kolumn (tytuł, kategoria z opisem, pytania) - trafienie w tytule liczy się najbardziej
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+REFRESH_BATCH_SIZE = 500
+
+_WORD = re.compile(r'\w+')
+
+
+def search_terms(query: str) -> list[str]:
+    return _WORD.findall(query)
+
+
+class SearchBackend:
+    """Dopasowanie i ranking quizów po ich dokumentach wyszukiwania."""
+
+    def index(self, quiz_ids: list[int]) -> None:
+        """Przenosi zapisane dokumenty wskazanych quizów do indeksu."""
+
+    def filter(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        """Quizy pasujące do frazy, bez narzuconej kolejności (np. lista w panelu admina)."""
+        raise NotImplementedError
+
+    def ranked(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        """Quizy pasujące do frazy z adnotacją `search_rank`, od najtrafniejszych."""
+        raise NotImplementedError
+
+
+class ContainsSearchBackend(SearchBackend):
+    """Zapasowy backend bez indeksu - każde słowo frazy musi wystąpić w dokumencie."""
+
+    def filter(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(search_document__title__icontains=term) | Q(search_document__body__icontains=term)
+                | Q(search_document__questions__icontains=term)
+            )
+        return queryset
+
+    def ranked(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        return self.filter(queryset, query).annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+        ).order_by('-created_at', '-id')
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector z wagami w `QuizSearchDocument.search_vector` i indeks GIN."""
+
+    def __init__(self) -> None:
+        # Polska konfiguracja nie jest dostępna w standardowej instalacji PostgreSQL
+        self.config = getattr(settings, 'LUMEN_SEARCH_CONFIG', 'simple')
+
+    def index(self, quiz_ids: list[int]) -> None:
+        from django.contrib.postgres.search import SearchVector
+
+        QuizSearchDocument.objects.filter(quiz_id__in=quiz_ids).update(search_vector=(
+            SearchVector('title', weight='A', config=self.config)
+            + SearchVector('body', weight='B', config=self.config)
+            + SearchVector('questions', weight='C', config=self.config)
+        ))
+
+    def _query(self, query: str):
+        from django.contrib.postgres.search import SearchQuery
+
+        # websearch: składnia jak w wyszukiwarkach ("fraza", -wykluczenie, or), bez błędów składni
+        return SearchQuery(query, search_type='websearch', config=self.config)
+
+    def filter(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        return queryset.filter(search_document__search_vector=self._query(query))
+
+    def ranked(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        from django.contrib.postgres.search import SearchRank
+
+        search_query = self._query(query)
+        return queryset.filter(search_document__search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_document__search_vector'), search_query),
+        ).order_by('-search_rank', '-id')
+
+
+class Fts5SearchBackend(SearchBackend):
+    """Wirtualna tabela FTS5 (rowid = id quizu) i ranking bm25 - lokalnie i w testach."""
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        # Słowa frazy w cudzysłowach (bez operatorów FTS5 z wpisanego tekstu), z dopasowaniem prefiksu
+        return ' '.join(f'"{term}"*' for term in search_terms(query))
+
+    def index(self, quiz_ids: list[int]) -> None:
+        placeholders = ', '.join(['%s'] * len(quiz_ids))
+        document_table = connection.ops.quote_name(QuizSearchDocument._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', quiz_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, body, questions) '
+                f'SELECT quiz_id, title, body, questions FROM {document_table} WHERE quiz_id IN ({placeholders})',
+                quiz_ids,
+            )
+
+    def filter(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+
+    def ranked(self, queryset: QuerySet[Quiz], query: str) -> QuerySet[Quiz]:
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        quiz_table = connection.ops.quote_name(Quiz._meta.db_table)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        # Złączenie z tabelą FTS: SQLite zaczyna od dopasowań w indeksie, a quizy czyta po kluczu.
+        # bm25 zwraca wartości ujemne (im mniejsza, tym trafniej) - odwracamy znak.
+        return queryset.extra(
+            select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {quiz_table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        ).order_by('-search_rank', '-id')
+
+
+BACKENDS_BY_VENDOR = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': Fts5SearchBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_search_backend() -> SearchBackend:
+    """Backend z LUMEN_SEARCH_BACKEND, a domyślnie dobrany do silnika bazy."""
+    path = getattr(settings, 'LUMEN_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    return BACKENDS_BY_VENDOR.get(connection.vendor, ContainsSearchBackend)()
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting: str, **kwargs) -> None:
+    if setting == 'LUMEN_SEARCH_BACKEND':
+        get_search_backend.cache_clear()
+
+
+def build_documents(quiz_ids: list[int]) -> list[QuizSearchDocument]:
+    """Buduje dokumenty dwoma zapytaniami, niezależnie od liczby quizów i pytań."""
+    questions = defaultdict(list)
+    for quiz_id, text in Question.objects.filter(quiz_id__in=quiz_ids).order_by('quiz_id', 'order') \
+            .values_list('quiz_id', 'text'):
+        questions[quiz_id].append(text)
+    return [
+        QuizSearchDocument(
+            quiz_id=quiz_id, title=title, body='\n'.join(filter(None, (category, description))),
+            questions='\n'.join(questions[quiz_id]),
+        )
+        for quiz_id, title, category, description in Quiz.objects.filter(pk__in=quiz_ids)
+        .values_list('pk', 'title', 'category__name', 'description')
+    ]
+
+
+def refresh_search_documents(quiz_ids: Iterable[int]) -> None:
+    """Przebudowuje dokumenty i indeks wskazanych quizów; usunięte quizy znikają z indeksu."""
+    backend = get_search_backend()
+    ids = iter(sorted(set(quiz_ids)))
+    while batch := list(islice(ids, REFRESH_BATCH_SIZE)):
+        with transaction.atomic():
+            QuizSearchDocument.objects.bulk_create(
+                build_documents(batch), update_conflicts=True, unique_fields=['quiz'],
+                update_fields=['title', 'body', 'questions'],
+            )
+            backend.index(batch)
+
+
+def rebuild_search_index() -> int:
+    """Odświeża dokumenty wszystkich quizów (np. po hurtowym imporcie albo zmianie backendu)."""
+    ids = list(Quiz.objects.values_list('pk', flat=True))
+    refresh_search_documents(ids)
+    return len(ids)
+
+
+_pending = threading.local()
+
+
+def _flush_pending() -> None:
+    ids = getattr(_pending, 'ids', None)
+    if ids:
+        _pending.ids = set()
+        refresh_search_documents(ids)
+
+
+def schedule_search_refresh(quiz_ids: Iterable[int]) -> None:
+    """
+    Zgłasza quizy do odświeżenia. W transakcji odświeżamy raz, po zatwierdzeniu - wtedy też
+    pytania zapisane hurtowo po samym quizie są już w bazie. Po wycofanej transakcji
+    identyfikatory czekają do kolejnego zatwierdzenia (odświeżenie jest idempotentne).
+    """
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = set()
+    _pending.ids.update(quiz_ids)
+    if connection.in_atomic_block:
+        transaction.on_commit(_flush_pending)
+    else:
+        _flush_pending()
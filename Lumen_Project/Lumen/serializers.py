@@ -1,13 +1,56 @@
 from rest_framework import serializers
 from django.db import transaction
-from .models import Quiz, Question, Answer
+from .models import Category, Quiz, Question, Answer
+from .images import image_variants
+from .services import adjust_question_count, release_question_orders, resolve_category
+from .snapshot import invalidate_quiz
+from .validators import single_correct_answer_error
+
+
+class CategoryNameField(serializers.CharField):
+    """Kategoria jako nazwa: w API pozostaje tekstem, w bazie wskazuje wiersz Category."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_blank', True)
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('max_length', 100)
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        category = instance.category
+        return category.name if category else ''
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Pochodne obrazu (adresy rozmiarów WebP, wymiary, placeholder) z pola `image_field`
+    i przypiętego `<image_field>_asset`; do czasu przetworzenia - tylko oryginał.
+    """
+
+    def __init__(self, image_field: str, **kwargs):
+        self.image_field = image_field
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        variants = image_variants(getattr(instance, self.image_field), getattr(instance, f'{self.image_field}_asset'))
+        if variants is None:
+            return None
+        data = variants.as_dict()
+        request = self.context.get('request')
+        if request is not None:
+            data = {key: request.build_absolute_uri(value) if key not in ('ready', 'width', 'height', 'placeholder')
+                    else value for key, value in data.items()}
+        return data
 
 
 class AnswerSerializer(serializers.ModelSerializer):
+    # Id jest zapisywalne i opcjonalne: przy edycji quizu wskazuje istniejącą odpowiedź
+    id = serializers.IntegerField(required=False)
+
     class Meta:
         model = Answer
         fields = ['id', 'text', 'is_correct']
-        read_only_fields = ['id']
 
     def to_representation(self, instance):
         """Ukrywa pole is_correct przed zwykłymi użytkownikami."""
@@ -20,52 +63,222 @@ class AnswerSerializer(serializers.ModelSerializer):
 
 
 class QuestionSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
     answers = AnswerSerializer(many=True)
 
     class Meta:
         model = Question
         fields = ['id', 'text', 'order', 'answers']
-        read_only_fields = ['id']
 
 
 class QuizDetailSerializer(serializers.ModelSerializer):
     questions = QuestionSerializer(many=True)
     created_by = serializers.StringRelatedField(read_only=True)
     is_published = serializers.BooleanField(default=False)
+    category = CategoryNameField()
 
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'description', 'category', 'is_published', 'created_by', 'questions']
+        fields = ['id', 'title', 'description', 'category', 'is_published', 'created_by',
+                  'question_count', 'questions']
 
     def validate_questions(self, questions_data):
         if not questions_data:
             raise serializers.ValidationError("Quiz musi zawierać przynajmniej jedno pytanie.")
 
-        for question_data in questions_data:
-            answers = question_data.get('answers', [])
-            correct_count = sum(1 for a in answers if a.get('is_correct'))
-
-            if correct_count != 1:
-                raise serializers.ValidationError(
-                    f"Pytanie musi mieć dokładnie jedną poprawną odpowiedź. Znaleziono: {correct_count}")
+        orders = set()
+        for index, question_data in enumerate(questions_data, start=1):
+            error = single_correct_answer_error(question_data.get('answers', []))
+            if error:
+                raise serializers.ValidationError(error)
+            # Bez jawnej kolejności pytanie trafia na swoją pozycję na liście
+            order = question_data.setdefault('order', index)
+            if order in orders:
+                raise serializers.ValidationError(f"Kolejność {order} powtarza się w kilku pytaniach.")
+            orders.add(order)
         return questions_data
 
     @transaction.atomic
     def create(self, validated_data):
+        """Tworzy quiz stałą liczbą zapytań: quiz, wszystkie pytania, wszystkie odpowiedzi."""
         questions_data = validated_data.pop('questions')
-        quiz = Quiz.objects.create(**validated_data)
+        validated_data['category'] = resolve_category(validated_data.get('category', ''))
+        quiz = Quiz.objects.create(question_count=len(questions_data), **validated_data)
+
+        questions = []
+        answers_per_question = []
+        for question_data in questions_data:
+            question_data.pop('id', None)
+            answers_per_question.append(question_data.pop('answers'))
+            questions.append(Question(quiz=quiz, **question_data))
+        questions = Question.objects.bulk_create(questions)
+
+        Answer.objects.bulk_create([
+            Answer(question=question, **self._answer_fields(ans))
+            for question, answers_data in zip(questions, answers_per_question)
+            for ans in answers_data
+        ])
+        # bulk_create nie wysyła sygnałów - unieważniamy migawkę po zapisaniu odpowiedzi
+        invalidate_quiz(quiz.pk)
+        return self._with_questions(quiz)
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """
+        Edycja quizu z pytaniami. Przesłana lista pytań zastępuje obecną: elementy z `id` są
+        aktualizowane (tylko gdy coś się zmieniło), bez `id` - tworzone, a pominięte - usuwane.
+        Liczba zapytań nie zależy od rozmiaru quizu.
+        """
+        questions_data = validated_data.pop('questions', None)
+        if 'category' in validated_data:
+            validated_data['category'] = resolve_category(validated_data['category'])
+        instance = super().update(instance, validated_data)
+        if questions_data is not None:
+            self._sync_questions(instance, questions_data)
+        invalidate_quiz(instance.pk)
+        return self._with_questions(instance)
 
+    @staticmethod
+    def _with_questions(quiz):
+        """
+        Zwraca świeżą kopię quizu z pytaniami i odpowiedziami pobranymi hurtowo, aby odpowiedź API
+        nie robiła N+1. Nowy obiekt, bo UpdateModelMixin czyści prefetch na instancji z get_object().
+        """
+        return Quiz.objects.select_related('created_by', 'category').prefetch_related('questions__answers').get(pk=quiz.pk)
+
+    @staticmethod
+    def _answer_fields(answer_data):
+        return {key: value for key, value in answer_data.items() if key != 'id'}
+
+    @staticmethod
+    def _apply_changes(obj, data) -> bool:
+        """Ustawia pola obiektu i zwraca True, jeśli którekolwiek się zmieniło."""
+        changed = False
+        for field, value in data.items():
+            if getattr(obj, field) != value:
+                setattr(obj, field, value)
+                changed = True
+        return changed
+
+    def _sync_questions(self, quiz, questions_data):
+        # Dwa odczyty: obecne pytania i wszystkie ich odpowiedzi
+        existing_questions = {question.pk: question for question in Question.objects.filter(quiz=quiz)}
+        existing_answers = {}
+        for answer in Answer.objects.filter(question__quiz=quiz):
+            existing_answers.setdefault(answer.question_id, {})[answer.pk] = answer
+
+        new_questions, changed_questions, kept_question_ids = [], [], set()
+        answer_plan = []
         for question_data in questions_data:
+            question_data = dict(question_data)
             answers_data = question_data.pop('answers')
-            question = Question.objects.create(quiz=quiz, **question_data)
+            question_id = question_data.pop('id', None)
+            if question_id is None:
+                if 'text' not in question_data:
+                    raise serializers.ValidationError({'questions': "Nowe pytanie musi mieć treść."})
+                question = Question(quiz=quiz, **question_data)
+                new_questions.append(question)
+            else:
+                question = existing_questions.get(question_id)
+                if question is None or question_id in kept_question_ids:
+                    raise serializers.ValidationError(
+                        {'questions': f"Pytanie {question_id} nie należy do tego quizu."})
+                kept_question_ids.add(question_id)
+                if self._apply_changes(question, question_data):
+                    changed_questions.append(question)
+            answer_plan.append((question, answers_data))
+
+        removed_question_ids = existing_questions.keys() - kept_question_ids
+        if removed_question_ids:
+            # Odpowiedzi usuwanych pytań znikają kaskadowo jednym zapytaniem
+            Question.objects.filter(pk__in=removed_question_ids).delete()
+        if changed_questions:
+            # Zmienione pytania zwalniają swoje pozycje, zanim zajmą je nowe lub przestawione
+            release_question_orders(changed_questions)
+            Question.objects.bulk_update(changed_questions, ['text', 'order'])
+        if new_questions:
+            Question.objects.bulk_create(new_questions)
+        # Usunięcie przez QuerySet i bulk_create nie zmieniają licznika w sygnałach - korygujemy go raz
+        adjust_question_count(quiz.pk, len(new_questions) - len(removed_question_ids))
 
-            Answer.objects.bulk_create([
-                Answer(question=question, **ans) for ans in answers_data
-            ])
-        return quiz
+        new_answers, changed_answers, removed_answer_ids = [], [], []
+        for question, answers_data in answer_plan:
+            current = existing_answers.get(question.pk, {}) if question.pk in kept_question_ids else {}
+            kept_answer_ids = set()
+            for answer_data in answers_data:
+                answer_id = answer_data.get('id')
+                if answer_id is None:
+                    new_answers.append(Answer(question=question, **self._answer_fields(answer_data)))
+                    continue
+                answer = current.get(answer_id)
+                if answer is None or answer_id in kept_answer_ids:
+                    raise serializers.ValidationError(
+                        {'questions': f"Odpowiedź {answer_id} nie należy do pytania {question.pk}."})
+                kept_answer_ids.add(answer_id)
+                if self._apply_changes(answer, self._answer_fields(answer_data)):
+                    changed_answers.append(answer)
+            removed_answer_ids.extend(current.keys() - kept_answer_ids)
+
+        if removed_answer_ids:
+            Answer.objects.filter(pk__in=removed_answer_ids).delete()
+        if new_answers:
+            Answer.objects.bulk_create(new_answers)
+        if changed_answers:
+            Answer.objects.bulk_update(changed_answers, ['text', 'is_correct'])
 
 
 class QuizListSerializer(serializers.ModelSerializer):
+    category = CategoryNameField(read_only=True)
+    image_variants = ImageVariantsField('image')
+
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'description', 'category', 'image', 'slug']
\ No newline at end of file
+        # Bez attempt_count: zmienia się przy każdej grze, a odpowiedzi API są wersjonowane treścią quizu
+        fields = ['id', 'title', 'description', 'category', 'image', 'image_variants', 'slug', 'question_count']
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    # Liczba z licznika wskazanego przez widok (opublikowane albo wszystkie quizy)
+    quiz_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'quiz_count']
+
+    def get_quiz_count(self, category) -> int:
+        return getattr(category, self.context.get('count_field', 'published_count'))
+
+
+class AttemptSubmissionSerializer(serializers.Serializer):
+    """Całe podejście do quizu w jednym żądaniu: {id_pytania: id_odpowiedzi}."""
+    answers = serializers.DictField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_answers(self, answers):
+        try:
+            return {int(question_id): answer_id for question_id, answer_id in answers.items()}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError("Kluczami muszą być identyfikatory pytań.")
+
+    def validate(self, attrs):
+        """Sprawdza i punktuje wszystkie odpowiedzi jednym zapytaniem do bazy."""
+        answers = attrs['answers']
+        quiz = self.context['quiz']
+        rows = Answer.objects.filter(
+            pk__in=answers.values(),
+            question__quiz=quiz,
+        ).values_list('pk', 'question_id', 'is_correct')
+
+        correct_count = 0
+        log = []
+        for answer_id, question_id, is_correct in rows:
+            # Odpowiedź musi należeć do pytania, pod którym została zgłoszona
+            if answers.get(question_id) == answer_id:
+                log.append((question_id, answer_id, is_correct))
+                correct_count += is_correct
+
+        if len(log) != len(answers):
+            raise serializers.ValidationError(
+                {'answers': "Każda odpowiedź musi należeć do wskazanego pytania z tego quizu."})
+        attrs['correct_count'] = correct_count
+        attrs['log'] = log
+        return attrs
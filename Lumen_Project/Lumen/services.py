@@ -0,0 +1,220 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.contrib.auth.models import AbstractBaseUser
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .leaderboards import record_leaderboard_scores
+from .models import Answer, AttemptAnswer, Category, PlayerStats, Question, Quiz, QuizResult
+
+# Liczba punktów za każdą poprawną odpowiedź
+POINTS_PER_CORRECT_ANSWER = 10
+
+# Stan quizu istotny dla liczników kategorii: (id kategorii, czy opublikowany)
+CategoryState = tuple[Optional[int], bool]
+
+
+def attempt_multiplier(previous_attempts: int) -> float:
+    """
+    Algorytm: za każde kolejne podejście dostajesz 20% mniej punktów,
+    ale nie mniej niż 10% oryginału.
+    """
+    return max(0.1, 1.0 - (previous_attempts * 0.2))
+
+
+@transaction.atomic
+def record_quiz_result(user: AbstractBaseUser, quiz_id: int, raw_score: int,
+                       answers: Iterable[tuple[int, int, bool]] = ()) -> tuple[QuizResult, float]:
+    """
+    Zapisuje wynik podejścia z uwzględnieniem malejących nagród, dodaje XP do profilu
+    i przyrostowo aktualizuje rankingi. Odpowiedzi (id_pytania, id_odpowiedzi, czy_poprawna)
+    trafiają do bazy jednym INSERT-em - bez pytań i odpowiedzi usuniętych w trakcie podejścia.
+    Wszystko w jednej transakcji - wynik i XP zapisują się razem albo wcale.
+    """
+    # Zliczamy poprzednie podejścia
+    previous_attempts = QuizResult.objects.filter(user=user, quiz_id=quiz_id).count()
+    multiplier = attempt_multiplier(previous_attempts)
+    final_score = int(raw_score * multiplier)
+
+    result = QuizResult.objects.create(user=user, quiz_id=quiz_id, score=final_score)
+    AttemptAnswer.objects.bulk_create([
+        AttemptAnswer(result=result, question_id=question_id, answer_id=answer_id, is_correct=is_correct)
+        for question_id, answer_id, is_correct in existing_answers(answers)
+    ])
+    Quiz.objects.filter(pk=quiz_id).update(attempt_count=F('attempt_count') + 1)
+    update_player_stats(user, result)
+    user.profile.add_xp(final_score)
+    record_leaderboard_scores(user, quiz_id, final_score)
+    return result, multiplier
+
+
+def existing_answers(answers: Iterable[tuple[int, Optional[int], bool]]) -> list[tuple[int, Optional[int], bool]]:
+    """
+    Odpowiedzi podejścia ograniczone do pytań, które nadal istnieją; odpowiedź usuniętą w trakcie
+    podejścia zastępuje None (jak SET_NULL przy usunięciu po zapisie). Podejście żyje w cache,
+    więc bez tego INSERT wskazałby nieistniejący wiersz i każda próba zakończenia kończyłaby się błędem.
+    """
+    answers = list(answers)
+    if not answers:
+        return []
+    questions = set(Question.objects.filter(pk__in={q for q, _, _ in answers}).values_list('pk', flat=True))
+    kept = set(Answer.objects.filter(pk__in={a for _, a, _ in answers if a is not None}).values_list('pk', flat=True))
+    return [(question_id, answer_id if answer_id in kept else None, is_correct)
+            for question_id, answer_id, is_correct in answers if question_id in questions]
+
+
+def update_player_stats(user: AbstractBaseUser, result: QuizResult) -> None:
+    """
+    Dolicza wynik do podsumowania gracza atomowym UPDATE (bez odczytu, odporne na równoległe gry).
+    Wiersz zakładamy przez INSERT z ignore_conflicts - dwie pierwsze gry naraz nie zderzą się,
+    a liczba zapytań jest zawsze taka sama.
+    """
+    changes = {
+        'attempts': F('attempts') + 1,
+        'total_score': F('total_score') + result.score,
+        'best_score': Greatest('best_score', result.score),
+        'last_played_at': result.completed_at,
+    }
+    PlayerStats.objects.bulk_create([PlayerStats(user=user)], ignore_conflicts=True)
+    PlayerStats.objects.filter(user=user).update(**changes)
+
+
+def rebuild_player_stats(user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Przelicza podsumowania graczy z historii wyników (np. po hurtowym imporcie) - wszystkich
+    albo tylko wskazanych; podsumowań pozostałych graczy nie dotyka.
+    """
+    results, stats = QuizResult.objects.all(), PlayerStats.objects.all()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        results, stats = results.filter(user_id__in=user_ids), stats.filter(user_id__in=user_ids)
+    rows = results.values('user_id').annotate(
+        attempts=Count('id'), total_score=Sum('score'), best_score=Max('score'), last_played_at=Max('completed_at'),
+    ).order_by()
+    with transaction.atomic():
+        stats.delete()
+        PlayerStats.objects.bulk_create((PlayerStats(**row) for row in rows.iterator(chunk_size=2000)), batch_size=1000)
+
+
+def release_question_orders(questions: list[Question]) -> None:
+    """
+    Przenosi istniejące pytania na tymczasowe, ujemne pozycje jednym zapytaniem. Wywołujemy przed
+    zapisem nowej kolejności, aby zamiana miejscami nie naruszyła unikalności (quiz, order).
+    """
+    if questions:
+        Question.objects.filter(pk__in=[question.pk for question in questions]).update(order=-F('pk'))
+
+
+def adjust_question_count(quiz_id: int, delta: int) -> None:
+    """Zmienia licznik pytań quizu atomowym UPDATE - dla ścieżek hurtowych, które omijają sygnały."""
+    if delta:
+        Quiz.objects.filter(pk=quiz_id).update(question_count=F('question_count') + delta)
+
+
+def _count_subquery(model) -> Coalesce:
+    counts = model.objects.filter(quiz=OuterRef('pk')).order_by().values('quiz').annotate(total=Count('pk'))
+    return Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0)
+
+
+def reconcile_quiz_counters(dry_run: bool = False, batch_size: int = 1000,
+                            quiz_ids: Optional[Iterable[int]] = None) -> list[tuple[int, int, int, int, int]]:
+    """
+    Porównuje zapisane liczniki quizów (wszystkich albo wskazanych) z faktycznymi i poprawia rozbieżne.
+    Zwraca krotki (id, zapisane pytania, faktyczne pytania, zapisane podejścia, faktyczne podejścia).
+    """
+    quizzes = Quiz.objects.all() if quiz_ids is None else Quiz.objects.filter(pk__in=list(quiz_ids))
+    drifted = quizzes.annotate(
+        real_questions=_count_subquery(Question), real_attempts=_count_subquery(QuizResult),
+    ).filter(
+        ~Q(question_count=F('real_questions')) | ~Q(attempt_count=F('real_attempts'))
+    ).order_by('pk').values_list('pk', 'question_count', 'real_questions', 'attempt_count', 'real_attempts')
+    rows = list(drifted)
+    if not dry_run:
+        with transaction.atomic():
+            Quiz.objects.bulk_update(
+                [Quiz(pk=pk, question_count=questions, attempt_count=attempts)
+                 for pk, _, questions, _, attempts in rows],
+                ['question_count', 'attempt_count'],
+                batch_size=batch_size,
+            )
+    return rows
+
+
+def resolve_category(name: str) -> Optional[Category]:
+    """Kategoria o podanej nazwie (tworzona przy pierwszym użyciu); pusta nazwa to brak kategorii."""
+    name = (name or '').strip()
+    if not name:
+        return None
+    return Category.objects.get_or_create(name=name)[0]
+
+
+def resolve_categories(names: Iterable[str]) -> dict[str, Category]:
+    """Wersja hurtowa dla importerów: dwa zapytania niezależnie od liczby nazw."""
+    names = {name.strip() for name in names if name and name.strip()}
+    if not names:
+        return {}
+    Category.objects.bulk_create([Category(name=name) for name in names], ignore_conflicts=True)
+    return {category.name: category for category in Category.objects.filter(name__in=names)}
+
+
+def category_deltas(states: Iterable[tuple[Optional[CategoryState], Optional[CategoryState]]]) -> dict[int, tuple[int, int]]:
+    """
+    Zmiany liczników (wszystkie, opublikowane) na kategorię dla par stanów quizu (przed, po);
+    None oznacza, że quiz wtedy nie istniał. Pary bez zmian się znoszą.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for before, after in states:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None and state[0] is not None:
+                deltas[state[0]][0] += sign
+                deltas[state[0]][1] += sign * state[1]
+    return {category_id: (total, published) for category_id, (total, published) in deltas.items()
+            if total or published}
+
+
+def adjust_category_counts(deltas: dict[int, tuple[int, int]]) -> None:
+    """Atomowe UPDATE liczników kategorii - jedno na zmienioną kategorię."""
+    for category_id, (total, published) in deltas.items():
+        Category.objects.filter(pk=category_id).update(
+            quiz_count=F('quiz_count') + total, published_count=F('published_count') + published,
+        )
+
+
+def reconcile_category_counters(dry_run: bool = False) -> list[tuple[int, int, int, int, int]]:
+    """
+    Porównuje liczniki kategorii z faktyczną liczbą quizów i poprawia rozbieżne.
+    Zwraca krotki (id, zapisane wszystkie, faktyczne wszystkie, zapisane opublikowane, faktyczne opublikowane).
+    """
+    def quiz_count(**filters) -> Coalesce:
+        counts = Quiz.objects.filter(category=OuterRef('pk'), **filters).order_by().values('category') \
+            .annotate(total=Count('pk'))
+        return Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0)
+
+    drifted = Category.objects.annotate(
+        real_total=quiz_count(), real_published=quiz_count(is_published=True),
+    ).filter(
+        ~Q(quiz_count=F('real_total')) | ~Q(published_count=F('real_published'))
+    ).order_by('pk').values_list('pk', 'quiz_count', 'real_total', 'published_count', 'real_published')
+    rows = list(drifted)
+    if not dry_run:
+        Category.objects.bulk_update(
+            [Category(pk=pk, quiz_count=total, published_count=published) for pk, _, total, _, published in rows],
+            ['quiz_count', 'published_count'],
+        )
+    return rows
+
+
+def set_quizzes_published(queryset, is_published: bool) -> list[int]:
+    """
+    Publikuje lub wycofuje quizy hurtowo i koryguje liczniki kategorii.
+    Zwraca identyfikatory quizów, których stan faktycznie się zmienił.
+    """
+    with transaction.atomic():
+        changed = list(queryset.exclude(is_published=is_published).values_list('pk', 'category_id'))
+        Quiz.objects.filter(pk__in=[pk for pk, _ in changed]).update(is_published=is_published)
+        adjust_category_counts(category_deltas(
+            ((category_id, not is_published), (category_id, is_published)) for _, category_id in changed
+        ))
+    return [pk for pk, _ in changed]
@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Quiz, Question, Answer
+from .images import track_image_field
+from .leaderboards import get_leaderboard_store, quiz_board
+from .search import schedule_search_refresh
+from .services import adjust_category_counts, adjust_question_count, category_deltas
+from .snapshot import invalidate_catalogue, invalidate_quiz, invalidate_quizzes, invalidate_quizzes_on_commit
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def invalidate_quiz_on_change(sender: type[Quiz], instance: Quiz, **kwargs) -> None:
+    """Unieważnia skompilowaną migawkę i zapisane strony listy po zapisie lub usunięciu quizu."""
+    invalidate_quiz(instance.pk)
+    invalidate_catalogue()
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+@receiver([post_save, post_delete], sender=Question)
+def refresh_search_document(sender: type, instance: Quiz | Question, **kwargs) -> None:
+    """Dokument wyszukiwania przebudowujemy raz na transakcję, po jej zatwierdzeniu."""
+    schedule_search_refresh([instance.pk if sender is Quiz else instance.quiz_id])
+
+
+@receiver(pre_save, sender=Quiz)
+def remember_quiz_category_state(sender: type[Quiz], instance: Quiz, **kwargs) -> None:
+    """Zapamiętuje kategorię i publikację sprzed zapisu, żeby po nim poprawić liczniki kategorii."""
+    if instance._state.adding:
+        instance._category_state = None
+    else:
+        instance._category_state = Quiz.objects.filter(pk=instance.pk).values_list('category_id', 'is_published').first()
+
+
+@receiver(post_save, sender=Quiz)
+def count_saved_quiz(sender: type[Quiz], instance: Quiz, **kwargs) -> None:
+    before = getattr(instance, '_category_state', None)
+    adjust_category_counts(category_deltas([(before, (instance.category_id, instance.is_published))]))
+
+
+@receiver(post_delete, sender=Quiz)
+def count_deleted_quiz(sender: type[Quiz], instance: Quiz, **kwargs) -> None:
+    adjust_category_counts(category_deltas([((instance.category_id, instance.is_published), None)]))
+
+
+@receiver([post_save, pre_delete], sender=Category)
+def refresh_category_quizzes(sender: type[Category], instance: Category, created: bool = False, **kwargs) -> None:
+    """
+    Zmiana nazwy lub usunięcie kategorii zmienia migawki, strony listy i dokumenty wyszukiwania
+    jej quizów. Przy usuwaniu zbieramy quizy przed SET_NULL - potem nie da się ich już wskazać.
+    """
+    if created:
+        return
+    quiz_ids = list(instance.quizzes.values_list('pk', flat=True))
+    invalidate_quizzes(quiz_ids)
+    invalidate_catalogue()
+    schedule_search_refresh(quiz_ids)
+
+
+@receiver(post_delete, sender=Quiz)
+def clear_quiz_leaderboard(sender: type[Quiz], instance: Quiz, **kwargs) -> None:
+    """Ranking quizu nie ma klucza obcego do quizu - czyścimy go ręcznie."""
+    get_leaderboard_store().clear(quiz_board(instance.pk))
+
+
+@receiver(pre_delete, sender=get_user_model())
+def remove_user_from_leaderboards(sender, instance, **kwargs) -> None:
+    """Pozycje usuwanego konta znikają kaskadowo - drzewo rang musi o nich wiedzieć wcześniej."""
+    get_leaderboard_store().remove_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_quiz_on_question_change(sender: type[Question], instance: Question, **kwargs) -> None:
+    invalidate_quiz(instance.quiz_id)
+
+
+@receiver(post_save, sender=Question)
+def count_created_question(sender: type[Question], instance: Question, created: bool, **kwargs) -> None:
+    if created:
+        adjust_question_count(instance.quiz_id, 1)
+
+
+@receiver(post_delete, sender=Question)
+def count_deleted_question(sender: type[Question], instance: Question, origin=None, **kwargs) -> None:
+    # Tylko usunięcie pojedynczego pytania. Usunięcia hurtowe (QuerySet.delete) korygują licznik
+    # same, jednym zapytaniem, a przy kaskadzie z quizu licznik znika razem z quizem.
+    if isinstance(origin, Question):
+        adjust_question_count(instance.quiz_id, -1)
+
+
+@receiver(pre_delete, sender=Answer)
+def invalidate_quiz_on_answer_delete(sender: type[Answer], instance: Answer, origin=None, **kwargs) -> None:
+    """
+    Usunięcie odpowiedzi dowolną ścieżką (shell, hurtowo w adminie) unieważnia migawkę - inaczej gracz
+    mógłby wysłać id odpowiedzi, której już nie ma. Odbiornik działa dla każdej odpowiedzi, więc quizy
+    ustalamy raz na całe usunięcie (origin), a wersję podbijamy raz, po zatwierdzeniu. Kaskadę z pytania
+    lub quizu pomijamy - unieważniają go odbiorniki Question/Quiz.
+    """
+    if isinstance(origin, Answer):
+        answers = Answer.objects.filter(pk=origin.pk)
+    elif isinstance(origin, QuerySet) and origin.model is Answer:
+        answers = origin
+    else:
+        return
+    if getattr(origin, '_quizzes_invalidated', False):
+        return
+    origin._quizzes_invalidated = True
+    invalidate_quizzes_on_commit(answers.order_by().values_list('question__quiz_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Answer)
+def invalidate_quiz_on_answer_change(sender: type[Answer], instance: Answer, **kwargs) -> None:
+    # Odpowiedź zna tylko swoje pytanie - sięgamy po quiz_id jednym lekkim zapytaniem
+    quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    if quiz_id is not None:
+        invalidate_quiz(quiz_id)
+
+
+# Pochodne obrazów budujemy w tle; po ich przypięciu migawka quizu musi się przebudować
+track_image_field(Quiz, 'image', on_ready=lambda quiz: invalidate_quiz(quiz.pk))
+track_image_field(Question, 'image', on_ready=lambda question: invalidate_quiz(question.quiz_id))
@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.http import Http404
+
+from .cache import aget_version, bump_version, get_version
+from .db_routing import force_primary
+from .images import ImageVariants, image_variants
+from .models import Quiz, Question, Answer
+
+# Czas życia skompilowanego quizu w cache (w sekundach). Poprawność zapewnia wersjonowanie,
+# timeout jedynie ogranicza pamięć zajmowaną przez rzadko grane quizy.
+QUIZ_CACHE_TIMEOUT = getattr(settings, 'LUMEN_QUIZ_CACHE_TIMEOUT', 60 * 60)
+
+
+@dataclass(frozen=True)
+class CompiledAnswer:
+    id: int
+    text: str
+    is_correct: bool
+
+
+@dataclass(frozen=True)
+class CompiledQuestion:
+    id: int
+    text: str
+    order: int
+    time_limit: int
+    image_url: str
+    answers: tuple[CompiledAnswer, ...]
+    # Pochodne ilustracji (WebP w kilku rozmiarach) - None, gdy pytanie nie ma obrazu
+    image: Optional[ImageVariants] = None
+
+    @cached_property
+    def correct_answer(self) -> Optional[CompiledAnswer]:
+        return next((answer for answer in self.answers if answer.is_correct), None)
+
+    def get_answer(self, answer_id: int) -> Optional[CompiledAnswer]:
+        """Zwraca odpowiedź tylko wtedy, gdy należy do tego pytania."""
+        return next((answer for answer in self.answers if answer.id == answer_id), None)
+
+
+@dataclass(frozen=True)
+class CompiledQuiz:
+    """
+    Niezmienna migawka quizu: pytania w kolejności, ich odpowiedzi i poprawne odpowiedzi.
+    Budowana raz na wersję quizu i trzymana w cache, dzięki czemu rozgrywka
+    nie odpytuje bazy o treść przy każdym kroku.
+    """
+    id: int
+    title: str
+    description: str
+    category: str
+    is_published: bool
+    questions: tuple[CompiledQuestion, ...]
+
+    @property
+    def total_questions(self) -> int:
+        return len(self.questions)
+
+    @cached_property
+    def correct_answer_ids(self) -> frozenset[int]:
+        return frozenset(
+            answer.id for question in self.questions for answer in question.answers if answer.is_correct
+        )
+
+    @cached_property
+    def _questions_by_order(self) -> dict[int, CompiledQuestion]:
+        by_order: dict[int, CompiledQuestion] = {}
+        for question in self.questions:
+            # Kolejność jest unikalna w quizie (unique_question_order); setdefault na wypadek starych danych
+            by_order.setdefault(question.order, question)
+        return by_order
+
+    def get_question(self, order: int) -> Optional[CompiledQuestion]:
+        return self._questions_by_order.get(order)
+
+    def get_question_after(self, question: CompiledQuestion) -> Optional[CompiledQuestion]:
+        # Numeracja pytań może mieć luki (np. po usunięciu pytania) - idziemy po kolejności, nie order + 1
+        return next((candidate for candidate in self.questions if candidate.order > question.order), None)
+
+
+# Wersja całego katalogu quizów - zmienia się przy każdej zmianie wiersza któregokolwiek quizu
+CATALOGUE_VERSION_KEY = 'lumen:catalogue:version'
+
+
+def _version_key(quiz_id: int) -> str:
+    return f'lumen:quiz:{quiz_id}:version'
+
+
+def _compiled_key(quiz_id: int, version: int) -> str:
+    return f'lumen:quiz:{quiz_id}:compiled:{version}'
+
+
+def compile_quiz(quiz_id: int) -> Optional[CompiledQuiz]:
+    """Buduje migawkę quizu stałą liczbą zapytań (quiz, pytania, odpowiedzi)."""
+    questions_qs = Question.objects.order_by('order', 'id').select_related('image_asset').prefetch_related(
+        Prefetch('answers', queryset=Answer.objects.order_by('id'))
+    )
+    quiz = Quiz.objects.filter(pk=quiz_id).select_related('category').prefetch_related(
+        Prefetch('questions', queryset=questions_qs)
+    ).first()
+    if quiz is None:
+        return None
+
+    return CompiledQuiz(
+        id=quiz.id,
+        title=quiz.title,
+        description=quiz.description,
+        category=quiz.category.name if quiz.category else '',
+        is_published=quiz.is_published,
+        questions=tuple(
+            CompiledQuestion(
+                id=question.id,
+                text=question.text,
+                order=question.order,
+                time_limit=question.time_limit,
+                image_url=question.image.url if question.image else '',
+                image=image_variants(question.image, question.image_asset),
+                answers=tuple(
+                    CompiledAnswer(id=answer.id, text=answer.text, is_correct=answer.is_correct)
+                    for answer in question.answers.all()
+                ),
+            )
+            for question in quiz.questions.all()
+        ),
+    )
+
+
+def get_compiled_quiz(quiz_id: int) -> Optional[CompiledQuiz]:
+    """Zwraca migawkę quizu z cache, budując ją przy pierwszym odczycie danej wersji."""
+    version = get_version(_version_key(quiz_id))
+    key = _compiled_key(quiz_id, version)
+    compiled = cache.get(key)
+    if compiled is None:
+        with force_primary():
+            compiled = compile_quiz(quiz_id)
+        if compiled is not None:
+            cache.set(key, compiled, QUIZ_CACHE_TIMEOUT)
+    return compiled
+
+
+def get_compiled_quiz_or_404(quiz_id: int) -> CompiledQuiz:
+    compiled = get_compiled_quiz(quiz_id)
+    if compiled is None:
+        raise Http404("Nie znaleziono quizu.")
+    return compiled
+
+
+async def aget_compiled_quiz(quiz_id: int) -> Optional[CompiledQuiz]:
+    """
+    Wersja dla widoków async: trafienie to dwa odczyty z cache bez blokowania wątku.
+    Budowa migawki (kilka zapytań z prefetch) wykonuje się w wątku jednym przeskokiem.
+    """
+    version = await aget_version(_version_key(quiz_id))
+    key = _compiled_key(quiz_id, version)
+    compiled = await cache.aget(key)
+    if compiled is None:
+        with force_primary():
+            compiled = await sync_to_async(compile_quiz)(quiz_id)
+        if compiled is not None:
+            await cache.aset(key, compiled, QUIZ_CACHE_TIMEOUT)
+    return compiled
+
+
+async def aget_compiled_quiz_or_404(quiz_id: int) -> CompiledQuiz:
+    compiled = await aget_compiled_quiz(quiz_id)
+    if compiled is None:
+        raise Http404("Nie znaleziono quizu.")
+    return compiled
+
+
+def get_quiz_version(quiz_id: int) -> int:
+    """Wersja treści quizu - zmienia się przy każdej zmianie quizu, pytań lub odpowiedzi."""
+    return get_version(_version_key(quiz_id))
+
+
+def get_quiz_versions(quiz_ids: Iterable[int]) -> dict[int, int]:
+    """Wersje wielu quizów jednym odczytem z cache (brakujące inicjalizujemy pojedynczo)."""
+    keys = {_version_key(quiz_id): quiz_id for quiz_id in quiz_ids}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, quiz_id in keys.items():
+        if quiz_id not in versions:
+            versions[quiz_id] = get_version(key)
+    return versions
+
+
+def get_catalogue_version() -> int:
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def _bump(key: str) -> None:
+    """
+    Podbija wersję od razu, a w transakcji ponownie po zatwierdzeniu: równoległy odczyt mógł
+    w międzyczasie zbudować wpis z jeszcze niezatwierdzonych (starych) danych pod nową wersją.
+    """
+    bump_version(key)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_version(key))
+
+
+def invalidate_quiz(quiz_id: int) -> None:
+    """Podbija wersję quizu - kolejny odczyt zbuduje migawkę od nowa."""
+    _bump(_version_key(quiz_id))
+
+
+def invalidate_catalogue() -> None:
+    """Unieważnia wszystko, co zależy od listy quizów (np. zapisane strony listy)."""
+    _bump(CATALOGUE_VERSION_KEY)
+
+
+def invalidate_quizzes(quiz_ids: Iterable[int]) -> None:
+    for quiz_id in quiz_ids:
+        invalidate_quiz(quiz_id)
+
+
+def invalidate_quizzes_on_commit(quiz_ids: Iterable[int]) -> None:
+    """Podbija wersję każdego quizu raz, po zatwierdzeniu transakcji (poza transakcją - od razu)."""
+    quiz_ids = set(quiz_ids)
+
+    def bump() -> None:
+        for quiz_id in quiz_ids:
+            bump_version(_version_key(quiz_id))
+
+    if connection.in_atomic_block:
+        transaction.on_commit(bump)
+    else:
+        bump()
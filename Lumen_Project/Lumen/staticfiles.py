@@ -0,0 +1,50 @@
+"""
+Pliki statyczne z odciskiem treści i gotowymi wersjami gzip.
+
+`collectstatic` zapisuje każdy plik także pod nazwą z odciskiem (np. `css/style.3f2a9c1b.css`),
+a `{% static %}` przy DEBUG=False zwraca właśnie tę nazwę. Zmiana treści zmienia adres, więc
+przeglądarka może trzymać plik bezterminowo - przy kolejnej wizycie nie pobiera go ponownie.
+Pliki tekstowe kompresujemy raz, w trakcie `collectstatic` (obok pliku leży `<nazwa>.gz`),
+a serwuje je middleware StaticFilesMiddleware - bez kompresji w żądaniu.
+"""
+import gzip
+import os
+from typing import Iterator
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+GZIP_SUFFIX = '.gz'
+# Obrazy JPEG/PNG/WebP i fonty WOFF2 są już skompresowane - gzip ich nie zmniejszy
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico'}
+# Wersję .gz zapisujemy tylko, gdy oszczędza co najmniej tyle treści
+MIN_SAVING = 0.05
+
+
+def compress(data: bytes) -> bytes:
+    # mtime=0: ta sama treść daje zawsze ten sam plik .gz
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, które po nadaniu odcisków zapisuje wersje .gz plików tekstowych."""
+
+    def post_process(self, paths: dict, dry_run: bool = False, **options) -> Iterator:
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Manifest jest już kompletny: kompresujemy oryginały i ich wersje z odciskiem
+        for name in sorted(set(self.hashed_files) | set(self.hashed_files.values())):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                self.compress_file(name)
+
+    def compress_file(self, name: str) -> bool:
+        with self.open(name) as file:
+            data = file.read()
+        compressed = compress(data)
+        if len(compressed) > len(data) * (1 - MIN_SAVING):
+            return False
+        if self.exists(name + GZIP_SUFFIX):
+            self.delete(name + GZIP_SUFFIX)
+        self._save(name + GZIP_SUFFIX, ContentFile(compressed))
+        return True
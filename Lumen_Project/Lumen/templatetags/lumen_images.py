@@ -0,0 +1,28 @@
+from typing import Optional
+
+from django import template
+from django.utils.html import format_html
+
+from Lumen.images import ImageVariants
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image: Optional[ImageVariants], size: str = 'medium', alt: str = '', css_class: str = '',
+                     sizes: str = '100vw') -> str:
+    """
+    Znacznik <img> z pochodnymi WebP (src w rozmiarze `size`, pozostałe w srcset), wymiarami
+    zapobiegającymi przeskokom układu i rozmytym placeholderem w tle do czasu wczytania.
+    Obraz jeszcze nieprzetworzony wyświetlamy z oryginału.
+    """
+    if image is None:
+        return ''
+    if not image.ready:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', image.original, alt, css_class)
+    width, height = image.dimensions(size)
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy" '
+        'decoding="async" style="background: center / cover no-repeat url(\'{}\')">',
+        image.url(size), image.srcset(), sizes, width, height, alt, css_class, image.placeholder,
+    )
@@ -1,7 +1,45 @@
 from http.client import responses
-from django.test import TestCase
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from urllib.parse import parse_qs, urlparse
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections, router, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.admin.sites import AdminSite
 from django.contrib.auth.models import User
-from .models import Quiz
+from .admin import QuestionAdmin, QuizAdmin
+from .models import (
+    Quiz, Question, Answer, AttemptAnswer, Category, ImageAsset, Job, QuizResult, ImportCheckpoint, LeaderboardEntry,
+    LeaderboardRankNode, PlayerStats, QuizSearchDocument,
+)
+from .services import reconcile_category_counters, record_quiz_result
+from .snapshot import get_compiled_quiz
+from .attempts import get_attempt
+from .bank_import import import_file, split_ranges
+from .images import DERIVATIVE_SIZES, derivative_name
+from .jobs import HANDLERS, enqueue, enqueue_email, register_job, work_off
+from .middleware import RequestProfile
+from .staticfiles import GZIP_SUFFIX
+from .leaderboards import DatabaseLeaderboardStore, InMemoryLeaderboardStore, GLOBAL_BOARD, TREE_SIZE, node_deltas
 from django.urls import  reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -78,16 +116,1767 @@ class QuizAPITest(APITestCase):
         self.assertTrue(Quiz.objects.filter(title="API Test Quiz").exists())
 
 
+class CompiledQuizTest(TestCase):
+    """Testuje migawkę quizu w cache i jej unieważnianie."""
 
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('player', 'player@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Quiz z cache", created_by=self.user, is_published=True)
+        for order in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f"Pytanie {order}", order=order)
+            Answer.objects.create(question=question, text="Dobra", is_correct=True)
+            Answer.objects.create(question=question, text="Zła", is_correct=False)
+
+    def test_play_step_runs_no_content_queries(self):
+        """Po zbudowaniu migawki kolejne kroki nie odpytują tabel z treścią quizu."""
+        self.client.login(username='player', password='password')
+        self.client.get(reverse('play_quiz_view', args=[self.quiz.id, 1]))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('play_quiz_view', args=[self.quiz.id, 2]))
+        self.assertContains(response, "Pytanie 2")
+        content_tables = ('lumen_quiz', 'lumen_question', 'lumen_answer')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries
+                          if any(table in q['sql'].lower() for table in content_tables)])
+
+    def test_answer_change_invalidates_snapshot(self):
+        self.assertEqual(get_compiled_quiz(self.quiz.id).total_questions, 2)
+        answer = Answer.objects.get(question__order=1, is_correct=False)
+        answer.text = "Zmieniona"
+        answer.save()
+        texts = [a.text for a in get_compiled_quiz(self.quiz.id).get_question(1).answers]
+        self.assertIn("Zmieniona", texts)
+
+    def test_deleted_answer_leaves_snapshot(self):
+        def answer_texts():
+            return [[a.text for a in q.answers] for q in get_compiled_quiz(self.quiz.id).questions]
+
+        self.assertEqual(answer_texts(), [["Dobra", "Zła"], ["Dobra", "Zła"]])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Answer.objects.get(question__order=1, is_correct=False).delete()
+        self.assertEqual(answer_texts(), [["Dobra"], ["Dobra", "Zła"]])
+
+        # Usunięcie hurtowe: jedno zapytanie o quizy i jedno podbicie wersji na całe usunięcie
+        with self.captureOnCommitCallbacks(execute=True) as bulk_callbacks:
+            Answer.objects.filter(question__quiz=self.quiz, is_correct=True).delete()
+        self.assertEqual(answer_texts(), [[], ["Zła"]])
+        self.assertEqual((len(callbacks), len(bulk_callbacks)), (1, 1))
+
+    def test_admin_unpublish_invalidates_snapshot(self):
+        self.assertTrue(get_compiled_quiz(self.quiz.id).is_published)
+        request = RequestFactory().post('/')
+        model_admin = QuizAdmin(Quiz, AdminSite())
+        model_admin.message_user = lambda *args, **kwargs: None
+        model_admin.unpublish_quizzes(request, Quiz.objects.filter(pk=self.quiz.pk))
+        self.assertFalse(get_compiled_quiz(self.quiz.id).is_published)
+
+
+class QuizAttemptAPITest(APITestCase):
+    """Testuje zgłaszanie całego podejścia jednym żądaniem."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('mobile', 'mobile@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Quiz mobilny", created_by=self.user, is_published=True)
+        self.correct = {}
+        self.wrong = {}
+        for order in range(1, 4):
+            question = Question.objects.create(quiz=self.quiz, text=f"Pytanie {order}", order=order)
+            self.correct[question.id] = Answer.objects.create(question=question, text="Dobra", is_correct=True).id
+            self.wrong[question.id] = Answer.objects.create(question=question, text="Zła").id
+        self.url = reverse('quiz-attempts', args=[self.quiz.id])
+        self.client.force_authenticate(user=self.user)
+
+    def test_attempt_is_scored_and_recorded(self):
+        question_ids = list(self.correct)
+        answers = {question_ids[0]: self.correct[question_ids[0]],
+                   question_ids[1]: self.correct[question_ids[1]],
+                   question_ids[2]: self.wrong[question_ids[2]]}
+        response = self.client.post(self.url, {'answers': answers}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['correct'], 2)
+        self.assertEqual(response.data['score'], 20)
+        result = QuizResult.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual(result.score, 20)
+        self.assertEqual(result.answers.filter(is_correct=True).count(), 2)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.xp, 20)
+
+    def test_answer_from_other_question_is_rejected(self):
+        first, second = list(self.correct)[:2]
+        response = self.client.post(self.url, {'answers': {first: self.correct[second]}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(QuizResult.objects.exists())
+
+    def test_query_count_does_not_depend_on_answer_count(self):
+        """Punktacja podejścia to stała liczba zapytań, niezależna od liczby pytań."""
+        with CaptureQueriesContext(connection) as one_answer:
+            question_id = next(iter(self.correct))
+            self.client.post(self.url, {'answers': {question_id: self.correct[question_id]}}, format='json')
+        with CaptureQueriesContext(connection) as all_answers:
+            self.client.post(self.url, {'answers': self.correct}, format='json')
+        self.assertEqual(len(one_answer), len(all_answers))
+
+
+class QuizKeysetPaginationTest(APITestCase):
+    """Testuje paginację kursorową listy HTML i API."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', 'reader@test.com', 'password')
+        Quiz.objects.bulk_create([
+            Quiz(title=f"Quiz {i}", created_by=self.user, is_published=True) for i in range(25)
+        ])
+
+    def test_html_list_walks_every_quiz_once(self):
+        seen = []
+        url = reverse('quiz_list')
+        while url:
+            response = self.client.get(url)
+            seen.extend(quiz.id for quiz in response.context['quizzes'])
+            cursor = response.context['next_cursor']
+            url = f"{reverse('quiz_list')}?cursor={cursor}" if cursor else None
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_api_list_is_paginated_without_prefetch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('quiz-list'), {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+        self.assertEqual(len(ctx), 1)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('quiz-list'), {'cursor': 'nie-kursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LeaderboardStoreContract:
+    """Wspólne testy zachowania dla każdego magazynu rankingów."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+        self.users = [User.objects.create_user(f'ranked{i}', f'ranked{i}@test.com', 'password') for i in range(6)]
+        for user, score in zip(self.users, [50, 80, 80, 10, 30, 70]):
+            self.store.submit('board', user.pk, score)
+
+    def test_top_orders_by_score_then_user(self):
+        top = self.store.top('board', 3)
+        self.assertEqual([(e.rank, e.user_id, e.score) for e in top],
+                         [(1, self.users[1].pk, 80), (2, self.users[2].pk, 80), (3, self.users[5].pk, 70)])
+
+    def test_rank_and_neighbourhood(self):
+        self.assertEqual(self.store.rank('board', self.users[0].pk), 4)
+        around = self.store.around('board', self.users[0].pk, 1)
+        self.assertEqual([(e.rank, e.user_id) for e in around],
+                         [(3, self.users[5].pk), (4, self.users[0].pk), (5, self.users[4].pk)])
+        self.assertIsNone(self.store.rank('board', 10 ** 9))
+
+    def test_keep_best_ignores_lower_scores(self):
+        self.store.submit('board', self.users[3].pk, 5, keep_best=True)
+        self.assertEqual(self.store.rank('board', self.users[3].pk), 6)
+        self.store.submit('board', self.users[3].pk, 100, keep_best=True)
+        self.assertEqual(self.store.rank('board', self.users[3].pk), 1)
+
+    def test_removed_user_leaves_every_board(self):
+        self.store.submit('other', self.users[1].pk, 5)
+        self.store.remove_user(self.users[1].pk)
+        self.assertIsNone(self.store.rank('board', self.users[1].pk))
+        self.assertEqual(self.store.rank('board', self.users[2].pk), 1)
+        self.assertEqual(self.store.top('other', 5), [])
+
+
+class DatabaseLeaderboardStoreTest(LeaderboardStoreContract, TestCase):
+    def make_store(self):
+        return DatabaseLeaderboardStore()
+
+    def test_rank_tree_matches_sorted_order(self):
+        import random
+
+        rng = random.Random(4)
+        users = self.users + User.objects.bulk_create([User(username=f'extra{i}') for i in range(24)])
+        reference = InMemoryLeaderboardStore()
+        for user, score in zip(self.users, [50, 80, 80, 10, 30, 70]):
+            reference.submit('board', user.pk, score)
+        for _ in range(300):
+            user, score, keep_best = rng.choice(users), rng.choice([0, 5, 30, 30, 80, 2 ** 40]), rng.random() < 0.5
+            self.store.submit('board', user.pk, score, keep_best=keep_best)
+            reference.submit('board', user.pk, score, keep_best=keep_best)
+        scores = [(user.pk, rng.randrange(100)) for user in users]
+        self.store.replace_board('rebuilt', scores)
+        reference.replace_board('rebuilt', scores)
+        for board in ('board', 'rebuilt'):
+            for user in users:
+                self.assertEqual(self.store.rank(board, user.pk), reference.rank(board, user.pk))
+
+    def test_rank_lookup_cost_does_not_grow_with_rank(self):
+        last = User.objects.bulk_create([User(username=f'tail{i}') for i in range(50)])
+        self.store.replace_board('long', [(user.pk, 1000 - i) for i, user in enumerate(last)])
+        # Wynik gracza, węzły drzewa (najwyżej 32 wiersze po kluczu) i remisy
+        with self.assertNumQueries(3):
+            self.assertEqual(self.store.rank('long', last[-1].pk), 50)
+        # Korzeń obejmowałby wszystkie pozycje - każdy zapis blokowałby ten sam wiersz
+        self.assertFalse(LeaderboardRankNode.objects.filter(node=TREE_SIZE).exists())
+
+    def test_writes_in_different_score_bands_share_no_nodes(self):
+        # Nowe pozycje i awanse graczy z wynikami różnego rzędu zmieniają rozłączne wiersze drzewa
+        changes = [{5: 1}, {100: 1}, {3000: 1}, {70_000: 1}, {150: -1, 240: 1}, {2_000_000: -1, 2_000_500: 1}]
+        touched = [set(node_deltas(change)) for change in changes]
+        for i, nodes in enumerate(touched):
+            self.assertTrue(nodes)
+            for other in touched[i + 1:]:
+                self.assertFalse(nodes & other)
+
+    def test_deleting_user_updates_rank_tree(self):
+        # Domyślny magazyn (tabela w bazie) dostaje sygnał przed kaskadowym usunięciem pozycji
+        self.users[1].delete()
+        self.users[2].delete()
+        self.assertEqual(self.store.rank('board', self.users[5].pk), 1)
+        self.assertEqual(self.store.count_above('board', 0), 4)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Blokady wierszy sprawdzamy na PostgreSQL")
+class LeaderboardConcurrencyTest(TransactionTestCase):
+    """Zapis wyniku w otwartej transakcji nie wstrzymuje zapisów innych graczy."""
+
+    def test_open_finish_does_not_block_other_players(self):
+        store = DatabaseLeaderboardStore()
+        first, second = (User.objects.create_user(f'gracz{i}', f'gracz{i}@test.com', 'password') for i in (1, 2))
+        holding, release = threading.Event(), threading.Event()
+
+        def finish_and_hold():
+            try:
+                # Jak record_quiz_result: blokady trzymane do zatwierdzenia transakcji
+                with transaction.atomic():
+                    store.submit(GLOBAL_BOARD, first.pk, 120)
+                    holding.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=finish_and_hold)
+        thread.start()
+        try:
+            self.assertTrue(holding.wait(10))
+            with connection.cursor() as cursor:
+                cursor.execute("SET lock_timeout = '2s'")
+            # Oczekiwanie na wiersz pierwszego gracza skończyłoby się błędem blokady
+            store.submit(GLOBAL_BOARD, second.pk, 4000)
+        finally:
+            release.set()
+            thread.join()
+            with connection.cursor() as cursor:
+                cursor.execute("SET lock_timeout = 0")
+        self.assertEqual(store.rank(GLOBAL_BOARD, second.pk), 1)
+        self.assertEqual(store.rank(GLOBAL_BOARD, first.pk), 2)
+
+
+class InMemoryLeaderboardStoreTest(LeaderboardStoreContract, TestCase):
+    def make_store(self):
+        return InMemoryLeaderboardStore()
+
+
+class LeaderboardAPITest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('champion', 'champion@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Quiz rankingowy", created_by=self.user, is_published=True)
+        question = Question.objects.create(quiz=self.quiz, text="Pytanie", order=1)
+        self.answer = Answer.objects.create(question=question, text="Dobra", is_correct=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_finished_attempt_updates_leaderboards(self):
+        self.client.post(reverse('quiz-attempts', args=[self.quiz.id]),
+                         {'answers': {self.answer.question_id: self.answer.id}}, format='json')
+
+        response = self.client.get(reverse('quiz-leaderboard', args=[self.quiz.id]))
+        self.assertEqual(response.data['results'][0]['username'], 'champion')
+        self.assertEqual(response.data['results'][0]['score'], 10)
+
+        response = self.client.get(reverse('leaderboard-me'))
+        self.assertEqual(response.data['rank'], 1)
+        self.assertEqual(response.data['results'][0]['score'], 10)
+
+
+class FakeOpenTDBHandler(BaseHTTPRequestHandler):
+    """Minimalna atrapa OpenTDB: pierwszy token jest od razu nieważny, kolejne działają."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            if url.path == '/api_token.php':
+                server.tokens_issued += 1
+                payload = {'response_code': 0, 'token': f'token-{server.tokens_issued}'}
+            else:
+                server.api_tokens.append(params.get('token'))
+                if params.get('token') == 'token-1':
+                    payload = {'response_code': 3, 'results': []}
+                else:
+                    payload = {'response_code': 0, 'results': [
+                        {'question': f'Pytanie &quot;{i}&quot;', 'correct_answer': 'Tak',
+                         'incorrect_answers': ['Nie', 'Może', 'Nie wiem']}
+                        for i in range(int(params['amount']))
+                    ]}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImportOpenTDBCommandTest(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenTDBHandler)
+        self.server.lock = threading.Lock()
+        self.server.tokens_issued = 0
+        self.server.api_tokens = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_imports_batches_concurrently_with_session_token(self):
+        base_url = f'http://127.0.0.1:{self.server.server_port}'
+        call_command('import_opentdb', categories='Historia,Filmy', amount=3, batches=2, workers=3,
+                     rate_limit=0, base_url=base_url, stdout=StringIO())
+
+        self.assertEqual(Quiz.objects.count(), 4)
+        self.assertEqual(Question.objects.count(), 12)
+        self.assertEqual(set(Quiz.objects.values_list('question_count', flat=True)), {3})
+        self.assertEqual(Answer.objects.filter(is_correct=True).count(), 12)
+        self.assertEqual(Answer.objects.count(), 48)
+        self.assertTrue(Question.objects.filter(text='Pytanie "0"').exists())
+        # Po odrzuceniu pierwszego tokenu wszystkie kolejne zapytania używają nowego
+        self.assertEqual(self.server.tokens_issued, 2)
+        self.assertEqual(self.server.api_tokens.count('token-2'), 4)
+
+
+class QuestionBankImportTest(TestCase):
+    """Testuje strumieniowy import banku pytań z plików JSONL i CSV."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('partner', 'partner@test.com', 'password')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def jsonl_quiz(self, i, correct=1):
+        answers = [{'text': 'Dobra', 'is_correct': True}] * correct + [{'text': 'Zła', 'is_correct': False}]
+        return json.dumps({'title': f'Bank {i}', 'questions': [{'text': f'Pytanie {i}', 'answers': answers}]})
+
+    def test_jsonl_import_skips_invalid_and_resumes_from_checkpoint(self):
+        lines = [self.jsonl_quiz(i) for i in range(5)] + [self.jsonl_quiz(99, correct=2), '{zły json']
+        path = self.write('bank.jsonl', '\n'.join(lines) + '\n')
+
+        stats = import_file(path, 'jsonl', self.author.pk, chunk_size=2, checkpoint_key='bank')
+        self.assertEqual((stats.imported, stats.skipped), (5, 2))
+        self.assertEqual(Quiz.objects.count(), 5)
+        self.assertEqual(Answer.objects.count(), 10)
+        self.assertEqual(ImportCheckpoint.objects.get(key='bank').offset, os.path.getsize(path))
+
+        # Ponowne uruchomienie wznawia od punktu kontrolnego i niczego nie dubluje
+        stats = import_file(path, 'jsonl', self.author.pk, chunk_size=2, checkpoint_key='bank')
+        self.assertEqual(stats.imported, 0)
+        self.assertEqual(Quiz.objects.count(), 5)
+
+    def test_jsonl_string_booleans_are_parsed(self):
+        def record(title, is_published, flags):
+            answers = [{'text': f'Odpowiedź {i}', 'is_correct': flag} for i, flag in enumerate(flags)]
+            return json.dumps({'title': title, 'is_published': is_published,
+                               'questions': [{'text': 'Pytanie', 'answers': answers}]})
+
+        path = self.write('strings.jsonl', '\n'.join([
+            record('Tekstowe', 'false', ['false', 'True', '0']),
+            record('Opublikowany', 'tak', [False, True]),
+            record('Liczby', False, [0, 1]),
+            record('Nieznane', 'może', [False, True]),
+        ]) + '\n')
+        stats = import_file(path, 'jsonl', self.author.pk, chunk_size=10, checkpoint_key='strings')
+
+        self.assertEqual((stats.imported, stats.skipped), (2, 2))
+        self.assertEqual(dict(Quiz.objects.values_list('title', 'is_published')), {'Tekstowe': False, 'Opublikowany': True})
+        self.assertEqual(list(Answer.objects.filter(question__quiz__title='Tekstowe', is_correct=True)
+                              .values_list('text', flat=True)), ['Odpowiedź 1'])
+        self.assertIn('is_correct w pytaniu 1', stats.errors[0])
+        self.assertIn('is_published', stats.errors[1])
+
+    def test_restart_clears_only_its_own_checkpoints(self):
+        path = self.write('bank.jsonl', self.jsonl_quiz(1) + '\n')
+        for key in ('bank', 'bank#0', 'bank#512', 'bank-2', 'bank-2#0'):
+            ImportCheckpoint.objects.create(key=key, offset=os.path.getsize(path))
+
+        call_command('import_question_bank', path, checkpoint_key='bank', restart=True, stdout=StringIO())
+        self.assertEqual(Quiz.objects.count(), 1)
+        self.assertEqual(sorted(ImportCheckpoint.objects.values_list('key', flat=True)), ['bank', 'bank-2', 'bank-2#0'])
+        self.assertEqual(ImportCheckpoint.objects.get(key='bank-2').offset, os.path.getsize(path))
+
+    def test_split_ranges_cover_every_record_once(self):
+        path = self.write('bank.jsonl', '\n'.join(self.jsonl_quiz(i) for i in range(10)) + '\n')
+        ranges = split_ranges(path, 3)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(path))
+        for start, end in ranges:
+            import_file(path, 'jsonl', self.author.pk, chunk_size=3, checkpoint_key=f'part#{start}', start=start, end=end)
+        self.assertEqual(sorted(Quiz.objects.values_list('title', flat=True)), sorted(f'Bank {i}' for i in range(10)))
+
+    def test_csv_rows_are_grouped_into_quizzes(self):
+        path = self.write('bank.csv', (
+            'quiz_key,title,description,category,question_order,question,answer,is_correct\n'
+            'a,Stolice,,Geografia,1,Stolica Polski?,Warszawa,1\n'
+            'a,Stolice,,Geografia,1,Stolica Polski?,Kraków,0\n'
+            'a,Stolice,,Geografia,2,Stolica Czech?,Praga,true\n'
+            'a,Stolice,,Geografia,2,Stolica Czech?,Brno,false\n'
+            'b,Błędny,,,1,"Pytanie, bez poprawnej",Nie,0\n'
+        ))
+        stats = import_file(path, 'csv', self.author.pk, chunk_size=10, checkpoint_key='csv')
+        self.assertEqual((stats.imported, stats.skipped), (1, 1))
+        quiz = Quiz.objects.get(title='Stolice')
+        self.assertEqual(list(quiz.questions.values_list('order', flat=True)), [1, 2])
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz, is_correct=True).count(), 2)
+
+
+class QuizNestedWriteTest(APITestCase):
+    """Testuje zagnieżdżony zapis quizu stałą liczbą zapytań."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', 'author@test.com', 'password')
+        self.client.force_authenticate(user=self.user)
+        # Kategoria już istnieje - pierwszy zapis nie płaci za jej utworzenie
+        Category.objects.create(name='Test')
+
+    def payload(self, questions_count):
+        return {
+            'title': f'Quiz {questions_count}', 'description': '', 'category': 'Test', 'is_published': True,
+            'questions': [
+                {'text': f'Pytanie {i}', 'order': i, 'answers': [
+                    {'text': 'Dobra', 'is_correct': True}, {'text': 'Zła', 'is_correct': False},
+                ]}
+                for i in range(1, questions_count + 1)
+            ],
+        }
+
+    def create_quiz(self, questions_count):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('quiz-list'), self.payload(questions_count), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Quiz.objects.get(pk=response.data['id']), len(ctx)
+
+    def test_create_query_budget_does_not_depend_on_size(self):
+        _, small = self.create_quiz(2)
+        quiz, large = self.create_quiz(40)
+        self.assertEqual(small, large)
+        self.assertEqual(quiz.questions.count(), 40)
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz).count(), 80)
+
+    def edit_payload(self, quiz):
+        """Zmienia pierwsze pytanie, usuwa drugie, dodaje nowe; w pozostałych zmienia jedną odpowiedź."""
+        questions = list(quiz.questions.prefetch_related('answers'))
+        data = {'title': quiz.title, 'description': '', 'category': 'Test', 'is_published': True, 'questions': []}
+        for index, question in enumerate(questions):
+            if index == 1:
+                continue
+            answers = [{'id': a.id, 'text': a.text, 'is_correct': a.is_correct} for a in question.answers.all()]
+            answers[1]['text'] = 'Zmieniona'
+            data['questions'].append({'id': question.id, 'text': question.text if index else 'Nowa treść',
+                                      'order': question.order, 'answers': answers})
+        data['questions'].append({'text': 'Dodane', 'order': 99, 'answers': [{'text': 'Tak', 'is_correct': True}]})
+        return data
+
+    def update_quiz(self, quiz):
+        data = self.edit_payload(quiz)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(reverse('quiz-detail', args=[quiz.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return len(ctx)
+
+    def test_nested_update_applies_diff(self):
+        quiz, _ = self.create_quiz(3)
+        self.update_quiz(quiz)
+        texts = list(quiz.questions.order_by('order').values_list('text', flat=True))
+        self.assertEqual(texts, ['Nowa treść', 'Pytanie 3', 'Dodane'])
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz, text='Zmieniona').count(), 2)
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz).count(), 5)
+
+    def test_update_query_budget_does_not_depend_on_size(self):
+        small_quiz, _ = self.create_quiz(3)
+        large_quiz, _ = self.create_quiz(40)
+        self.assertEqual(self.update_quiz(small_quiz), self.update_quiz(large_quiz))
+
+    def test_foreign_question_id_is_rejected(self):
+        quiz, _ = self.create_quiz(1)
+        other, _ = self.create_quiz(1)
+        data = self.edit_payload(quiz)
+        data['questions'][0]['id'] = other.questions.get().id
+        response = self.client.put(reverse('quiz-detail', args=[quiz.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(quiz.questions.count(), 1)
+
+    def test_only_author_can_edit(self):
+        quiz, _ = self.create_quiz(1)
+        self.client.force_authenticate(user=User.objects.create_user('intruder', 'intruder@test.com', 'password'))
+        response = self.client.patch(reverse('quiz-detail', args=[quiz.id]), {'title': 'Przejęty'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(LUMEN_EXPORT_SETTLE_SECONDS=0)
+class ResultExportTest(APITestCase):
+    """Testuje strumieniowy eksport wyników do JSONL/CSV."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('analyst', 'analyst@test.com', 'password')
+        self.player = User.objects.create_user('gracz', 'gracz@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Eksportowany", created_by=self.admin)
+        self.results = [QuizResult.objects.create(user=self.player, quiz=self.quiz, score=score) for score in (10, 20, 30)]
+
+    def stream(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_jsonl_export_is_incremental(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('result_export'))
+        rows = [json.loads(line) for line in self.stream(response).splitlines()]
+        self.assertEqual([row['score'] for row in rows], [10, 20, 30])
+        self.assertEqual(rows[0]['username'], 'gracz')
+
+        last = rows[0]
+        response = self.client.get(reverse('result_export'), {'since': last['completed_at'], 'since_id': last['id']})
+        self.assertEqual([json.loads(line)['score'] for line in self.stream(response).splitlines()], [20, 30])
+
+    def test_csv_export_and_permissions(self):
+        self.client.force_authenticate(user=self.player)
+        self.assertEqual(self.client.get(reverse('result_export')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('result_export'), {'output': 'csv'})
+        lines = self.stream(response).splitlines()
+        self.assertEqual(lines[0], 'id,user_id,username,quiz_id,quiz_title,score,completed_at')
+        self.assertEqual(len(lines), 4)
+
+    def test_command_ships_only_the_delta_with_state_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = os.path.join(tmpdir, 'state.json')
+            out = StringIO()
+            call_command('export_results', state_file=state, stdout=out)
+            self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+            QuizResult.objects.create(user=self.player, quiz=self.quiz, score=40)
+            out = StringIO()
+            call_command('export_results', state_file=state, stdout=out)
+            self.assertEqual([json.loads(line)['score'] for line in out.getvalue().splitlines()], [40])
+
+    def export_scores(self, state):
+        out = StringIO()
+        call_command('export_results', state_file=state, stdout=out)
+        return [json.loads(line)['score'] for line in out.getvalue().splitlines()]
+
+    def test_late_commit_with_earlier_timestamp_is_exported(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = os.path.join(tmpdir, 'state.json')
+            self.assertEqual(self.export_scores(state), [10, 20, 30])
+
+            # Transakcja zaczęta przed poprzednim eksportem, zatwierdzona po nim
+            late = QuizResult.objects.create(user=self.player, quiz=self.quiz, score=40)
+            QuizResult.objects.filter(pk=late.pk).update(completed_at=self.results[0].completed_at - timedelta(minutes=1))
+            self.assertEqual(self.export_scores(state), [40])
+
+    @override_settings(LUMEN_EXPORT_SETTLE_SECONDS=60)
+    def test_export_stops_at_results_that_may_be_uncommitted(self):
+        old = timezone.now() - timedelta(minutes=5)
+        QuizResult.objects.filter(pk__in=[self.results[0].pk, self.results[2].pk]).update(completed_at=old)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            state = os.path.join(tmpdir, 'state.json')
+            # Wynik 30 jest starszy, ale stoi za świeżym 20 - kursor nie może go przeskoczyć
+            self.assertEqual(self.export_scores(state), [10])
+
+            QuizResult.objects.filter(pk=self.results[1].pk).update(completed_at=old)
+            self.assertEqual(self.export_scores(state), [20, 30])
+
+
+class QueryPlanTest(TestCase):
+    """
+    Regresja planów zapytań: każde zapytanie z gorącej ścieżki musi korzystać z indeksu.
+    Na SQLite zabronione są pełne skany tabeli i sortowanie w pamięci, na PostgreSQL - Seq Scan.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('planner', 'planner@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Plan", created_by=self.user, is_published=True)
+        self.now = timezone.now()
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET enable_seqscan')
+        if connection.vendor == 'sqlite':
+            return queryset.explain()
+        self.skipTest(f"Brak reguł planu dla bazy {connection.vendor}")
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        plan = self.plan(queryset)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+        else:
+            self.assertIsNone(re.search(r'SCAN \S+$', plan, re.MULTILINE), plan)
+            self.assertNotIn('USE TEMP B-TREE', plan)
+        if index_name:
+            self.assertIn(index_name, plan)
+
+    def test_previous_attempts_count(self):
+        self.assertUsesIndex(QuizResult.objects.filter(user=self.user, quiz=self.quiz), 'result_user_quiz_idx')
+
+    def test_profile_history(self):
+        queryset = QuizResult.objects.filter(user=self.user).order_by('-completed_at', 'pk')[:20]
+        self.assertUsesIndex(queryset, 'result_user_history_idx')
+
+    def test_question_lookup_and_order(self):
+        self.assertUsesIndex(Question.objects.filter(quiz=self.quiz, order=1))
+        self.assertUsesIndex(Question.objects.filter(quiz_id__in=[self.quiz.pk]).order_by('order', 'id'))
+
+    def test_published_keyset_list(self):
+        queryset = Quiz.objects.filter(is_published=True).order_by('-created_at', 'pk')
+        self.assertUsesIndex(queryset[:21], 'quiz_published_keyset_idx')
+        after_cursor = queryset.filter(Q(created_at__lt=self.now) | Q(created_at=self.now, pk__gt=1))
+        self.assertUsesIndex(after_cursor[:21], 'quiz_published_keyset_idx')
+
+    def test_leaderboard_top(self):
+        queryset = LeaderboardEntry.objects.filter(board=GLOBAL_BOARD).order_by('-score', 'user_id')[:10]
+        self.assertUsesIndex(queryset, 'leaderboard_rank_idx')
+
+    def test_leaderboard_rank_nodes_and_ties(self):
+        self.assertUsesIndex(LeaderboardRankNode.objects.filter(board=GLOBAL_BOARD, node__in=[1, 2, 4, 2 ** 31]))
+        self.assertUsesIndex(LeaderboardEntry.objects.filter(board=GLOBAL_BOARD, score=10, user_id__lt=5),
+                             'leaderboard_rank_idx')
+
+    def test_results_export_delta(self):
+        self.assertUsesIndex(QuizResult.objects.filter(id__gt=1).order_by('id'))
+
+    def test_answers_by_question(self):
+        self.assertUsesIndex(Answer.objects.filter(question_id__in=[1, 2]))
+
+
+class QuestionOrderTest(APITestCase):
+    """Kolejność pytań jest unikalna w quizie, a zamiana pozycji nie narusza ograniczenia."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', 'author@test.com', 'password')
+        self.client.force_authenticate(user=self.user)
+        self.quiz = Quiz.objects.create(title="Kolejność", created_by=self.user)
+        for order in (1, 2):
+            question = Question.objects.create(quiz=self.quiz, text=f"Pytanie {order}", order=order)
+            Answer.objects.create(question=question, text="Tak", is_correct=True)
+
+    def payload(self, questions):
+        return {'title': self.quiz.title, 'description': '', 'category': '', 'questions': questions}
+
+    def question_data(self, question, order):
+        answers = [{'id': a.id, 'text': a.text, 'is_correct': a.is_correct} for a in question.answers.all()]
+        return {'id': question.id, 'text': question.text, 'order': order, 'answers': answers}
+
+    def test_swapping_orders_via_api(self):
+        first, second = self.quiz.questions.order_by('order')
+        data = self.payload([self.question_data(first, 2), self.question_data(second, 1)])
+        response = self.client.put(reverse('quiz-detail', args=[self.quiz.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        texts = list(self.quiz.questions.order_by('order').values_list('text', flat=True))
+        self.assertEqual(texts, ['Pytanie 2', 'Pytanie 1'])
+
+    def test_duplicate_orders_are_rejected(self):
+        first, second = self.quiz.questions.order_by('order')
+        data = self.payload([self.question_data(first, 1), self.question_data(second, 1)])
+        response = self.client.put(reverse('quiz-detail', args=[self.quiz.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_missing_order_follows_list_position(self):
+        data = self.payload([
+            {'text': f'Nowe {i}', 'answers': [{'text': 'Tak', 'is_correct': True}]} for i in (1, 2, 3)
+        ])
+        response = self.client.post(reverse('quiz-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        quiz = Quiz.objects.get(pk=response.data['id'])
+        self.assertEqual(list(quiz.questions.values_list('order', flat=True)), [1, 2, 3])
+
+    def test_admin_swaps_orders_and_appends_new_question(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.client.force_login(admin_user)
+        first, second = self.quiz.questions.order_by('order')
+        data = {
+            'title': self.quiz.title, 'description': '', 'category': '', 'is_published': '',
+            'questions-TOTAL_FORMS': '3', 'questions-INITIAL_FORMS': '2',
+            'questions-MIN_NUM_FORMS': '0', 'questions-MAX_NUM_FORMS': '1000',
+        }
+        rows = [(first, 2), (second, 1), (None, 0)]
+        for index, (question, order) in enumerate(rows):
+            prefix = f'questions-{index}-'
+            data.update({prefix + 'text': question.text if question else 'Dodane', prefix + 'order': str(order),
+                         prefix + 'time_limit': '30', prefix + 'quiz': str(self.quiz.id)})
+            if question:
+                data[prefix + 'id'] = str(question.id)
+        response = self.client.post(reverse('admin:Lumen_quiz_change', args=[self.quiz.id]), data)
+        self.assertEqual(response.status_code, 302)
+        orders = dict(self.quiz.questions.values_list('text', 'order'))
+        self.assertEqual(orders, {'Pytanie 1': 2, 'Pytanie 2': 1, 'Dodane': 3})
+
+
+class BenchmarkSuiteTest(TestCase):
+    """Generator danych i runner benchmarków działają na małym zestawie."""
+
+    def test_seed_and_run(self):
+        from benchmarks.endpoints import run_benchmarks
+
+        call_command('seed_benchmark_data', users=3, quizzes=4, questions=2, answers=3, results=10, stdout=StringIO())
+        self.assertEqual(Quiz.objects.count(), 4)
+        self.assertEqual(Answer.objects.filter(is_correct=True).count(), 8)
+        self.assertEqual(QuizResult.objects.count(), 10)
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', stdout=StringIO())
+
+        report = run_benchmarks(iterations=2, warmup=0, alloc_iterations=1)
+        self.assertEqual(set(report['scenarios']), {
+            'quiz_list', 'quiz_detail', 'play_and_finish', 'profile',
+            'anon_quiz_list_cold', 'anon_quiz_list', 'anon_quiz_detail_cold', 'anon_quiz_detail',
+            'api_quiz_list', 'api_quiz_retrieve', 'api_quiz_create',
+        })
+        # Trafienie w cache fragmentu nie odpytuje bazy
+        self.assertEqual(report['scenarios']['anon_quiz_list']['queries']['max'], 0)
+        self.assertGreater(report['scenarios']['anon_quiz_list_cold']['queries']['mean'], 0)
+        self.assertGreater(report['scenarios']['play_and_finish']['queries']['mean'], 0)
+        json.dumps(report)
+        # Zapisy benchmarku są wycofywane
+        self.assertEqual(QuizResult.objects.count(), 10)
+        self.assertEqual(Quiz.objects.count(), 4)
+
+    def test_seed_leaves_existing_aggregates_alone(self):
+        player = User.objects.create_user('gracz', 'gracz@test.com', 'password')
+        quiz = Quiz.objects.create(title='Prawdziwy', category=Category.objects.create(name='Historia'),
+                                   is_published=True, created_by=player)
+        # Celowo rozbieżne z historią - pełne przeliczenie by je nadpisało
+        Quiz.objects.filter(pk=quiz.pk).update(attempt_count=5)
+        PlayerStats.objects.create(user=player, attempts=7, total_score=70)
+        store = DatabaseLeaderboardStore()
+        store.submit(GLOBAL_BOARD, player.pk, 999)
+
+        call_command('seed_benchmark_data', users=3, quizzes=4, questions=2, answers=3, results=10, stdout=StringIO())
+
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).attempt_count, 5)
+        self.assertEqual(PlayerStats.objects.get(user=player).attempts, 7)
+        self.assertEqual(store.top(GLOBAL_BOARD, 1)[0].user_id, player.pk)
+        self.assertEqual(Category.objects.get(name='Historia').quiz_count, 1)
+
+        seeded = Quiz.objects.exclude(pk=quiz.pk)
+        self.assertEqual(sum(seeded.values_list('attempt_count', flat=True)), 10)
+        self.assertEqual(sum(PlayerStats.objects.exclude(user=player).values_list('attempts', flat=True)), 10)
+        self.assertEqual(sum(Category.objects.exclude(name='Historia').values_list('published_count', flat=True)), 4)
+        self.assertEqual(QuizSearchDocument.objects.filter(quiz__in=seeded).count(), 4)
+        self.assertEqual(LeaderboardEntry.objects.filter(board=GLOBAL_BOARD).count(), 4)
+
+
+class RequestProfilingMiddlewareTest(TestCase):
+    """Middleware profilujące: nagłówek Server-Timing, wykrywanie N+1 i log wolnych żądań."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('gracz', 'gracz@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Profilowany", created_by=self.user, is_published=True)
+        for score in (10, 20, 30):
+            QuizResult.objects.create(user=self.user, quiz=self.quiz, score=score)
+        self.client.login(username='gracz', password='password')
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('quiz_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(LUMEN_PROFILING=True, LUMEN_PROFILING_BUDGET_MS=60_000, LUMEN_PROFILING_QUERY_BUDGET=1000)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('quiz_list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+')
+        self.assertIn('total;dur=', timing)
+
+    @override_settings(LUMEN_PROFILING=True, LUMEN_PROFILING_QUERY_BUDGET=0, LUMEN_PROFILING_SAMPLE_RATE=1.0)
+    def test_over_budget_request_is_logged_with_query_sample(self):
+        with self.assertLogs('lumen.profiling', level='WARNING') as logs:
+            response = self.client.get(reverse('user_profile'))
+        self.assertEqual(response.status_code, 200)
+        record = logs.records[0].profiling
+        self.assertEqual(record['path'], reverse('user_profile'))
+        self.assertEqual(record['queries'], len(record['query_log']))
+        self.assertIn('duplicates', record)
+
+    def test_duplicated_queries_are_grouped_by_signature(self):
+        profile = RequestProfile()
+        execute = lambda sql, params, many, context: None
+        for sql in ('SELECT title FROM quiz WHERE id = %s',) * 3 + (
+                'SELECT * FROM answer WHERE id IN (%s, %s)', 'SELECT * FROM answer WHERE id IN (%s)'):
+            profile(execute, sql, (), False, {})
+        self.assertEqual(profile.duplicates(), [
+            ('SELECT title FROM quiz WHERE id = %s', 3),
+            ('SELECT * FROM answer WHERE id IN (...)', 2),
+        ])
+
+
+class QuizCountersTest(APITestCase):
+    """Zdenormalizowane liczniki pytań i podejść pozostają zgodne z danymi na każdej ścieżce zapisu."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', 'author@test.com', 'password')
+        self.client.force_authenticate(user=self.user)
+
+    def create_via_api(self, questions_count):
+        data = {'title': 'Liczony', 'description': '', 'category': '', 'is_published': True, 'questions': [
+            {'text': f'Pytanie {i}', 'answers': [{'text': 'Tak', 'is_correct': True}]}
+            for i in range(questions_count)
+        ]}
+        response = self.client.post(reverse('quiz-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return Quiz.objects.get(pk=response.data['id'])
+
+    def assertCountersMatch(self, quiz):
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.question_count, quiz.questions.count())
+        self.assertEqual(quiz.attempt_count, QuizResult.objects.filter(quiz=quiz).count())
+
+    def test_api_create_and_update(self):
+        quiz = self.create_via_api(3)
+        self.assertEqual(quiz.question_count, 3)
+
+        kept = quiz.questions.order_by('order').first()
+        data = {'title': 'Liczony', 'description': '', 'category': '', 'questions': [
+            {'id': kept.id, 'text': kept.text, 'order': 1, 'answers': [
+                {'id': a.id, 'text': a.text, 'is_correct': a.is_correct} for a in kept.answers.all()]},
+            {'text': 'Nowe', 'order': 2, 'answers': [{'text': 'Tak', 'is_correct': True}]},
+        ]}
+        response = self.client.put(reverse('quiz-detail', args=[quiz.id]), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['question_count'], 2)
+        self.assertCountersMatch(quiz)
+
+    def test_single_saves_deletes_and_admin_bulk_delete(self):
+        quiz = Quiz.objects.create(title="Ręczny", created_by=self.user)
+        questions = [Question.objects.create(quiz=quiz, text=f"P{i}", order=i) for i in range(1, 5)]
+        self.assertCountersMatch(quiz)
+        questions[0].delete()
+        self.assertCountersMatch(quiz)
+
+        request = RequestFactory().post('/')
+        QuestionAdmin(Question, AdminSite()).delete_queryset(request, Question.objects.filter(pk__in=[
+            questions[1].pk, questions[2].pk]))
+        self.assertCountersMatch(quiz)
+        self.assertEqual(quiz.question_count, 1)
+
+    def test_attempts_are_counted_and_save_does_not_overwrite_counters(self):
+        quiz = self.create_via_api(1)
+        stale = Quiz.objects.get(pk=quiz.pk)
+        record_quiz_result(self.user, quiz.pk, 10)
+        record_quiz_result(self.user, quiz.pk, 10)
+        stale.title = 'Zmieniony'
+        stale.save()
+        self.assertCountersMatch(quiz)
+        self.assertEqual(quiz.attempt_count, 2)
+
+    def test_quiz_detail_reads_stored_count(self):
+        quiz = self.create_via_api(2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('quiz_detail', args=[quiz.id]))
+        self.assertContains(response, 'Liczba pytań:</strong> 2')
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in ctx.captured_queries))
+
+    def test_reconcile_command_fixes_drift(self):
+        quiz = self.create_via_api(2)
+        QuizResult.objects.create(user=self.user, quiz=quiz, score=5)
+        Quiz.objects.filter(pk=quiz.pk).update(question_count=7)
+
+        out = StringIO()
+        call_command('reconcile_quiz_counters', dry_run=True, stdout=out)
+        self.assertIn(f'Quiz {quiz.pk}: pytania 7 -> 2, podejścia 0 -> 1', out.getvalue())
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.question_count, 7)
+
+        call_command('reconcile_quiz_counters', stdout=StringIO())
+        self.assertCountersMatch(quiz)
+
+
+class QuizConditionalGetTest(APITestCase):
+    """ETag/Last-Modified i cache gotowych odpowiedzi JSON dla API quizów."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@test.com', 'password')
+        self.staff = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Warunkowy", created_by=self.author, is_published=True)
+        question = Question.objects.create(quiz=self.quiz, text="Pytanie", order=1)
+        self.answer = Answer.objects.create(question=question, text="Tak", is_correct=True)
+        self.url = reverse('quiz-detail', args=[self.quiz.id])
+
+    def test_second_request_is_served_from_cache_and_revalidates_to_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('Last-Modified', first)
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url)
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+            since = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+        self.assertEqual(since.status_code, 304)
+
+    def test_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.answer.text = "Oczywiście"
+        self.answer.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Oczywiście', response.content.decode())
+
+    def test_gzip_variant(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+
+    def test_staff_and_public_views_are_cached_separately(self):
+        public = self.client.get(self.url)
+        self.client.force_authenticate(user=self.staff)
+        staff = self.client.get(self.url)
+        self.assertNotEqual(public['ETag'], staff['ETag'])
+        self.assertNotIn('is_correct', json.loads(public.content)['questions'][0]['answers'][0])
+        self.assertTrue(json.loads(staff.content)['questions'][0]['answers'][0]['is_correct'])
+
+    def test_missing_quiz_returns_404(self):
+        self.assertEqual(self.client.get(reverse('quiz-detail', args=[999])).status_code, 404)
+
+    def test_list_etag_changes_with_page_contents(self):
+        url = reverse('quiz-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.quiz.title = "Nowy tytuł"
+        self.quiz.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['title'], "Nowy tytuł")
+
+
+class QuizPageCacheTest(APITestCase):
+    """Cache fragmentów listy i szczegółów quizów oraz ich unieważnianie na każdej ścieżce zapisu."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@test.com', 'password')
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Widoczny", created_by=self.author, is_published=True)
+        self.draft = Quiz.objects.create(title="Szkic", created_by=self.author, is_published=False)
+        self.list_url = reverse('quiz_list')
+
+    def admin_action(self, action, *quizzes):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('admin:Lumen_quiz_changelist'),
+                         {'action': action, '_selected_action': [quiz.pk for quiz in quizzes]})
+        self.client.logout()
+
+    def test_cache_hit_skips_database(self):
+        self.client.get(self.list_url)
+        self.client.get(reverse('quiz_detail', args=[self.quiz.id]))
+        with CaptureQueriesContext(connection) as ctx:
+            listing = self.client.get(self.list_url)
+            detail = self.client.get(reverse('quiz_detail', args=[self.quiz.id]))
+        self.assertEqual(len(ctx), 0)
+        self.assertContains(listing, "Widoczny")
+        self.assertNotContains(listing, "Szkic")
+        self.assertContains(detail, "Autor:</strong> author")
+
+    def test_superuser_list_bypasses_shared_cache(self):
+        self.client.get(self.list_url)
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(self.list_url), "Szkic")
+        self.client.logout()
+        self.assertNotContains(self.client.get(self.list_url), "Szkic")
+
+    def test_publish_and_unpublish_actions_invalidate_list(self):
+        self.client.get(self.list_url)
+        self.admin_action('publish_quizzes', self.draft)
+        self.assertContains(self.client.get(self.list_url), "Szkic")
+        self.admin_action('unpublish_quizzes', self.quiz)
+        self.assertNotContains(self.client.get(self.list_url), "Widoczny")
+
+    def test_api_update_invalidates_list_and_detail(self):
+        detail_url = reverse('quiz_detail', args=[self.quiz.id])
+        self.client.get(self.list_url)
+        self.client.get(detail_url)
+        self.client.force_authenticate(user=self.author)
+        response = self.client.patch(reverse('quiz-detail', args=[self.quiz.id]), {'title': 'Po zmianie'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+        self.assertContains(self.client.get(self.list_url), "Po zmianie")
+        self.assertContains(self.client.get(detail_url), "Po zmianie")
+
+    def test_bulk_import_invalidates_list(self):
+        self.client.get(self.list_url)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.jsonl')
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(json.dumps({'title': 'Z importu', 'is_published': True, 'questions': [
+                    {'text': 'Pytanie', 'answers': [{'text': 'Tak', 'is_correct': True}, {'text': 'Nie', 'is_correct': False}]},
+                ]}) + '\n')
+            import_file(path, 'jsonl', self.author.pk, chunk_size=10, checkpoint_key='page-cache')
+        self.assertContains(self.client.get(self.list_url), "Z importu")
+
+    def test_missing_quiz_is_not_cached(self):
+        url = reverse('quiz_detail', args=[999])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class QuizAttemptStateTest(TestCase):
+    """Stan podejścia w cache: odporność na ponowne wysłanie odpowiedzi i jednorazowy zapis na końcu."""
+
+    def setUp(self):
+        # Identyfikatory wracają po wycofaniu transakcji testu - podejścia z cache nie mogą przeciekać
+        cache.clear()
+        self.user = User.objects.create_user('player', 'player@test.com', 'password')
+        self.quiz = Quiz.objects.create(title="Podejście", created_by=self.user, is_published=True)
+        self.correct, self.wrong = [], []
+        for order in (1, 2, 3):
+            question = Question.objects.create(quiz=self.quiz, text=f"Pytanie {order}", order=order)
+            self.correct.append(Answer.objects.create(question=question, text="Dobra", is_correct=True))
+            self.wrong.append(Answer.objects.create(question=question, text="Zła", is_correct=False))
+        self.client.login(username='player', password='password')
+
+    def answer(self, order, answer):
+        return self.client.post(reverse('play_quiz_view', args=[self.quiz.id, order]), {'answer': answer.id})
+
+    def finish(self):
+        return self.client.get(reverse('finish_quiz_view', args=[self.quiz.id]))
+
+    def test_repeated_answer_is_not_scored_again(self):
+        self.answer(1, self.correct[0])
+        for _ in range(3):
+            self.answer(1, self.correct[0])
+        # Zmiana zdania po poznaniu poprawnej odpowiedzi też nic nie daje
+        self.answer(2, self.wrong[1])
+        self.assertContains(self.answer(2, self.correct[1]), 'incorrect-answer')
+
+        attempt = get_attempt(self.user.id, self.quiz.id)
+        self.assertEqual((attempt.score, attempt.position), (10, 3))
+
+        self.finish()
+        result = QuizResult.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual(result.score, 10)
+        self.assertEqual(sorted(result.answers.values_list('answer_id', flat=True)),
+                         [self.correct[0].id, self.wrong[1].id])
+
+    def test_finish_survives_answers_deleted_mid_attempt(self):
+        for order in (1, 2, 3):
+            self.answer(order, self.correct[order - 1])
+        # Zmiany w quizie po udzieleniu odpowiedzi, a przed zakończeniem podejścia
+        self.correct[0].delete()
+        Question.objects.filter(quiz=self.quiz, order=2).delete()
+
+        self.assertRedirects(self.finish(), reverse('user_profile'), fetch_redirect_response=False)
+        result = QuizResult.objects.get(user=self.user, quiz=self.quiz)
+        self.assertEqual(result.score, 30)
+        self.assertEqual(sorted(result.answers.values_list('question__order', 'answer_id', 'is_correct')),
+                         [(1, None, True), (3, self.correct[2].id, True)])
+        self.assertIsNone(get_attempt(self.user.id, self.quiz.id))
+
+    def test_start_resumes_where_the_player_left_off(self):
+        start = reverse('start_quiz_view', args=[self.quiz.id])
+        play = lambda order: reverse('play_quiz_view', args=[self.quiz.id, order])
+        self.assertRedirects(self.client.get(start), play(1), fetch_redirect_response=False)
+
+        # Pominięte pytanie 2: wznawiamy od następnego bez odpowiedzi, potem wracamy do pominiętego
+        self.answer(1, self.correct[0])
+        self.answer(3, self.correct[2])
+        self.assertEqual(get_attempt(self.user.id, self.quiz.id).position, 2)
+        self.assertRedirects(self.client.get(start), play(2), fetch_redirect_response=False)
+
+        # Komplet odpowiedzi - ostatnie pytanie, z przyciskiem zakończenia
+        self.answer(2, self.correct[1])
+        self.assertRedirects(self.client.get(start), play(3), fetch_redirect_response=False)
+        self.assertContains(self.client.get(reverse('quiz_detail', args=[self.quiz.id])), start)
+
+    def test_resume_survives_quiz_edits(self):
+        self.answer(1, self.correct[0])
+        Question.objects.filter(quiz=self.quiz, order=2).delete()
+        start = reverse('start_quiz_view', args=[self.quiz.id])
+        self.assertRedirects(self.client.get(start), reverse('play_quiz_view', args=[self.quiz.id, 3]),
+                             fetch_redirect_response=False)
+
+    def test_answering_does_not_write_session(self):
+        self.client.get(reverse('play_quiz_view', args=[self.quiz.id, 1]))
+        with CaptureQueriesContext(connection) as ctx:
+            self.answer(1, self.correct[0])
+            self.answer(2, self.correct[1])
+        self.assertFalse([q['sql'] for q in ctx.captured_queries
+                          if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')])
+
+    def test_finish_persists_answers_in_one_insert_and_only_once(self):
+        for order, answer in enumerate(self.correct, start=1):
+            self.answer(order, answer)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertRedirects(self.finish(), reverse('user_profile'), fetch_redirect_response=False)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "Lumen_attemptanswer"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AttemptAnswer.objects.filter(result__user=self.user, is_correct=True).count(), 3)
+
+        # Odświeżenie strony końcowej nie zapisuje drugiego wyniku
+        self.assertRedirects(self.finish(), reverse('quiz_detail', args=[self.quiz.id]), fetch_redirect_response=False)
+        self.assertEqual(QuizResult.objects.filter(user=self.user).count(), 1)
+        self.assertIsNone(get_attempt(self.user.id, self.quiz.id))
+
+    def test_file_based_cache_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'attempts': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            },
+            LUMEN_ATTEMPT_CACHE='attempts',
+        ):
+            self.answer(1, self.correct[0])
+            self.assertTrue(os.listdir(location))
+            self.assertEqual(get_attempt(self.user.id, self.quiz.id).score, 10)
+            self.finish()
+        self.assertEqual(QuizResult.objects.get(user=self.user).score, 10)
+
+    async def test_async_views_under_asgi(self):
+        # AsyncClient przechodzi przez ASGIHandler - synchroniczne zapytanie w pętli zdarzeń
+        # skończyłoby się SynchronousOnlyOperation
+        await self.async_client.aforce_login(self.user)
+        play = reverse('play_quiz_view', args=[self.quiz.id, 1])
+        response = await self.async_client.get(play)
+        self.assertContains(response, 'Pytanie 1')
+        await self.async_client.post(play, {'answer': self.correct[0].id})
+        response = await self.async_client.post(play, {'answer': self.wrong[0].id})
+        self.assertContains(response, 'Mój profil')
+
+        response = await self.async_client.get(reverse('finish_quiz_view', args=[self.quiz.id]))
+        self.assertRedirects(response, reverse('user_profile'), fetch_redirect_response=False)
+        result = await QuizResult.objects.aget(user=self.user, quiz=self.quiz)
+        self.assertEqual(result.score, 10)
+        self.assertEqual(await result.answers.acount(), 1)
+
+        anonymous = await self.async_client.__class__().get(play)
+        self.assertEqual(anonymous.status_code, 302)
+
+
+class QuizSearchTest(APITestCase):
+    """Wyszukiwanie pełnotekstowe: przyrostowe odświeżanie dokumentów, ranking, widoczność i panel admina."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@test.com', 'password')
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.url = reverse('quiz-search')
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fauna = self.create_quiz('Żółwie morskie', [('Ile lat żyje żółw?', 'Sto')])
+            self.capitals = self.create_quiz('Stolice Europy', [('Co żyje w Wiśle? Żółw błotny', 'Tak')],
+                                             category='Geografia')
+            self.draft = self.create_quiz('Szkic o żółwiach', [('Pytanie', 'Tak')], is_published=False)
+        self.client.force_authenticate(user=None)
+
+    def create_quiz(self, title, questions, category='', is_published=True):
+        payload = {
+            'title': title, 'description': '', 'category': category, 'is_published': is_published,
+            'questions': [
+                {'text': text, 'answers': [{'text': answer, 'is_correct': True}, {'text': 'Nie', 'is_correct': False}]}
+                for text, answer in questions
+            ],
+        }
+        response = self.client.post(reverse('quiz-list'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Quiz.objects.get(pk=response.data['id'])
+
+    def search(self, query, **params):
+        return self.client.get(self.url, {'q': query, **params})
+
+    def titles(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in response.data['results']]
+
+    def test_title_match_ranks_above_question_match(self):
+        self.assertEqual(self.titles(self.search('żółw')), ['Żółwie morskie', 'Stolice Europy'])
+        # Bez polskich znaków i z dopasowaniem prefiksu
+        self.assertEqual(self.titles(self.search('wisle')), ['Stolice Europy'])
+        self.assertEqual(self.titles(self.search('geograf')), ['Stolice Europy'])
+        self.assertEqual(self.titles(self.search('nieistniejące')), [])
+
+    def test_drafts_are_visible_only_to_staff(self):
+        self.assertNotIn('Szkic o żółwiach', self.titles(self.search('żółw')))
+        self.client.force_authenticate(user=self.admin)
+        self.assertIn('Szkic o żółwiach', self.titles(self.search('żółw')))
+
+    def test_pagination_and_validation(self):
+        first = self.search('żółw', limit=1)
+        self.assertEqual(len(first.data['results']), 1)
+        self.assertIn('offset=1', first.data['next'])
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.titles(second), ['Stolice Europy'])
+        self.assertIsNone(second.data['next'])
+        self.assertEqual(self.search('  ').status_code, status.HTTP_400_BAD_REQUEST)
+        # Operatory FTS wpisane przez użytkownika nie psują zapytania
+        self.assertEqual(self.search('"żółw* OR (').status_code, status.HTTP_200_OK)
+
+    def test_updates_and_deletes_are_indexed(self):
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('quiz-detail', args=[self.fauna.id]), {'title': 'Ssaki morskie'}, format='json')
+            self.client.delete(reverse('quiz-detail', args=[self.capitals.id]))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.titles(self.search('ssaki')), ['Ssaki morskie'])
+        # Pytanie o żółwia nadal należy do zmienionego quizu; usunięty quiz znika z wyników
+        self.assertEqual(self.titles(self.search('żółw')), ['Ssaki morskie'])
+
+    def test_bulk_import_and_rebuild_command(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.jsonl')
+            with open(path, 'w', encoding='utf-8') as handle:
+                handle.write(json.dumps({'title': 'Płazy', 'is_published': True, 'questions': [
+                    {'text': 'Czy traszka to płaz?', 'answers': [{'text': 'Tak', 'is_correct': True}]},
+                ]}) + '\n')
+            with self.captureOnCommitCallbacks(execute=True):
+                import_file(path, 'jsonl', self.author.pk, chunk_size=10, checkpoint_key='search')
+        self.assertEqual(self.titles(self.search('traszka')), ['Płazy'])
+
+        Quiz.objects.filter(pk=self.fauna.pk).update(title='Zmienione bez sygnałów')
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Zindeksowano 4 quizów', out.getvalue())
+        self.assertEqual(self.titles(self.search('sygnałów')), ['Zmienione bez sygnałów'])
+
+    def test_admin_changelists_use_index(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:Lumen_quiz_changelist'), {'q': 'szkic'})
+        self.assertContains(response, 'Szkic o żółwiach')
+        self.assertNotContains(response, 'Stolice Europy</a>')
+        response = self.client.get(reverse('admin:Lumen_question_changelist'), {'q': 'geografia'})
+        self.assertContains(response, 'Co żyje w Wiśle?')
+        self.assertNotContains(response, 'Ile lat żyje żółw?')
+
+
+class CategoryFacetTest(APITestCase):
+    """Kategorie jako osobna tabela z licznikami i przeglądanie po nich bez grupowania quizów."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@test.com', 'password')
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'password')
+        self.client.force_authenticate(user=self.author)
+
+    def create_via_api(self, title, category, is_published=True):
+        data = {'title': title, 'description': '', 'category': category, 'is_published': is_published, 'questions': [
+            {'text': 'Pytanie', 'answers': [{'text': 'Tak', 'is_correct': True}]},
+        ]}
+        response = self.client.post(reverse('quiz-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return Quiz.objects.get(pk=response.data['id'])
+
+    def category_of(self, quiz):
+        return json.loads(self.client.get(reverse('quiz-detail', args=[quiz.id])).content)['category']
+
+    def counts(self, name):
+        category = Category.objects.get(name=name)
+        return category.quiz_count, category.published_count
+
+    def test_api_writes_keep_counters(self):
+        quiz = self.create_via_api('Stolice', ' Geografia ')
+        self.create_via_api('Rzeki', 'Geografia', is_published=False)
+        self.assertEqual(self.counts('Geografia'), (2, 1))
+        self.assertEqual(self.category_of(quiz), 'Geografia')
+
+        response = self.client.patch(reverse('quiz-detail', args=[quiz.id]), {'category': 'Historia'}, format='json')
+        self.assertEqual(response.data['category'], 'Historia')
+        self.assertEqual(self.counts('Geografia'), (1, 0))
+        self.assertEqual(self.counts('Historia'), (1, 1))
+
+        self.client.patch(reverse('quiz-detail', args=[quiz.id]), {'category': ''}, format='json')
+        self.assertEqual(self.category_of(quiz), '')
+        self.assertEqual(self.counts('Historia'), (0, 0))
+
+        rivers = Quiz.objects.get(title='Rzeki')
+        rivers.delete()
+        self.assertEqual(self.counts('Geografia'), (0, 0))
+
+    def test_admin_publish_actions_and_bulk_import(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank.jsonl')
+            with open(path, 'w', encoding='utf-8') as handle:
+                for i in range(3):
+                    handle.write(json.dumps({'title': f'Ssaki {i}', 'category': 'Biologia', 'questions': [
+                        {'text': 'Czy wieloryb to ssak?', 'answers': [{'text': 'Tak', 'is_correct': True}]},
+                    ]}) + '\n')
+            import_file(path, 'jsonl', self.author.pk, chunk_size=2, checkpoint_key='categories')
+        self.assertEqual(self.counts('Biologia'), (3, 0))
+
+        model_admin = QuizAdmin(Quiz, AdminSite())
+        model_admin.message_user = lambda *args, **kwargs: None
+        request = RequestFactory().post('/')
+        model_admin.publish_quizzes(request, Quiz.objects.all())
+        # Ponowna publikacja już opublikowanych quizów niczego nie dolicza
+        model_admin.publish_quizzes(request, Quiz.objects.filter(title='Ssaki 0'))
+        self.assertEqual(self.counts('Biologia'), (3, 3))
+        model_admin.unpublish_quizzes(request, Quiz.objects.filter(title='Ssaki 1'))
+        self.assertEqual(self.counts('Biologia'), (3, 2))
+        self.assertEqual(reconcile_category_counters(dry_run=True), [])
+
+    def test_facets_come_from_counters(self):
+        self.create_via_api('Stolice', 'Geografia')
+        self.create_via_api('Szkic', 'Historia', is_published=False)
+        self.client.force_authenticate(user=None)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual([(c['name'], c['quiz_count']) for c in response.data], [('Geografia', 1)])
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('GROUP BY', ctx.captured_queries[0]['sql'].upper())
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual([(c['name'], c['quiz_count']) for c in response.data], [('Geografia', 1), ('Historia', 1)])
+
+    def test_category_quizzes_are_paginated_and_hide_drafts(self):
+        for i in range(3):
+            self.create_via_api(f'Stolice {i}', 'Geografia')
+        self.create_via_api('Szkic', 'Geografia', is_published=False)
+        category = Category.objects.get(name='Geografia')
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(reverse('category-quizzes', args=[category.id]), {'page_size': 2})
+        titles = [quiz['title'] for quiz in response.data['results']]
+        response = self.client.get(response.data['next'])
+        titles += [quiz['title'] for quiz in response.data['results']]
+        self.assertEqual(titles, ['Stolice 2', 'Stolice 1', 'Stolice 0'])
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(response.data['results'][0]['category'], 'Geografia')
+
+    def test_rename_refreshes_cached_pages_and_reconcile_fixes_drift(self):
+        quiz = self.create_via_api('Stolice', 'Geografia')
+        self.assertContains(self.client.get(reverse('quiz_detail', args=[quiz.id])), 'Geografia')
+        category = Category.objects.get(name='Geografia')
+        with self.captureOnCommitCallbacks(execute=True):
+            category.name = 'Geografia Europy'
+            category.save()
+        self.assertContains(self.client.get(reverse('quiz_detail', args=[quiz.id])), 'Geografia Europy')
+
+        Category.objects.filter(pk=category.pk).update(quiz_count=5)
+        out = StringIO()
+        call_command('reconcile_quiz_counters', stdout=out)
+        self.assertIn(f'Kategoria {category.pk}: quizy 5 -> 1, opublikowane 1 -> 1', out.getvalue())
+        self.assertEqual(self.counts('Geografia Europy'), (1, 1))
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    """Backend pamięciowy liczący otwarte połączenia."""
+    opened = 0
+
+    def open(self):
+        type(self).opened += 1
+        return super().open()
+
+
+@override_settings(EMAIL_BACKEND='Lumen.tests.CountingEmailBackend')
+class JobQueueTest(TestCase):
+    """Kolejka zadań w bazie: partie, ponowienia z opóźnieniem i porzucone zadania."""
+
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        self.calls = []
+
+        @register_job('test_flaky')
+        def flaky(payload):
+            self.calls.append(payload)
+            if len(self.calls) <= payload.get('failures', 0):
+                raise ConnectionError('przekroczony czas')
+
+        self.addCleanup(HANDLERS.pop, 'test_flaky')
+
+    def test_batch_of_emails_shares_one_connection(self):
+        for i in range(3):
+            enqueue_email(f'Temat {i}', 'Treść', [f'gracz{i}@example.com'])
+        self.assertEqual(work_off(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = enqueue('test_flaky', {'failures': 1})
+        with self.assertLogs('lumen.jobs', 'WARNING'):
+            self.assertEqual(work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('ConnectionError: przekroczony czas', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        # Przed upływem opóźnienia zadanie nie jest gotowe
+        self.assertEqual(work_off(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 2, ''))
+
+    def test_job_fails_after_max_attempts_and_unknown_jobs_fail(self):
+        job = enqueue('test_flaky', {'failures': 5}, max_attempts=2)
+        with self.assertLogs('lumen.jobs', 'WARNING'):
+            work_off()
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            work_off()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+        with self.assertRaises(ValueError):
+            enqueue('nie_ma_takiego')
+        orphan = Job.objects.create(name='usuniete_zadanie', run_at=timezone.now())
+        with self.assertLogs('lumen.jobs', 'ERROR'):
+            work_off()
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.status, Job.FAILED)
+
+    def test_abandoned_running_job_is_reclaimed(self):
+        job = enqueue('test_flaky')
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, attempts=1, locked_by='martwy', locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(work_off(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+    def test_run_workers_and_enqueued_reconcile(self):
+        quiz = Quiz.objects.create(title='Liczony', created_by=User.objects.create_user('author'))
+        Quiz.objects.filter(pk=quiz.pk).update(question_count=9)
+        call_command('reconcile_quiz_counters', enqueue=True, stdout=StringIO())
+        out = StringIO()
+        call_command('run_workers', workers=1, once=True, stdout=out)
+        self.assertIn('Wykonano 1 zadań', out.getvalue())
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.question_count, 0)
+
+
+def png_upload(name='obraz.png', size=(2000, 1000), color=(200, 30, 30)) -> SimpleUploadedFile:
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageDerivativeTest(APITestCase):
+    """Pochodne obrazów: budowa poza żądaniem, adresowanie treścią i wykorzystanie w szablonach i API."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media.name
+        cache.clear()
+        self.user = User.objects.create_user('artist', 'artist@test.com', 'password')
+
+    def files_on_disk(self) -> list[str]:
+        return sorted(os.path.relpath(os.path.join(root, name), self.media_root)
+                      for root, _, names in os.walk(self.media_root) for name in names)
+
+    def test_avatar_upload_builds_derivatives_in_background(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('user_profile'), {'avatar': png_upload()})
+        self.assertEqual(response.status_code, 302)
+        profile = self.user.profile
+        profile.refresh_from_db()
+        self.assertIsNone(profile.avatar_asset)
+        self.assertEqual(Job.objects.filter(name='image_derivatives', status=Job.PENDING).count(), 1)
+        # Do czasu przetworzenia strona pokazuje oryginał
+        self.assertContains(self.client.get(reverse('user_profile')), profile.avatar.url)
+
+        self.assertEqual(work_off(), 1)
+        profile.refresh_from_db()
+        asset = profile.avatar_asset
+        self.assertEqual((asset.width, asset.height), (2000, 1000))
+        self.assertTrue(asset.placeholder.startswith('data:image/webp;base64,'))
+        from PIL import Image
+        for size, edge in DERIVATIVE_SIZES.items():
+            with default_storage.open(derivative_name(asset.digest, size)) as file, Image.open(file) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.width, edge)
+
+        page = self.client.get(reverse('user_profile'))
+        self.assertContains(page, 'srcset="')
+        self.assertContains(page, derivative_name(asset.digest, 'thumb'))
+        self.assertContains(page, asset.placeholder)
+
+    def test_identical_images_share_one_asset(self):
+        quiz = Quiz.objects.create(title='Obrazkowy', created_by=self.user, image=png_upload('a.png'))
+        work_off()
+        files = self.files_on_disk()
+        other = Quiz.objects.create(title='Drugi', created_by=self.user, image=png_upload('b.png'))
+        work_off()
+        quiz.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(ImageAsset.objects.count(), 1)
+        self.assertEqual(quiz.image_asset_id, other.image_asset_id)
+        # Doszedł tylko drugi oryginał - pochodnych nie zapisano ponownie
+        self.assertEqual(len(self.files_on_disk()), len(files) + 1)
+
+        # Nowy obraz odpina pochodne poprzedniego, a zadanie starego pliku niczego nie nadpisuje
+        stale = enqueue('image_derivatives', {'model': 'Lumen.Quiz', 'pk': other.pk, 'field': 'image',
+                                              'name': other.image.name})
+        other.image = png_upload('c.png', color=(0, 90, 200))
+        other.save()
+        other.refresh_from_db()
+        self.assertIsNone(other.image_asset)
+        work_off()
+        stale.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(stale.status, Job.DONE)
+        self.assertNotEqual(other.image_asset_id, quiz.image_asset_id)
+        self.assertEqual(ImageAsset.objects.count(), 2)
+
+    def test_question_image_in_snapshot_and_quiz_variants_in_api(self):
+        quiz = Quiz.objects.create(title='Z ilustracją', created_by=self.user, is_published=True,
+                                   image=png_upload('okladka.png'))
+        question = Question.objects.create(quiz=quiz, text='Co widać?', order=1, image=png_upload('pytanie.png'))
+        Answer.objects.create(question=question, text='Czerwień', is_correct=True)
+        self.assertFalse(get_compiled_quiz(quiz.pk).questions[0].image.ready)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            work_off()
+        image = get_compiled_quiz(quiz.pk).questions[0].image
+        self.assertTrue(image.ready)
+        self.assertEqual(image.dimensions('thumb'), (160, 80))
+
+        self.client.force_authenticate(user=self.user)
+        row = self.client.get(reverse('quiz-list')).data['results'][0]
+        self.assertTrue(row['image_variants']['ready'])
+        self.assertTrue(row['image_variants']['medium'].startswith('http://testserver/media/derivatives/'))
+
+    def test_command_enqueues_images_without_derivatives(self):
+        quiz = Quiz.objects.create(title='Stary', created_by=self.user, image=png_upload())
+        Job.objects.all().delete()
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('Zlecono pochodne 1 obrazów', out.getvalue())
+        work_off()
+        quiz.refresh_from_db()
+        self.assertIsNotNone(quiz.image_asset)
+        call_command('build_image_derivatives', stdout=StringIO())
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 0)
+
+
+class StaticFilesTest(TestCase):
+    """collectstatic z odciskami i wersjami .gz oraz ich serwowanie z długim cache."""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(
+            STATIC_ROOT=root.name, LUMEN_SERVE_STATIC=True,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'Lumen.staticfiles.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = root.name
+        call_command('collectstatic', interactive=False, verbosity=0)
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        self.css = staticfiles_storage.stored_name('css/style.css')
+        self.avatar = staticfiles_storage.stored_name('images/default_avatar.jpg')
+
+    def get(self, name, **headers):
+        return self.client.get(f'/static/{name}', headers=headers)
+
+    def test_collectstatic_writes_fingerprinted_and_gzipped_files(self):
+        self.assertRegex(self.css, r'^css/style\.[0-9a-f]{12}\.css$')
+        for name in ('css/style.css', self.css):
+            with open(os.path.join(self.root, name), 'rb') as original, \
+                    open(os.path.join(self.root, name + GZIP_SUFFIX), 'rb') as compressed:
+                self.assertEqual(gzip.decompress(compressed.read()), original.read())
+        # JPEG jest już skompresowany
+        self.assertFalse(os.path.exists(os.path.join(self.root, self.avatar + GZIP_SUFFIX)))
+        self.assertContains(self.client.get(reverse('quiz_list')), f'/static/{self.css}')
+
+    def test_fingerprinted_files_are_immutable_and_served_precompressed(self):
+        with open(os.path.join(self.root, 'css/style.css'), 'rb') as file:
+            css = file.read()
+        # Żądanie statyczne kończy się przed sesją i uwierzytelnianiem - bez zapytań do bazy
+        with self.assertNumQueries(0):
+            response = self.get(self.css, accept_encoding='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), css)
+
+        plain = self.get(self.css)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content), css)
+
+        image = self.get(self.avatar, accept_encoding='gzip')
+        self.assertFalse(image.has_header('Content-Encoding'))
+        self.assertFalse(image.has_header('Vary'))
+        self.assertIn('immutable', image['Cache-Control'])
+
+    def test_unfingerprinted_names_revalidate_and_unknown_paths_fall_through(self):
+        response = self.get('css/style.css')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertEqual(self.get('css/style.css', if_modified_since=response['Last-Modified']).status_code, 304)
+
+        self.assertEqual(self.get('css/brak.css').status_code, 404)
+        self.assertEqual(self.get('../manage.py').status_code, 404)
+
+    async def test_async_chain_serves_without_threads(self):
+        from asgiref.sync import iscoroutinefunction
+        from .middleware import StaticFilesMiddleware
+
+        async def view(request):
+            return HttpResponse('widok')
+
+        middleware = StaticFilesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await self.async_client.get(f'/static/{self.css}', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        with open(os.path.join(self.root, 'css/style.css'), 'rb') as file:
+            self.assertEqual(gzip.decompress(response.content), file.read())
+        self.assertEqual((await middleware(RequestFactory().get('/quizy/'))).content, b'widok')
+
+    def test_disabled_middleware_serves_nothing(self):
+        with override_settings(LUMEN_SERVE_STATIC=False):
+            self.assertEqual(self.client.get(f'/static/{self.css}').status_code, 404)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Odczyty z repliki, zapisy i odczyty po zapisie z bazy głównej - na dwóch bazach SQLite."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('gracz', 'gracz@test.com', 'password')
+        Quiz.objects.create(title='Z bazy głównej', created_by=self.user, is_published=True)
+
+        # "Replikacja": kopia bazy głównej w osobnym pliku, który potem celowo się rozjeżdża
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite3')
+        primary = connections['default']
+        primary.ensure_connection()
+        target = sqlite3.connect(path)
+        primary.connection.backup(target)
+        target.close()
+
+        replica = primary.__class__({**primary.settings_dict, 'NAME': path}, alias='replica')
+        connections['replica'] = replica
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(replica.close)
+        with replica.cursor() as cursor:
+            cursor.execute('UPDATE "Lumen_quiz" SET title = %s', ['Z repliki'])
+
+        settings_override = override_settings(LUMEN_DB_REPLICAS=['replica'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def titles(self):
+        # Lista API nie korzysta z cache - każdy odczyt idzie do bazy wybranej przez router
+        return [row['title'] for row in self.client.get(reverse('quiz-list')).json()['results']]
 
+    def test_reads_use_replica_until_session_writes(self):
+        self.assertEqual(self.titles(), ['Z repliki'])
 
+        # Logowanie zapisuje sesję i last_login - w bazie głównej, replika o nich nie wie
+        response = self.client.post(reverse('login'), {'username': 'gracz', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies['lumen_primary']['max-age'], 5)
+        self.assertTrue(User.objects.using('default').get(pk=self.user.pk).last_login)
+        self.assertIsNone(User.objects.using('replica').get(pk=self.user.pk).last_login)
 
+        # Przyklejona sesja czyta z bazy głównej - widzi swoją sesję i aktualne dane
+        self.assertEqual(self.titles(), ['Z bazy głównej'])
+        self.assertEqual(self.client.get(reverse('user_profile')).status_code, 200)
 
+        del self.client.cookies['lumen_primary']
+        self.assertEqual(self.titles(), ['Z repliki'])
 
+    def test_cache_refills_read_from_primary(self):
+        # Edycja podbiła wersję quizu, ale replika jeszcze jej nie ma - nowe wpisy cache muszą
+        # powstać z bazy głównej, inaczej stara treść zostałaby pod nową wersją do wygaśnięcia
+        quiz = Quiz.objects.get()
+        Question.objects.create(quiz=quiz, text='Pytanie tylko w bazie głównej', order=1)
+        cache.clear()
+        self.assertEqual(self.titles(), ['Z repliki'])
 
+        response = self.client.get(reverse('quiz_detail', args=[quiz.pk]))
+        self.assertContains(response, 'Z bazy głównej')
+        self.assertNotContains(response, 'Z repliki')
+        self.assertContains(self.client.get(reverse('quiz_list')), 'Z bazy głównej')
+        self.assertEqual(json.loads(self.client.get(reverse('quiz-detail', args=[quiz.pk])).content)['title'],
+                         'Z bazy głównej')
 
+        from .db_routing import begin_request, end_request
+        cache.clear()
+        state, token = begin_request(read_from_replica=True)
+        try:
+            compiled = get_compiled_quiz(quiz.pk)
+            self.assertEqual(router.db_for_read(Quiz), 'replica')
+        finally:
+            end_request(token)
+        self.assertEqual(compiled.title, 'Z bazy głównej')
+        self.assertEqual([question.text for question in compiled.questions], ['Pytanie tylko w bazie głównej'])
+        self.assertFalse(state.wrote)
 
+    async def test_async_chain_keeps_routing_state(self):
+        from asgiref.sync import iscoroutinefunction, sync_to_async
+        from .middleware import ReplicaRoutingMiddleware
 
+        async def view(request):
+            title = await Quiz.objects.values_list('title', flat=True).aget()
+            await sync_to_async(Quiz.objects.update)(description='Zapis z widoku async')
+            return HttpResponse(title)
 
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get('/'))
+        self.assertEqual(response.content.decode(), 'Z repliki')
+        self.assertIn('lumen_primary', response.cookies)
+        self.assertEqual(await Quiz.objects.using('default').values_list('description', flat=True).aget(),
+                         'Zapis z widoku async')
 
+    def test_writes_transactions_and_background_code_use_primary(self):
+        self.assertEqual(router.db_for_read(Quiz), 'default')
+        self.assertEqual(router.db_for_write(Quiz), 'default')
+        from .db_routing import begin_request, end_request
+        state, token = begin_request(read_from_replica=True)
+        try:
+            self.assertEqual(router.db_for_read(Quiz), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Quiz), 'default')
+            quiz = Quiz.objects.get()
+            self.assertEqual(quiz.title, 'Z repliki')
+            quiz.description = 'Zmieniony'
+            quiz.save(update_fields=['description'])
+            self.assertTrue(state.wrote)
+            self.assertEqual(Quiz.objects.get().title, 'Z bazy głównej')
+        finally:
+            end_request(token)
+        self.assertEqual(Quiz.objects.using('default').get().description, 'Zmieniony')
 
@@ -1,15 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import quiz_list, quiz_detail, play_quiz_view, finish_quiz_view, QuizViewSet
+from .views import quiz_list, quiz_detail, start_quiz_view, play_quiz_view, finish_quiz_view, QuizViewSet, LeaderboardViewSet, CategoryViewSet, ResultExportView
 
 router = DefaultRouter()
 router.register(r'quizzes', QuizViewSet, basename='quiz')
+router.register(r'leaderboard', LeaderboardViewSet, basename='leaderboard')
+router.register(r'categories', CategoryViewSet, basename='category')
 
 urlpatterns = [
     path('', quiz_list, name='quiz_list'),
     path('quiz/<int:quiz_id>/', quiz_detail, name='quiz_detail'),
+    path('quiz/<int:quiz_id>/start/', start_quiz_view, name='start_quiz_view'),
     path("quiz/<int:quiz_id>/pytanie/<int:question_order>/", play_quiz_view, name="play_quiz_view"),
     path('quiz/<int:quiz_id>/finish/', finish_quiz_view, name='finish_quiz_view'),
+    path('api/results/export/', ResultExportView.as_view(), name='result_export'),
     # Adresy URL wygenerowane przez router DRF dla naszego API
     path('api/', include(router.urls))
 ]
\ No newline at end of file
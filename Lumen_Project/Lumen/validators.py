@@ -0,0 +1,12 @@
+from typing import Any, Iterable, Mapping, Optional
+
+
+def single_correct_answer_error(answers: Iterable[Mapping[str, Any]]) -> Optional[str]:
+    """
+    Reguła wspólna dla API, panelu admina i importów: pytanie musi mieć dokładnie
+    jedną poprawną odpowiedź. Zwraca komunikat błędu albo None.
+    """
+    correct_count = sum(1 for answer in answers if answer.get('is_correct'))
+    if correct_count != 1:
+        return f"Pytanie musi mieć dokładnie jedną poprawną odpowiedź. Znaleziono: {correct_count}"
+    return None
@@ -1,110 +1,174 @@
-from django.http import HttpRequest, HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse, Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 from django.contrib import messages
-from .models import Quiz, Question, Answer, QuizResult
-from rest_framework import viewsets, permissions
-from .serializers import QuizListSerializer, QuizDetailSerializer
+from django.contrib.auth import get_user_model
+from .models import Category, Quiz
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .permissions import IsAuthorOrStaffOrReadOnly
+from .serializers import QuizListSerializer, QuizDetailSerializer, AttemptSubmissionSerializer, CategorySerializer
+from .snapshot import aget_compiled_quiz_or_404, get_quiz_versions
+from .attempts import aclaim_attempt, aget_attempt, aget_or_start_attempt, asave_attempt
+from .http_cache import (
+    accepts_gzip, conditional_response, get_quiz_payload, list_etag, payload_response, quiz_etag, set_etag,
+)
+from .page_cache import cached_fragment, quiz_detail_key, quiz_list_key
+from .pagination import InvalidCursor, KeysetPagination, paginate_keyset
+from .exports import CONTENT_TYPES, EXPORT_FORMATS, parse_since, render_rows, result_rows
+from .leaderboards import GLOBAL_BOARD, get_leaderboard_store, quiz_board, RankedEntry
+from .search import get_search_backend
+from .services import POINTS_PER_CORRECT_ANSWER, record_quiz_result
+
+
+QUIZ_LIST_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 20
 
 
 def quiz_list(request: HttpRequest) -> HttpResponse:
-    # Optymalizacja: select_related pobiera Autora w 1 zapytaniu, zamiast N zapytań
-    base_qs = Quiz.objects.select_related('created_by').order_by('-created_at')
+    # Optymalizacja: select_related pobiera autora i kategorię w 1 zapytaniu, zamiast N zapytań
+    base_qs = Quiz.objects.select_related('created_by', 'category').order_by('-created_at')
+    cursor = request.GET.get('cursor')
+    context = {}
+
+    def render_content(quizzes) -> str:
+        # Paginacja kursorowa: koszt strony nie zależy od tego, jak daleko przewinięto listę
+        try:
+            page, next_cursor = paginate_keyset(quizzes, cursor, QUIZ_LIST_PAGE_SIZE)
+        except InvalidCursor:
+            raise Http404("Nieprawidłowy kursor.")
+        context.update({'quizzes': page, 'next_cursor': next_cursor, 'is_first_page': not cursor})
+        return render_to_string('Lumen/partials/quiz_list_content.html', context, request)
 
     if request.user.is_authenticated and request.user.is_superuser:
-        quizzes = base_qs.all()
+        # Administrator widzi też szkice - jego lista nie trafia do wspólnego cache
+        content = render_content(base_qs.all())
     else:
-        quizzes = base_qs.filter(is_published=True)
+        # Opublikowana lista jest taka sama dla wszystkich - trafienie w cache nie odpytuje bazy
+        content = cached_fragment(quiz_list_key(cursor), lambda: render_content(base_qs.filter(is_published=True)))
 
-    context = {'quizzes': quizzes}
+    context['content'] = content
     return render(request, 'Lumen/quiz_list.html', context)
 
 
 def quiz_detail(request: HttpRequest, quiz_id: int) -> HttpResponse:
-    quiz = get_object_or_404(Quiz, pk=quiz_id)
-    context = {"quiz": quiz}
+    def render_content() -> str:
+        # Liczba pytań to zapisany licznik - bez COUNT(*) przy każdym wyświetleniu
+        quiz = get_object_or_404(Quiz.objects.select_related('created_by', 'category'), pk=quiz_id)
+        return render_to_string('Lumen/partials/quiz_detail_content.html', {'quiz': quiz}, request)
+
+    # Wersja quizu zmienia się przy każdym zapisie quizu, pytania lub odpowiedzi
+    context = {'content': cached_fragment(quiz_detail_key(quiz_id), render_content)}
     return render(request, 'Lumen/quiz_detail.html', context)
 
 
+async def _auser(request: HttpRequest):
+    """
+    Użytkownik pobrany asynchronicznie. Podstawiamy go też jako request.user - procesor
+    kontekstu `auth` w szablonie nie sięgnie wtedy synchronicznie do bazy w pętli zdarzeń.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+# Widoki rozgrywki są asynchroniczne: pod ASGI (uvicorn/daphne) czekanie na cache i bazę
+# nie zajmuje wątku, a pod WSGI Django wykonuje je synchronicznie jak dotąd.
+@login_required
+async def start_quiz_view(request: HttpRequest, quiz_id: int) -> HttpResponse:
+    """Wejście do rozgrywki: nowe podejście zaczyna od pierwszego pytania, rozpoczęte - tam, gdzie gracz przerwał."""
+    user = await _auser(request)
+    quiz = await aget_compiled_quiz_or_404(quiz_id)
+    if not quiz.questions:
+        messages.info(request, "Ten quiz nie ma jeszcze pytań.")
+        return redirect('quiz_detail', quiz_id=quiz.id)
+
+    attempt = await aget_attempt(user.id, quiz.id)
+    order = attempt.resume_order(quiz) if attempt is not None else quiz.questions[0].order
+    return redirect('play_quiz_view', quiz_id=quiz.id, question_order=order)
+
+
 @login_required
-def play_quiz_view(request: HttpRequest, quiz_id: int, question_order: int) -> HttpResponse:
-    quiz = get_object_or_404(Quiz, pk=quiz_id)
+async def play_quiz_view(request: HttpRequest, quiz_id: int, question_order: int) -> HttpResponse:
+    user = await _auser(request)
+    # Treść quizu czytamy ze skompilowanej migawki w cache - bez zapytań o pytania i odpowiedzi
+    quiz = await aget_compiled_quiz_or_404(quiz_id)
 
     # Pobieramy pytanie lub przekierowujemy na koniec
-    try:
-        question = Question.objects.get(quiz=quiz, order=question_order)
-    except Question.DoesNotExist:
+    question = quiz.get_question(question_order)
+    if question is None:
         return redirect('finish_quiz_view', quiz_id=quiz.id)
 
-    # Reset wyniku przy starcie (pytanie nr 1)
-    if question_order == 1:
-        request.session[f'quiz_{quiz_id}_score'] = 0
+    # Stan podejścia (dziennik odpowiedzi, pozycja) żyje w cache - sesja nie jest zapisywana
+    attempt = await aget_or_start_attempt(user.id, quiz.id)
+    context = {
+        'quiz': quiz,
+        'question': question,
+        'answers': question.answers,
+        'total_questions': quiz.total_questions,
+        'next_question': quiz.get_question_after(question),
+        'is_answered': False,
+    }
 
-    if request.method == "POST":
+    logged = attempt.answer_for(question)
+    if logged is None and request.method == "POST":
         selected_answer_id = request.POST.get('answer')
         if not selected_answer_id:
-            context = {
-                'quiz': quiz,
-                'question': question,
-                'answers': question.answers.all(),
-                'total_questions': quiz.questions.count(),
-                'is_answered': False,
-                'error_message': 'Musisz wybrać jedną z odpowiedzi.'
-            }
+            context['error_message'] = 'Musisz wybrać jedną z odpowiedzi.'
             return render(request, "Lumen/play_quiz.html", context)
 
-        selected_answer = get_object_or_404(Answer, pk=selected_answer_id)
-        correct_answer = question.answers.filter(is_correct=True).first()
+        try:
+            selected_answer = question.get_answer(int(selected_answer_id))
+        except ValueError:
+            selected_answer = None
 
         # Zabezpieczenie: czy odpowiedź należy do tego pytania?
-        if selected_answer.question != question:
+        if selected_answer is None:
             return HttpResponse("Nieprawidłowa odpowiedź", status=400)
 
-        if selected_answer.is_correct:
-            current_score = request.session.get(f'quiz_{quiz_id}_score', 0)
-            request.session[f'quiz_{quiz_id}_score'] = current_score + 10
+        attempt.record(quiz, question, selected_answer)
+        await asave_attempt(attempt)
+        logged = attempt.answer_for(question)
 
-        context = {
-            'quiz': quiz,
-            'question': question,
-            'total_questions': quiz.questions.count(),
+    # Pytanie z odpowiedzią pokazujemy zawsze z pierwszą udzieloną odpowiedzią -
+    # ponowne wysłanie formularza niczego nie zmienia i nie dolicza punktów
+    if logged is not None:
+        context.update({
             'is_answered': True,
-            'selected_answer': selected_answer,
-            'correct_answer': correct_answer
-        }
-        return render(request, "Lumen/play_quiz.html", context)
-
-    context = {
-        'quiz': quiz,
-        'question': question,
-        'answers': question.answers.all(),
-        'total_questions': quiz.questions.count(),
-        'is_answered': False
-    }
+            'selected_answer': question.get_answer(logged.answer_id),
+            'correct_answer': question.correct_answer,
+        })
     return render(request, "Lumen/play_quiz.html", context)
 
 
 @login_required
-@transaction.atomic  # Ważne: zapewnia spójność bazy danych
-def finish_quiz_view(request: HttpRequest, quiz_id: int) -> HttpResponse:
-    quiz = get_object_or_404(Quiz, pk=quiz_id)
+async def finish_quiz_view(request: HttpRequest, quiz_id: int) -> HttpResponse:
+    user = await _auser(request)
+    quiz = await aget_compiled_quiz_or_404(quiz_id)
 
-    # Używamy .pop(), aby pobrać wynik i usunąć go z sesji (zapobiega odświeżaniu strony dla punktów)
-    raw_score = request.session.pop(f'quiz_{quiz_id}_score', 0)
+    # Zdejmujemy podejście z cache - odświeżenie strony nie zapisze wyniku drugi raz
+    attempt = await aclaim_attempt(user.id, quiz.id)
+    if attempt is None:
+        messages.info(request, "Nie masz rozpoczętego podejścia do tego quizu.")
+        return redirect('quiz_detail', quiz_id=quiz.id)
 
-    # Zliczamy poprzednie podejścia
-    previous_attempts = QuizResult.objects.filter(user=request.user, quiz=quiz).count()
-
-    # Algorytm: za każde kolejne podejście dostajesz 20% mniej punktów, ale nie mniej niż 10% oryginału
-    multiplier = max(0.1, 1.0 - (previous_attempts * 0.2))
-    final_score = int(raw_score * multiplier)
-
-    # Zapisujemy wynik
-    QuizResult.objects.create(user=request.user, quiz=quiz, score=final_score)
-
-    # Dodajemy XP do profilu
-    request.user.profile.add_xp(final_score)
+    # Zapisujemy wynik (z mnożnikiem za kolejne podejścia) razem z odpowiedziami i dodajemy XP do profilu.
+    # Transakcja (record_quiz_result jest atomowe) musi w całości działać w jednym wątku synchronicznym.
+    try:
+        result, multiplier = await sync_to_async(record_quiz_result)(
+            user, quiz.id, attempt.score, list(attempt.answers.values()),
+        )
+    except Exception:
+        # Nieudany zapis nie może przepaść razem z podejściem - gracz spróbuje ponownie
+        await asave_attempt(attempt)
+        raise
+    final_score = result.score
 
     messages.success(request, f"Ukończono quiz! Zdobyto {final_score} XP (Mnożnik: {multiplier:.1f}x)")
     return redirect('user_profile')
@@ -112,10 +176,240 @@ def finish_quiz_view(request: HttpRequest, quiz_id: int) -> HttpResponse:
 
 class QuizViewSet(viewsets.ModelViewSet):
     queryset = Quiz.objects.prefetch_related('questions__answers').all()
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrStaffOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        # Lista, podejścia i rankingi nie potrzebują pytań - pomijamy kosztowny prefetch
+        if self.action in ('list', 'attempts', 'leaderboard', 'leaderboard_me'):
+            return Quiz.objects.select_related('category', 'image_asset')
+        return super().get_queryset().select_related('category')
 
     def get_serializer_class(self):
+        if self.action == 'attempts':
+            return AttemptSubmissionSerializer
         return QuizListSerializer if self.action == 'list' else QuizDetailSerializer
 
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
\ No newline at end of file
+        serializer.save(created_by=self.request.user)
+
+    def _wants_json(self, request) -> bool:
+        renderer, _ = self.perform_content_negotiation(request)
+        return isinstance(renderer, JSONRenderer)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lista z ETagiem liczonym z wersji quizów na stronie - przy 304 pomijamy serializację.
+        Strona to jedno zapytanie po indeksie, wersje to jeden odczyt z cache.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        versions = get_quiz_versions(quiz.pk for quiz in page)
+        etag = list_etag([
+            request.user.is_staff, request.query_params.get('page_size'), self.paginator.next_cursor,
+            *((quiz.pk, versions[quiz.pk]) for quiz in page),
+        ])
+        not_modified = conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        set_etag(request, response, etag)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Szczegóły quizu z gotowej, skompresowanej treści w cache (osobno dla administratora).
+        ETag i Last-Modified wynikają z wersji quizu, więc 304 nie dotyka bazy ani serializerów.
+        """
+        if not self._wants_json(request):
+            return super().retrieve(request, *args, **kwargs)  # np. przeglądarkowe API DRF
+        try:
+            quiz_id = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404("Nie znaleziono quizu.")
+        is_staff, gzipped = request.user.is_staff, accepts_gzip(request)
+
+        not_modified = conditional_response(request, quiz_etag(quiz_id, is_staff), gzipped=gzipped)
+        if not_modified is not None:
+            return not_modified
+
+        def render_quiz():
+            quiz = self.get_queryset().select_related('created_by').filter(pk=quiz_id).first()
+            if quiz is None:
+                return None
+            self.check_object_permissions(request, quiz)
+            return JSONRenderer().render(self.get_serializer(quiz).data)
+
+        payload = get_quiz_payload(quiz_id, is_staff, render_quiz)
+        if payload is None:
+            raise Http404("Nie znaleziono quizu.")
+        not_modified = conditional_response(request, payload.etag, payload.last_modified, gzipped)
+        return not_modified or payload_response(request, payload)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def attempts(self, request, pk=None):
+        """
+        Przyjmuje całe podejście naraz ({id_pytania: id_odpowiedzi}),
+        punktuje je po stronie serwera i zapisuje wynik wraz z XP w jednej transakcji.
+        """
+        quiz = self.get_object()
+        serializer = self.get_serializer(data=request.data, context={'request': request, 'quiz': quiz})
+        serializer.is_valid(raise_exception=True)
+
+        correct_count = serializer.validated_data['correct_count']
+        result, multiplier = record_quiz_result(request.user, quiz.id, correct_count * POINTS_PER_CORRECT_ANSWER,
+                                                serializer.validated_data['log'])
+        profile = request.user.profile
+        return Response({
+            'quiz': quiz.id,
+            'answered': len(serializer.validated_data['answers']),
+            'correct': correct_count,
+            'multiplier': multiplier,
+            'score': result.score,
+            'level': profile.level,
+            'xp': profile.xp,
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Wyszukiwanie pełnotekstowe (?q=) po tytule, kategorii, opisie i pytaniach, od najtrafniejszych.
+        Stronicowanie przez ?limit= i ?offset= - ranking nie nadaje się na kursor po dacie.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': "Podaj frazę do wyszukania."})
+        limit = _int_param(request, 'limit', SEARCH_PAGE_SIZE, 100) or SEARCH_PAGE_SIZE
+        offset = _int_param(request, 'offset', 0, 10_000)
+
+        quizzes = Quiz.objects.select_related('category', 'image_asset')
+        if not request.user.is_staff:
+            quizzes = quizzes.filter(is_published=True)
+        # Jeden wiersz ponad stronę mówi, czy istnieje następna - bez COUNT(*) po wszystkich trafieniach
+        matches = list(get_search_backend().ranked(quizzes, query)[offset:offset + limit + 1])
+        page = matches[:limit]
+        results = [
+            {**data, 'rank': round(quiz.search_rank, 6)}
+            for quiz, data in zip(page, QuizListSerializer(page, many=True, context={'request': request}).data)
+        ]
+        next_url = None
+        if len(matches) > limit:
+            next_url = replace_query_param(request.build_absolute_uri(), 'offset', offset + limit)
+        return Response({'next': next_url, 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        """Najlepsze wyniki w quizie (top-K, parametr ?limit=)."""
+        quiz = self.get_object()
+        return Response(leaderboard_top(request, quiz_board(quiz.id)))
+
+    @action(detail=True, methods=['get'], url_path='leaderboard/me', url_name='leaderboard-me',
+            permission_classes=[permissions.IsAuthenticated])
+    def leaderboard_me(self, request, pk=None):
+        """Pozycja zalogowanego użytkownika w rankingu quizu wraz z otoczeniem (?radius=)."""
+        quiz = self.get_object()
+        return Response(leaderboard_around(request, quiz_board(quiz.id)))
+
+
+def _int_param(request, name: str, default: int, maximum: int) -> int:
+    try:
+        value = int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+    return max(0, min(value, maximum))
+
+
+def _serialize_entries(entries: list[RankedEntry]) -> list[dict]:
+    # Nazwy użytkowników pobieramy jednym zapytaniem dla całej strony rankingu
+    usernames = dict(
+        get_user_model().objects.filter(pk__in=[entry.user_id for entry in entries]).values_list('pk', 'username')
+    )
+    return [
+        {'rank': entry.rank, 'user_id': entry.user_id, 'username': usernames.get(entry.user_id), 'score': entry.score}
+        for entry in entries
+    ]
+
+
+def leaderboard_top(request, board: str) -> dict:
+    entries = get_leaderboard_store().top(board, _int_param(request, 'limit', 10, 100))
+    return {'results': _serialize_entries(entries)}
+
+
+def leaderboard_around(request, board: str) -> dict:
+    store = get_leaderboard_store()
+    entries = store.around(board, request.user.pk, _int_param(request, 'radius', 5, 50))
+    rank = next((entry.rank for entry in entries if entry.user_id == request.user.pk), None)
+    return {'rank': rank, 'results': _serialize_entries(entries)}
+
+
+class LeaderboardViewSet(viewsets.ViewSet):
+    """Globalny ranking graczy według łącznego XP."""
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def list(self, request):
+        return Response(leaderboard_top(request, GLOBAL_BOARD))
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def me(self, request):
+        return Response(leaderboard_around(request, GLOBAL_BOARD))
+
+
+class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Przeglądanie po kategoriach (fasety). Liczby quizów pochodzą z liczników zapisanych
+    w kategoriach - lista to jedno zapytanie po małej tabeli, bez GROUP BY po quizach.
+    Zwykli użytkownicy widzą liczby opublikowanych quizów, administratorzy - wszystkich.
+    """
+    serializer_class = CategorySerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = None
+
+    def _count_field(self) -> str:
+        return 'quiz_count' if self.request.user.is_staff else 'published_count'
+
+    def get_queryset(self):
+        if self.action == 'quizzes':
+            return Category.objects.all()
+        # Kategorie bez (opublikowanych) quizów nie są fasetą, po której da się zawęzić listę
+        return Category.objects.filter(**{f'{self._count_field()}__gt': 0}).order_by('name')
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'count_field': self._count_field()}
+
+    @action(detail=True, methods=['get'])
+    def quizzes(self, request, pk=None):
+        """Quizy kategorii od najnowszych, ze stronicowaniem kursorowym jak lista quizów."""
+        category = self.get_object()
+        quizzes = category.quizzes.select_related('category', 'image_asset')
+        if not request.user.is_staff:
+            quizzes = quizzes.filter(is_published=True)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(quizzes, request, self)
+        return paginator.get_paginated_response(QuizListSerializer(page, many=True, context={'request': request}).data)
+
+
+class ResultExportView(APIView):
+    """
+    Strumieniowy eksport wszystkich wyników quizów dla analityki (tylko administratorzy).
+    Parametry: ?output=jsonl|csv, ?since_id=<id ostatniego wyeksportowanego wyniku> dla eksportu
+    przyrostowego, ?since=<ISO 8601> - początek pierwszego eksportu.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        export_format = request.query_params.get('output', 'jsonl')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Dozwolone formaty: {', '.join(EXPORT_FORMATS)}."})
+        try:
+            since = parse_since(request.query_params.get('since'))
+            since_id = int(request.query_params.get('since_id', 0))
+        except ValueError as exc:
+            raise ValidationError({'since': str(exc)})
+
+        response = StreamingHttpResponse(
+            render_rows(result_rows(since, since_id), export_format),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="quiz_results.{export_format}"'
+        return response
@@ -34,12 +34,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Pliki statyczne z collectstatic (wersje .gz, długi cache) - aktywne przy LUMEN_SERVE_STATIC=True
+    'Lumen.middleware.StaticFilesMiddleware',
+    # Odczyty GET z replik bazy, po zapisie - z bazy głównej; aktywne przy skonfigurowanych DB_REPLICAS
+    'Lumen.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Profilowanie żądań (Server-Timing) - aktywne tylko przy LUMEN_PROFILING=True
+    'Lumen.middleware.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'Lumen_Project.urls'
@@ -69,8 +75,53 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # Połączenie zostaje otwarte między żądaniami (sekundy; 0 - nowe połączenie na każde żądanie)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Pula połączeń psycopg 3 (tylko PostgreSQL, psycopg[pool] z requirements.txt) - zastępuje CONN_MAX_AGE
+if get_env_bool('DB_POOL') and 'postgresql' in DATABASES['default']['ENGINE']:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    }}
+
+# Repliki tylko do odczytu: lista HOST[:PORT] oddzielona przecinkami (dla SQLite - ścieżki plików).
+# Pozostałe parametry jak w bazie głównej; w testach repliki są lustrem bazy głównej.
+DB_REPLICAS = [replica.strip() for replica in os.getenv('DB_REPLICAS', '').split(',') if replica.strip()]
+for number, replica in enumerate(DB_REPLICAS, start=1):
+    config = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if 'sqlite3' in config['ENGINE']:
+        config['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        config.update(HOST=host, PORT=port or config['PORT'])
+    DATABASES[f'replica_{number}'] = config
+LUMEN_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Po zapisie przeglądarka czyta z bazy głównej przez tyle sekund (więcej niż opóźnienie replikacji)
+LUMEN_REPLICA_STICKY_SECONDS = int(os.getenv('LUMEN_REPLICA_STICKY_SECONDS', 5))
+DATABASE_ROUTERS = ['Lumen.db_routing.ReplicaRouter']
+
+# Cache: domyślnie pamięć lokalna procesu, na produkcji np. Redis/Memcached
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'lumen-default'),
+    }
+}
+
+# Profilowanie żądań: budżet czasu (ms) i liczby zapytań, powyżej którego żądanie trafia do logu,
+# oraz odsetek zalogowanych żądań z pełną listą zapytań
+LUMEN_PROFILING = get_env_bool('LUMEN_PROFILING', False)
+LUMEN_PROFILING_BUDGET_MS = int(os.getenv('LUMEN_PROFILING_BUDGET_MS', 500))
+LUMEN_PROFILING_QUERY_BUDGET = int(os.getenv('LUMEN_PROFILING_QUERY_BUDGET', 50))
+LUMEN_PROFILING_SAMPLE_RATE = float(os.getenv('LUMEN_PROFILING_SAMPLE_RATE', 0.1))
+
+# Eksport wyników zatrzymuje się na wynikach młodszych niż tyle sekund (dłużej niż trwa transakcja
+# zapisu wyniku) - ich transakcja mogła się jeszcze nie zatwierdzić
+LUMEN_EXPORT_SETTLE_SECONDS = int(os.getenv('LUMEN_EXPORT_SETTLE_SECONDS', 10))
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -100,6 +151,19 @@ LOGOUT_REDIRECT_URL = 'quiz_list'
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Przy DEBUG=False collectstatic nadaje plikom nazwy z odciskiem treści i zapisuje wersje .gz,
+# a StaticFilesMiddleware serwuje je z nagłówkiem immutable (Lumen/staticfiles.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'Lumen.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+LUMEN_SERVE_STATIC = get_env_bool('LUMEN_SERVE_STATIC', not DEBUG)
+# Czas ważności (s) plików bez odcisku w nazwie (adresy spoza {% static %})
+LUMEN_STATIC_MAX_AGE = int(os.getenv('LUMEN_STATIC_MAX_AGE', 60))
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND')
 EMAIL_HOST = os.getenv('EMAIL_HOST')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT'))
@@ -0,0 +1,164 @@
+"""
+Przepustowość rozgrywki przy wielu równoległych graczach: ASGI (widoki async) kontra WSGI.
+
+Każdy klient to osobny gracz z danych `seed_benchmark_data`, który w kilku rundach przechodzi
+pytania quizu (GET pytania + POST odpowiedzi). Wyniku nie zapisujemy - benchmark nie zmienia
+danych w bazie, a podejścia z cache usuwamy przed każdym trybem.
+
+Obie ścieżki działają w jednym procesie, z tą samą liczbą wątków roboczych:
+    * WSGI - pula `--workers` wątków; wątek obsługuje żądanie od początku do końca
+      (jak gunicorn --threads), więc naraz gra najwyżej `--workers` klientów,
+    * ASGI - jedna pętla zdarzeń obsługuje wszystkich `--clients` klientów naraz, a kod
+      synchroniczny (zapytania do bazy, sync_to_async) trafia do puli `--workers` wątków.
+
+Uruchomienie (z katalogu Lumen_Project):
+    python manage.py seed_benchmark_data
+    python -m benchmarks.concurrency --clients 32 --workers 4 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Lumen_Project.settings')
+
+
+def summarize(mode: str, latencies: list[float], elapsed: float) -> dict:
+    from benchmarks.endpoints import percentile
+
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+    }
+
+
+def load_players(clients: int):
+    from django.contrib.auth import get_user_model
+
+    from Lumen.management.commands.seed_benchmark_data import USERNAME_PREFIX
+    from Lumen.models import Quiz
+    from Lumen.snapshot import get_compiled_quiz_or_404
+
+    users = list(get_user_model().objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk')[:clients])
+    quiz = Quiz.objects.filter(created_by__username__startswith=USERNAME_PREFIX, is_published=True) \
+        .order_by('pk').first()
+    if len(users) < clients or quiz is None:
+        raise RuntimeError(
+            f"Za mało danych benchmarku (potrzeba {clients} graczy) - uruchom `python manage.py seed_benchmark_data`."
+        )
+    return users, get_compiled_quiz_or_404(quiz.pk)
+
+
+def reset_attempts(users, quiz) -> None:
+    from Lumen.attempts import claim_attempt
+
+    for user in users:
+        claim_attempt(user.pk, quiz.id)
+
+
+def play_steps(quiz):
+    from django.urls import reverse
+
+    return [
+        (reverse('play_quiz_view', args=[quiz.id, question.order]), question.answers[0].id)
+        for question in quiz.questions
+    ]
+
+
+def run_wsgi(users, quiz, workers: int, rounds: int) -> dict:
+    from django.db import connections
+    from django.test import Client
+
+    from benchmarks.endpoints import expect
+
+    steps = play_steps(quiz)
+    latencies: list[float] = []
+
+    def play(user) -> None:
+        client = Client()
+        client.force_login(user)
+        try:
+            for _ in range(rounds):
+                for url, answer_id in steps:
+                    for request in (lambda: client.get(url), lambda: client.post(url, {'answer': answer_id})):
+                        start = time.perf_counter()
+                        expect(request(), 200)
+                        latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(play, users))
+    return summarize('wsgi', latencies, time.perf_counter() - start)
+
+
+def run_asgi(users, quiz, workers: int, rounds: int) -> dict:
+    from django.test import AsyncClient
+
+    from benchmarks.endpoints import expect
+
+    steps = play_steps(quiz)
+    latencies: list[float] = []
+
+    async def play(client) -> None:
+        for _ in range(rounds):
+            for url, answer_id in steps:
+                for request in (lambda: client.get(url), lambda: client.post(url, {'answer': answer_id})):
+                    start = time.perf_counter()
+                    expect(await request(), 200)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+    clients = []
+    for user in users:
+        client = AsyncClient()
+        client.force_login(user)
+        clients.append(client)
+
+    async def main() -> float:
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        start = time.perf_counter()
+        await asyncio.gather(*(play(client) for client in clients))
+        return time.perf_counter() - start
+
+    return summarize('asgi', latencies, asyncio.run(main()))
+
+
+def run_concurrency(clients: int = 16, workers: int = 4, rounds: int = 3) -> list[dict]:
+    users, quiz = load_players(clients)
+    results = []
+    for runner in (run_wsgi, run_asgi):
+        reset_attempts(users, quiz)
+        results.append(runner(users, quiz, workers, rounds))
+    reset_attempts(users, quiz)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help='Liczba równoległych graczy')
+    parser.add_argument('--workers', type=int, default=4, help='Liczba wątków roboczych w obu trybach')
+    parser.add_argument('--rounds', type=int, default=3, help='Ile razy każdy gracz przechodzi quiz')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.test.utils import setup_test_environment
+
+    # Klient testowy Django: host 'testserver' i poczta w pamięci
+    setup_test_environment()
+    results = run_concurrency(args.clients, args.workers, args.rounds)
+    print(f"{args.clients} klientów, {args.workers} wątków roboczych, {args.rounds} rund")
+    print(f"{'tryb':<8}{'żądania':>10}{'żądań/s':>12}{'p50 [ms]':>10}{'p95 [ms]':>10}")
+    for row in results:
+        print(f"{row['mode']:<8}{row['requests']:>10}{row['throughput_rps']:>12.1f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
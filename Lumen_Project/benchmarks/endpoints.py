@@ -0,0 +1,233 @@
+"""
+Benchmark widoków HTML i endpointów API na danych z `seed_benchmark_data`.
+
+Dla każdego scenariusza mierzy liczbę zapytań SQL, czas (percentyle) oraz szczytową
+pamięć zaalokowaną w trakcie żądania (tracemalloc, osobny przebieg - śledzenie alokacji
+spowalnia kod, więc nie może zaburzać pomiaru czasu). Zapisy każdego scenariusza są
+wycofywane, więc kolejne uruchomienia widzą te same dane.
+
+Uruchomienie (z katalogu Lumen_Project):
+    python manage.py seed_benchmark_data
+    python -m benchmarks.endpoints --iterations 50 --output wyniki.json
+    python -m benchmarks.endpoints --compare wyniki.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from statistics import mean, median
+from typing import Callable, Optional
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Lumen_Project.settings')
+
+
+@dataclass
+class Scenario:
+    name: str
+    run: Callable[[], None]
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Percentyl metodą najbliższej pozycji - wystarczający dla kilkudziesięciu próbek."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def expect(response, *codes: int) -> None:
+    if response.status_code not in codes:
+        raise AssertionError(f"{response.request['PATH_INFO']}: HTTP {response.status_code}, oczekiwano {codes}")
+
+
+def build_scenarios(client, api_client, quiz_id: int) -> list[Scenario]:
+    from django.urls import reverse
+
+    from django.test import Client
+
+    from Lumen.snapshot import get_compiled_quiz_or_404, invalidate_catalogue, invalidate_quiz
+
+    compiled = get_compiled_quiz_or_404(quiz_id)
+
+    def full_attempt() -> None:
+        for question in compiled.questions:
+            url = reverse('play_quiz_view', args=[quiz_id, question.order])
+            expect(client.get(url), 200)
+            expect(client.post(url, {'answer': question.answers[0].id}), 200)
+        expect(client.get(reverse('finish_quiz_view', args=[quiz_id])), 302)
+
+    # Strony dla niezalogowanych: "_cold" unieważnia cache fragmentów przed każdym żądaniem
+    anonymous = Client()
+    list_url, detail_url = reverse('quiz_list'), reverse('quiz_detail', args=[quiz_id])
+
+    def cold(invalidate: Callable[[], None], url: str) -> Callable[[], None]:
+        def run() -> None:
+            invalidate()
+            expect(anonymous.get(url), 200)
+        return run
+
+    create_payload = {
+        'title': 'Quiz z benchmarku', 'description': '', 'category': 'Benchmark', 'is_published': False,
+        'questions': [
+            {'text': f'Pytanie {order}', 'order': order, 'answers': [
+                {'text': 'Tak', 'is_correct': True}, {'text': 'Nie', 'is_correct': False},
+            ]}
+            for order in range(1, 11)
+        ],
+    }
+
+    return [
+        Scenario('quiz_list', lambda: expect(client.get(reverse('quiz_list')), 200)),
+        Scenario('quiz_detail', lambda: expect(client.get(reverse('quiz_detail', args=[quiz_id])), 200)),
+        Scenario('anon_quiz_list_cold', cold(invalidate_catalogue, list_url)),
+        Scenario('anon_quiz_list', lambda: expect(anonymous.get(list_url), 200)),
+        Scenario('anon_quiz_detail_cold', cold(lambda: invalidate_quiz(quiz_id), detail_url)),
+        Scenario('anon_quiz_detail', lambda: expect(anonymous.get(detail_url), 200)),
+        Scenario('play_and_finish', full_attempt),
+        Scenario('profile', lambda: expect(client.get(reverse('user_profile')), 200)),
+        Scenario('api_quiz_list', lambda: expect(api_client.get(reverse('quiz-list')), 200)),
+        Scenario('api_quiz_retrieve', lambda: expect(api_client.get(reverse('quiz-detail', args=[quiz_id])), 200)),
+        Scenario('api_quiz_create',
+                 lambda: expect(api_client.post(reverse('quiz-list'), create_payload, format='json'), 201)),
+    ]
+
+
+def measure(scenario: Scenario, iterations: int, warmup: int, alloc_iterations: int) -> dict:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        scenario.run()
+
+    timings, query_counts = [], []
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            scenario.run()
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(ctx))
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            scenario.run()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - baseline) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'queries': {'mean': mean(query_counts), 'max': max(query_counts)},
+        'time_ms': {
+            'p50': percentile(timings, 0.50), 'p95': percentile(timings, 0.95),
+            'p99': percentile(timings, 0.99), 'max': max(timings), 'mean': mean(timings),
+        },
+        'alloc_peak_kib': {'median': median(peaks), 'max': max(peaks)} if peaks else None,
+    }
+
+
+def run_benchmarks(iterations: int = 30, warmup: int = 3, alloc_iterations: int = 5,
+                   only: Optional[list[str]] = None) -> dict:
+    """Wykonuje scenariusze na danych z seed_benchmark_data i zwraca wyniki gotowe do zapisu w JSON."""
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from django.test import Client
+    from rest_framework.test import APIClient
+
+    from Lumen.management.commands.seed_benchmark_data import USERNAME_PREFIX
+    from Lumen.models import Quiz, QuizResult
+
+    User = get_user_model()
+    user = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').first()
+    quiz = Quiz.objects.filter(created_by__username__startswith=USERNAME_PREFIX, is_published=True) \
+        .order_by('pk').first()
+    if user is None or quiz is None:
+        raise RuntimeError("Brak danych benchmarku - uruchom najpierw `python manage.py seed_benchmark_data`.")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'users': User.objects.count(),
+                'quizzes': Quiz.objects.count(),
+                'results': QuizResult.objects.count(),
+            },
+            'iterations': iterations,
+        },
+        'scenarios': {},
+    }
+
+    client = Client()
+    client.force_login(user)
+    api_client = APIClient()
+    api_client.force_authenticate(user=user)
+    for scenario in build_scenarios(client, api_client, quiz.pk):
+        if only and scenario.name not in only:
+            continue
+        # Zapisy scenariusza (wyniki, nowe quizy) wycofujemy - następne scenariusze
+        # i kolejne uruchomienia mierzą te same dane
+        with transaction.atomic():
+            report['scenarios'][scenario.name] = measure(scenario, iterations, warmup, alloc_iterations)
+            transaction.set_rollback(True)
+    return report
+
+
+def print_report(report: dict, baseline: Optional[dict] = None) -> None:
+    header = f"{'scenariusz':<20}{'zapytania':>10}{'p50 [ms]':>10}{'p95 [ms]':>10}{'p99 [ms]':>10}{'pamięć [KiB]':>14}"
+    if baseline:
+        header += f"{'Δ p50':>10}{'Δ zapytań':>11}"
+    print(header)
+    for name, stats in report['scenarios'].items():
+        alloc = stats['alloc_peak_kib']['median'] if stats['alloc_peak_kib'] else float('nan')
+        line = (f"{name:<20}{stats['queries']['mean']:>10.1f}{stats['time_ms']['p50']:>10.2f}"
+                f"{stats['time_ms']['p95']:>10.2f}{stats['time_ms']['p99']:>10.2f}{alloc:>14.1f}")
+        previous = (baseline or {}).get('scenarios', {}).get(name)
+        if previous:
+            change = (stats['time_ms']['p50'] / previous['time_ms']['p50'] - 1) * 100
+            queries = stats['queries']['mean'] - previous['queries']['mean']
+            line += f"{change:>+9.1f}%{queries:>+11.1f}"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--alloc-iterations', type=int, default=5)
+    parser.add_argument('--only', type=str, default='', help='Nazwy scenariuszy oddzielone przecinkami')
+    parser.add_argument('--output', type=str, default='', help='Plik JSON na wyniki')
+    parser.add_argument('--compare', type=str, default='', help='Plik JSON z wcześniejszego uruchomienia')
+    args = parser.parse_args()
+
+    django.setup()
+    from django.test.utils import setup_test_environment
+
+    # Klient testowy Django: host 'testserver' i poczta w pamięci
+    setup_test_environment()
+    only = [name.strip() for name in args.only.split(',') if name.strip()]
+    report = run_benchmarks(args.iterations, args.warmup, args.alloc_iterations, only)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
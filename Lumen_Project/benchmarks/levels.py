@@ -0,0 +1,39 @@
+"""
+Mikro-benchmark rozwiązywania poziomu z XP: dawna pętla poziom po poziomie
+kontra tablica skumulowanych progów z wyszukiwaniem binarnym.
+
+Uruchomienie (z katalogu Lumen_Project):
+    python -m benchmarks.levels
+"""
+import timeit
+
+from users.leveling import apply_xp
+
+
+def legacy_add_xp(level: int, xp: int, amount: int) -> tuple[int, int]:
+    """Dawny algorytm UserProfile.add_xp - potęga zmiennoprzecinkowa i krok po poziomie."""
+    xp += amount
+    while xp >= int(100 * (level ** 1.5)):
+        xp -= int(100 * (level ** 1.5))
+        level += 1
+    return level, xp
+
+
+SCENARIOS = {
+    'zwykły quiz (+30 XP)': (5, 120, 30),
+    'premia eventowa (+50 000 XP)': (5, 120, 50_000),
+    'przeliczenie hurtowe (+10 000 000 XP)': (1, 0, 10_000_000),
+}
+
+
+def main(number: int = 20_000) -> None:
+    print(f"{'scenariusz':<40}{'pętla [µs]':>14}{'bisect [µs]':>14}{'przyspieszenie':>16}")
+    for name, args in SCENARIOS.items():
+        assert legacy_add_xp(*args) == apply_xp(*args), name
+        legacy = timeit.timeit(lambda: legacy_add_xp(*args), number=number) / number * 1e6
+        table = timeit.timeit(lambda: apply_xp(*args), number=number) / number * 1e6
+        print(f"{name:<40}{legacy:>14.2f}{table:>14.2f}{legacy / table:>15.1f}x")
+
+
+if __name__ == '__main__':
+    main()
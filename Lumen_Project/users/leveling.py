@@ -0,0 +1,66 @@
+"""
+Tablica progów XP systemu poziomów.
+
+Koszt awansu z poziomu L na L+1 to int(100 * L ** 1.5). Zamiast liczyć potęgę
+zmiennoprzecinkową przy każdym odczycie i przechodzić poziom po poziomie,
+trzymamy skumulowane progi w tablicy i rozwiązujemy poziom wyszukiwaniem binarnym.
+"""
+import threading
+from bisect import bisect_right
+
+# Tyle poziomów liczymy z góry; większe wartości XP dopisują progi w razie potrzeby
+PRECOMPUTED_LEVELS = 1000
+
+# LEVEL_COSTS[L] - XP potrzebne, by z poziomu L awansować na L+1 (indeks 0 nieużywany)
+LEVEL_COSTS: list[int] = [0]
+# CUMULATIVE_XP[L - 1] - łączne XP, od którego zaczyna się poziom L (CUMULATIVE_XP[0] == 0)
+CUMULATIVE_XP: list[int] = [0]
+
+_extend_lock = threading.Lock()
+
+
+def _extend_to(level: int) -> None:
+    """Dopisuje progi aż do podanego poziomu włącznie."""
+    with _extend_lock:
+        while len(LEVEL_COSTS) <= level:
+            cost = int(100 * (len(LEVEL_COSTS) ** 1.5))
+            LEVEL_COSTS.append(cost)
+            CUMULATIVE_XP.append(CUMULATIVE_XP[-1] + cost)
+
+
+_extend_to(PRECOMPUTED_LEVELS)
+
+
+def xp_required_for_level(level: int) -> int:
+    """Ile XP trzeba zdobyć na danym poziomie, aby awansować na następny."""
+    if level < 1:
+        return 100
+    if level >= len(LEVEL_COSTS):
+        _extend_to(level)
+    return LEVEL_COSTS[level]
+
+
+def total_xp_for(level: int, xp: int) -> int:
+    """Zamienia parę (poziom, XP w obrębie poziomu) na łączne XP."""
+    level = max(level, 1)
+    if level > len(CUMULATIVE_XP):
+        _extend_to(level)
+    return CUMULATIVE_XP[level - 1] + xp
+
+
+def level_for_total_xp(total_xp: int) -> tuple[int, int]:
+    """Zwraca (poziom, XP w obrębie poziomu) dla łącznego XP - O(log n) zamiast pętli po poziomach."""
+    total_xp = max(total_xp, 0)
+    while CUMULATIVE_XP[-1] <= total_xp:
+        # Wyjątkowo duże XP: podwajamy tablicę, aż obejmie wynik
+        _extend_to(2 * len(LEVEL_COSTS))
+    level = bisect_right(CUMULATIVE_XP, total_xp)
+    return level, total_xp - CUMULATIVE_XP[level - 1]
+
+
+def apply_xp(level: int, xp: int, amount: int) -> tuple[int, int]:
+    """Zwraca (poziom, XP) po doliczeniu punktów. Bez awansu wystarczy jedno porównanie z tablicą."""
+    new_xp = xp + amount
+    if 1 <= level < len(LEVEL_COSTS) and 0 <= new_xp < LEVEL_COSTS[level]:
+        return level, new_xp
+    return level_for_total_xp(total_xp_for(level, xp) + amount)
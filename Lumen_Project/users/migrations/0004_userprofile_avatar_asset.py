@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Lumen', '0016_imageasset'),
+        ('users', '0003_alter_userprofile_avatar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_asset',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='Lumen.imageasset'),
+        ),
+    ]
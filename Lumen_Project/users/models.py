@@ -1,9 +1,15 @@
 from django.conf import settings
 from django.db import models
 
+from .leveling import apply_xp, total_xp_for, xp_required_for_level
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    # Pochodne awatara - ustawiane w tle po przesłaniu (Lumen/images.py)
+    avatar_asset = models.ForeignKey('Lumen.ImageAsset', on_delete=models.SET_NULL, null=True, blank=True,
+                                     editable=False, related_name="+")
     xp = models.IntegerField(default=0)
     level = models.IntegerField(default=1)
 
@@ -16,9 +22,12 @@ class UserProfile(models.Model):
         Oblicza, ile XP potrzeba, by osiągnąć następny poziom.
         Używa algorytmu wykładniczego, aby każdy poziom był trudniejszy.
         """
-        if self.level < 1:
-            return 100
-        return int(100 * (self.level ** 1.5))
+        return xp_required_for_level(self.level)
+
+    @property
+    def total_xp(self) -> int:
+        """Łączne XP zdobyte od początku gry - porządkuje graczy tak samo jak para (poziom, XP)."""
+        return total_xp_for(self.level, self.xp)
 
     @property
     def xp_progress_percentage(self) -> float:
@@ -30,14 +39,24 @@ class UserProfile(models.Model):
         progress = (self.xp / required_xp) * 100
         return min(progress, 100)
 
-    def add_xp(self, amount: int) -> None:
-        """Dodaje punkty XP i sprawdza, czy użytkownik powinien awansować."""
-        if amount < 0:
-            return  # Ignoruj ujemne wartości
-
-        self.xp += amount
-        # Pętla while na wypadek, gdyby użytkownik zdobył tyle XP, by awansować o kilka poziomów na raz
-        while self.xp >= self.xp_required_for_next_level:
-            self.xp -= self.xp_required_for_next_level
-            self.level += 1
-        self.save()
\ No newline at end of file
+    def add_xp(self, amount: int) -> tuple[int, int]:
+        """
+        Dodaje punkty XP i sprawdza, czy użytkownik powinien awansować.
+        Zapis to warunkowy UPDATE (compare-and-swap) tylko kolumn xp/level: przechodzi jedynie wtedy,
+        gdy w bazie wciąż są wartości, z których liczyliśmy. Równoległe ukończenia quizów
+        nie gubią więc punktów - przegrany odświeża profil i liczy ponownie.
+        Zwraca nowy (poziom, xp) bez dodatkowego odczytu.
+        """
+        if amount <= 0:
+            return self.level, self.xp  # Ignoruj ujemne wartości
+
+        while True:
+            # Poziom wyliczamy z łącznego XP przez tablicę progów - awans o wiele poziomów naraz kosztuje tyle samo
+            level, xp = apply_xp(self.level, self.xp, amount)
+
+            updated = UserProfile.objects.filter(pk=self.pk, level=self.level, xp=self.xp).update(level=level, xp=xp)
+            if updated:
+                self.level, self.xp = level, xp
+                return level, xp
+            # Ktoś zmienił profil w międzyczasie - odświeżamy tylko XP/poziom i próbujemy ponownie
+            self.refresh_from_db(fields=['level', 'xp'])
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from Lumen.images import track_image_field
 from .models import UserProfile
 
 @receiver(post_save, sender=User)
@@ -12,10 +13,9 @@ def create_user_profile(sender: type[User], instance: User, created: bool, **kwa
     if created:
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender: type[User], instance: User, **kwargs) -> None:
-    """
-    Sygnał, który zapisuje UserProfile za każdym razem,
-    gdy obiekt User jest zapisywany.
-    """
-    instance.profile.save()
\ No newline at end of file
+# Bez zapisu profilu przy każdym User.save() (logowanie, zmiana hasła, edycja w adminie):
+# pełny save() nadpisałby XP dodane w międzyczasie przez UserProfile.add_xp nieaktualną kopią
+
+
+# Awatar w pełnej rozdzielczości zastępują pochodne budowane w tle
+track_image_field(UserProfile, 'avatar')
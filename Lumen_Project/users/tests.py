@@ -1,7 +1,20 @@
-from django.test import TestCase
+import threading
+import time
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.urls import reverse
+from Lumen.models import Job, PlayerStats, Quiz, QuizResult
+from Lumen.services import record_quiz_result
 from .models import UserProfile
+from .leveling import apply_xp, level_for_total_xp, total_xp_for
 from .forms import SignUpForm
+from .views import PROFILE_HISTORY_PAGE_SIZE
 
 class UserProfileXPTest(TestCase):
     """Testuje mechanizm dodawania XP i awansowania na wyższe poziomy."""
@@ -26,6 +39,160 @@ class UserProfileXPTest(TestCase):
         self.assertEqual(self.profile.xp, 10)
 
 
+    def test_add_xp_returns_new_state_and_keeps_avatar(self):
+        self.profile.avatar = 'avatars/stare.png'
+        self.profile.save()
+        stale = UserProfile.objects.get(pk=self.profile.pk)
+        stale.avatar = 'avatars/nieaktualne.png'
+
+        self.assertEqual(stale.add_xp(150), (2, 50))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar.name, 'avatars/stare.png')
+
+    def test_stale_instance_does_not_lose_xp(self):
+        """Dwa równoległe ukończenia na nieaktualnych kopiach profilu nie gubią punktów."""
+        first = UserProfile.objects.get(pk=self.profile.pk)
+        second = UserProfile.objects.get(pk=self.profile.pk)
+        first.add_xp(60)
+        second.add_xp(60)
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_xp, 120)
+        self.assertEqual((self.profile.level, self.profile.xp), (2, 20))
+
+
+class LevelThresholdTableTest(TestCase):
+    """Porównuje tablicę progów z dawną pętlą poziom po poziomie."""
+
+    @staticmethod
+    def legacy_add_xp(level, xp, amount):
+        xp += amount
+        while xp >= int(100 * (level ** 1.5)):
+            xp -= int(100 * (level ** 1.5))
+            level += 1
+        return level, xp
+
+    def test_matches_legacy_loop(self):
+        for level, xp, amount in [(1, 0, 99), (1, 0, 100), (1, 50, 60), (3, 10, 5000), (7, 0, 123_456), (1, 0, 10 ** 9)]:
+            self.assertEqual(apply_xp(level, xp, amount), self.legacy_add_xp(level, xp, amount))
+
+    def test_total_xp_round_trip(self):
+        for total in (0, 1, 99, 100, 382, 10 ** 6):
+            self.assertEqual(total_xp_for(*level_for_total_xp(total)), total)
+
+
+def retry_locked(func, *args, **kwargs):
+    """
+    SQLite w pamięci (baza testów) nie czeka na blokadę zapisu, tylko zgłasza błąd. Transakcja
+    wycofuje się wtedy w całości, więc powtarzamy ją - jak klient ponawiający żądanie.
+    """
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            time.sleep(0.001)
+
+
+class UserProfileConcurrentXPTest(TransactionTestCase):
+    """Uruchamia równoległe ukończenia quizów jednego gracza z wielu wątków."""
+
+    def test_parallel_quiz_finishes_lose_no_xp(self):
+        user = User.objects.create_user('racer', 'racer@example.com', 'password')
+        threads_count, finishes_per_thread = 8, 5
+        quizzes = [Quiz.objects.create(title=f"Wyścig {i}", created_by=user) for i in range(threads_count)]
+        barrier = threading.Barrier(threads_count)
+        errors = []
+
+        def finish_quizzes(quiz):
+            try:
+                # Każdy wątek ma własną kopię konta i profilu, jak osobne żądania
+                player = User.objects.get(pk=user.pk)
+                player.profile
+                barrier.wait()
+                for _ in range(finishes_per_thread):
+                    retry_locked(record_quiz_result, player, quiz.pk, 100)
+                    # Logowanie w międzyczasie zapisuje konto - nie może cofnąć XP
+                    retry_locked(player.save, update_fields=['last_login'])
+            except Exception as exc:  # pragma: no cover - raportujemy błąd w głównym wątku
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=finish_quizzes, args=(quiz,)) for quiz in quizzes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        scores = list(QuizResult.objects.filter(user=user).values_list('score', flat=True))
+        self.assertEqual(len(scores), threads_count * finishes_per_thread)
+        self.assertEqual(UserProfile.objects.get(user=user).total_xp, sum(scores))
+        self.assertEqual(PlayerStats.objects.get(user=user).total_score, sum(scores))
+
+    def test_user_save_keeps_xp_added_elsewhere(self):
+        user = User.objects.create_user('gracz', 'gracz@example.com', 'password')
+        user.profile  # Kopia profilu wczytana przed naliczeniem XP
+        UserProfile.objects.get(user=user).add_xp(150)
+
+        user.set_password('nowe-haslo')
+        user.save()
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual((profile.level, profile.xp), (2, 50))
+
+
+
+class ProfileHistoryTest(TestCase):
+    """Historia gier w profilu: stronicowanie kursorem, stała liczba zapytań, podsumowanie z jednego wiersza."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('gracz', 'gracz@example.com', 'password')
+        self.quizzes = [Quiz.objects.create(title=f"Quiz {i}", created_by=self.user) for i in range(3)]
+        self.client.login(username='gracz', password='password')
+
+    def add_results(self, count):
+        QuizResult.objects.bulk_create(
+            QuizResult(user=self.user, quiz=self.quizzes[i % 3], score=i) for i in range(count)
+        )
+
+    def get_profile(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user_profile'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx)
+
+    def test_history_is_paginated_without_n_plus_one(self):
+        self.add_results(3)
+        _, small = self.get_profile()
+        self.add_results(PROFILE_HISTORY_PAGE_SIZE * 2)
+        response, large = self.get_profile()
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.context['quiz_results']), PROFILE_HISTORY_PAGE_SIZE)
+
+        seen = {result.pk for result in response.context['quiz_results']}
+        cursor = response.context['next_cursor']
+        while cursor:
+            response, _ = self.get_profile(cursor=cursor)
+            seen |= {result.pk for result in response.context['quiz_results']}
+            cursor = response.context['next_cursor']
+        self.assertEqual(len(seen), QuizResult.objects.filter(user=self.user).count())
+
+    def test_invalid_cursor_returns_404(self):
+        self.assertEqual(self.client.get(reverse('user_profile'), {'cursor': 'zły'}).status_code, 404)
+
+    def test_stats_summary_is_updated_with_each_result(self):
+        record_quiz_result(self.user, self.quizzes[0].pk, 50)
+        result, _ = record_quiz_result(self.user, self.quizzes[1].pk, 30)
+        stats = PlayerStats.objects.get(user=self.user)
+        self.assertEqual((stats.attempts, stats.total_score, stats.best_score), (2, 80, 50))
+        self.assertEqual(stats.last_played_at, result.completed_at)
+
+        response, _ = self.get_profile()
+        self.assertContains(response, 'Rozegrane quizy:</strong> 2')
+
+
 class SignUpFormTest(TestCase):
     def test_duplicate_email_is_invalid(self):
         """Sprawdza, czy formularz odrzuca zduplikowany email."""
@@ -50,12 +217,26 @@ class SignUpFormTest(TestCase):
         )
 
 
-
-
-
-
-
-
-
-
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SignUpViewTest(TestCase):
+    def signup(self):
+        return self.client.post(reverse('signup'), {
+            'username': 'nowy', 'email': 'nowy@example.com',
+            'password1': 'Trudne-haslo-123', 'password2': 'Trudne-haslo-123',
+        })
+
+    def test_signup_only_enqueues_activation_email(self):
+        """Rejestracja nie łączy się z SMTP - mail wysyła dopiero wykonawca zadań."""
+        response = self.signup()
+        self.assertTemplateUsed(response, 'registration/registration_pending.html')
+        self.assertEqual(mail.outbox, [])
+        user = User.objects.get(username='nowy')
+        self.assertFalse(user.is_active)
+        self.assertEqual(Job.objects.get().name, 'send_email')
+
+        call_command('run_workers', workers=1, once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['nowy@example.com'])
+        self.assertIn('/users/activate/', mail.outbox[0].body)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
 
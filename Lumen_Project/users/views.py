@@ -7,39 +7,41 @@ from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import EmailMessage
-from django.http import HttpRequest, HttpResponse
+from django.db import transaction
+from django.http import Http404, HttpRequest, HttpResponse
 
 from .forms import UserProfileForm, SignUpForm
 from .models import UserProfile
-from Lumen.models import QuizResult
+from Lumen.images import image_variants
+from Lumen.jobs import enqueue_email
+from Lumen.models import PlayerStats, QuizResult
+from Lumen.pagination import InvalidCursor, paginate_keyset
+
+# Liczba wyników na stronie historii gier w profilu
+PROFILE_HISTORY_PAGE_SIZE = 20
 
 def signup_view(request: HttpRequest) -> HttpResponse:
     if request.method == 'POST':
         form = SignUpForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.is_active = False  # Konto nieaktywne do czasu aktywacji
-            user.save()
-
-            # Generowanie linku aktywacyjnego
-            current_site = get_current_site(request)
-            mail_subject = 'Aktywuj swoje konto w Lumen'
-            message = render_to_string('registration/acc_active_email.html', {
-                'user': user,
-                'domain': current_site.domain,
-                'uid': urlsafe_base64_encode(force_bytes(user.pk)),
-                'token': default_token_generator.make_token(user),
-            })
-            to_email = form.cleaned_data.get('email')
-            email = EmailMessage(mail_subject, message, to=[to_email])
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.is_active = False  # Konto nieaktywne do czasu aktywacji
+                user.save()
 
-            try:
-                email.send()
-                return render(request, 'registration/registration_pending.html')
-            except Exception as e:
-                user.delete()
-                messages.error(request, f'Błąd wysyłki: {e}. Sprawdź konfigurację SMTP.')
+                # Generowanie linku aktywacyjnego
+                current_site = get_current_site(request)
+                mail_subject = 'Aktywuj swoje konto w Lumen'
+                message = render_to_string('registration/acc_active_email.html', {
+                    'user': user,
+                    'domain': current_site.domain,
+                    'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+                    'token': default_token_generator.make_token(user),
+                })
+                # Mail wysyła wykonawca zadań (run_workers) - wolny lub niedostępny serwer SMTP
+                # nie blokuje żądania, a nieudana wysyłka jest ponawiana zamiast usuwać konto
+                enqueue_email(mail_subject, message, [form.cleaned_data.get('email')])
+            return render(request, 'registration/registration_pending.html')
     else:
         form = SignUpForm()
     return render(request, 'registration/signup.html', {'form': form})
@@ -61,19 +63,35 @@ def activate(request, uidb64, token):
 
 @login_required
 def profile_view(request: HttpRequest) -> HttpResponse:
-    profile = get_object_or_404(UserProfile, user=request.user)
+    profile = get_object_or_404(UserProfile.objects.select_related('avatar_asset'), user=request.user)
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
-            form.save()
+            # Zapisujemy tylko awatar - pełny save() nadpisałby XP zdobyte w międzyczasie
+            form.save(commit=False).save(update_fields=['avatar'])
             messages.success(request, 'Profil zaktualizowany!')
             return redirect('user_profile')
     else:
         form = UserProfileForm(instance=profile)
 
-    quiz_results = QuizResult.objects.filter(user=request.user).order_by('-completed_at')
+    # Historia stronicowana kursorem po completed_at; tytuł quizu w tym samym zapytaniu (bez N+1)
+    history = QuizResult.objects.filter(user=request.user).select_related('quiz').only(
+        'score', 'completed_at', 'quiz__title'
+    )
+    cursor = request.GET.get('cursor')
+    try:
+        quiz_results, next_cursor = paginate_keyset(history, cursor, PROFILE_HISTORY_PAGE_SIZE, field='completed_at')
+    except InvalidCursor:
+        raise Http404("Nieprawidłowy kursor.")
+
+    # Podsumowanie czytamy z jednego wiersza - bez agregowania całej historii
+    stats = PlayerStats.objects.filter(user=request.user).first() or PlayerStats(user=request.user)
     return render(request, 'users/profile.html', {
         'profile': profile,
+        'avatar': image_variants(profile.avatar, profile.avatar_asset),
         'form': form,
+        'stats': stats,
         'quiz_results': quiz_results,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
     })
\ No newline at end of file